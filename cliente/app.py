@@ -2,16 +2,25 @@ from functools import wraps
 import os
 import uuid
 import time
+import hashlib
+import io
+import json
+import base64
 from werkzeug.utils import secure_filename
 import logging
 
-from flask import Flask, render_template, request, jsonify, send_from_directory, make_response, Response
+from flask import Flask, render_template, request, jsonify, send_from_directory, send_file, make_response, Response, stream_with_context, redirect
 
 import grpc
 from proto import procesador_pb2
 from proto import procesador_pb2_grpc
 
 from glusterFS import GlusterFS
+from conexiones_nodos import ConexionesNodos
+from trabajos import ColaTrabajos, ColaLlena, ErrorTrabajo
+from cache_resultados import CacheResultados, clave_resultado, MISS, COALESCIDO
+from subidas import PeticionSubida
+from miniaturas import Miniaturas, TAMANOS_MINIATURA, miniaturas_disponibles
 from monitoreo.metricas_cliente import MetricasServer
 
 logging.basicConfig(level=logging.INFO)
@@ -21,6 +30,25 @@ app = Flask(__name__)
 
 CARPETA_SUBIDOS = "subidos"
 CARPETA_PROCESADOS = "procesados"
+CARPETA_CACHE = "cache"  # cache de resultados si GlusterFS no esta disponible
+
+TAMANO_MAX_MB = int(os.environ.get("TAMANO_MAX_MB", "200"))
+TAMANO_CHUNK = 1024 * 1024  # 1MB por mensaje gRPC
+# bytes de imagenes por llamada ProcesarImagenes, bajo el limite de mensaje gRPC (20MB)
+TAMANO_MAX_LOTE = 16 * 1024 * 1024
+# imagenes enviadas en la peticion unaria ProcesarImagenProgresivo; las mayores van por chunks
+TAMANO_MAX_PROGRESIVO = 16 * 1024 * 1024
+# segundos entre comentarios de keepalive en los streams de eventos
+INTERVALO_KEEPALIVE_SSE = 15.0
+# imagenes de cada tipo por pagina de la galeria
+IMAGENES_POR_PAGINA = int(os.environ.get("IMAGENES_POR_PAGINA", "24"))
+# las imagenes guardadas no cambian: su id incluye el hash del contenido
+CACHE_IMAGENES_SEGUNDOS = 365 * 24 * 60 * 60
+
+app.config["MAX_CONTENT_LENGTH"] = (TAMANO_MAX_MB + 1) * 1024 * 1024
+# los archivos subidos se reciben en memoria calculando tamaño y SHA-256 al vuelo
+app.request_class = PeticionSubida
+PeticionSubida.tamano_max_archivo = TAMANO_MAX_MB * 1024 * 1024
 
 os.makedirs(CARPETA_SUBIDOS, exist_ok=True)
 os.makedirs(CARPETA_PROCESADOS, exist_ok=True)
@@ -39,41 +67,197 @@ except Exception as e:
     logger.error(f" Error iniciando servidor de métricas: {e}")
 
 try:
-    gfs = GlusterFS()
+    gfs = GlusterFS(recolector_metricas=recolector_metricas_cliente)
     recolector_metricas_cliente.actualizar_estado_glusterfs(True)
 except Exception as e:
     logger.error(f"Error inicializando GlusterFS: {e}")
     gfs = None
     recolector_metricas_cliente.actualizar_estado_glusterfs(False)
 
-def encontrar_coordinador():
-    inicio = time.time()
-    NODOS_CONOCIDOS = os.environ.get("NODOS_CONOCIDOS", "").split(",")
-    
-    coordinador_encontrado = None
+# miniaturas para las grillas de imagenes, generadas la primera vez que se piden
+miniaturas = Miniaturas(gfs) if gfs else None
 
-    for direccion in NODOS_CONOCIDOS:
-        direccion_proc = direccion.replace(":50053", ":50052") 
+# canales persistentes a los nodos y coordinador en cache
+conexiones_nodos = ConexionesNodos(os.environ.get("NODOS_CONOCIDOS", "").split(","), recolector_metricas_cliente)
+
+# resultados ya procesados, compartidos por todos los clientes a traves de GlusterFS
+try:
+    cache_resultados = CacheResultados(
+        os.path.join(gfs.mnt_punto, "cache", "resultados") if gfs else CARPETA_CACHE,
+        recolector_metricas=recolector_metricas_cliente
+    )
+except OSError as e:
+    logger.error(f"Error inicializando cache de resultados: {e}")
+    cache_resultados = None
+
+# trabajos de procesamiento atendidos en segundo plano
+cola_trabajos = ColaTrabajos(recolector_metricas=recolector_metricas_cliente)
+
+def encontrar_coordinador():
+    """Coordinador actual, se busca en paralelo solo si no hay uno en cache"""
+    return conexiones_nodos.coordinador()
+
+def llamar_coordinador(llamada):
+    """
+    Ejecuta llamada(stub) contra el coordinador. Si falla, se invalida la cache
+    y, si el coordinador no estaba disponible, se reintenta una vez con el nuevo
+    """
+    for intento in range(2):
+        coordinador = encontrar_coordinador()
+        if not coordinador:
+            raise grpc.RpcError("No hay nodos coordinadores disponibles")
         try:
-            with grpc.insecure_channel(direccion_proc) as channel:
-                stub = procesador_pb2_grpc.ProcesadorImagenStub(channel)
-                response = stub.EstadoNodo(procesador_pb2.EstadoRequest(), timeout=2.0)
-                
-                logger.info(f"Nodo {direccion_proc}: activo, coordinador={response.es_coordinador}")
-                if response.es_coordinador and not coordinador_encontrado:
-                    coordinador_encontrado = direccion_proc
-                    recolector_metricas_cliente.actualizar_coordinador(response.nodo_id)
+            return llamada(conexiones_nodos.stub(coordinador))
+        except grpc.RpcError as e:
+            no_disponible = hasattr(e, "code") and e.code() == grpc.StatusCode.UNAVAILABLE
+            conexiones_nodos.invalidar(coordinador, reconectar=no_disponible)
+            if not no_disponible or intento == 1:
+                raise
+            logger.warning(f"Coordinador {coordinador} no disponible, reintentando con uno nuevo")
+
+def leer_pipeline():
+    """
+    Lee el pipeline de operaciones enviado en el formulario como JSON
+
+    [{"nombre": "desenfoque_gaussiano", "parametros": {"kernel": 7}}, {"nombre": "sobel"}]
+    """
+    texto = request.form.get("pipeline", "")
+    if not texto:
+        return []
+
+    pipeline = []
+    for operacion in json.loads(texto):
+        parametros = {clave: float(valor) for clave, valor in operacion.get("parametros", {}).items()}
+        pipeline.append(procesador_pb2.Operacion(nombre=str(operacion["nombre"]), parametros=parametros))
+    return pipeline
+
+def describir_pipeline(pipeline):
+    """Nombre corto del pipeline para etiquetas de metricas"""
+    return "+".join(op.nombre for op in pipeline) or "escala_grises"
+
+def generar_chunks_imagen(data, pipeline=None, imagen_hash=None):
+    """Divide la imagen en chunks de tamaño fijo para el envio por streaming"""
+    vista = memoryview(data)
+    total = len(vista)
+    # el hash de la subida ya se calculo al recibirla
+    sha = None if imagen_hash else hashlib.sha256()
+
+    offset = 0
+    while True:
+        parte = vista[offset:offset + TAMANO_CHUNK]
+        if sha:
+            sha.update(parte)
+        fin = offset + len(parte) >= total
+
+        chunk = procesador_pb2.ImagenChunk(
+            data=bytes(parte),
+            offset=offset,
+            tamano_total=total,
+            fin=fin,
+            sha256=(imagen_hash or sha.hexdigest()) if fin else ""
+        )
+        # el pipeline viaja solo en el primer chunk
+        if offset == 0 and pipeline:
+            chunk.pipeline.extend(pipeline)
+        yield chunk
+
+        if fin:
+            break
+        offset += len(parte)
+
+def recibir_chunks_imagen(respuestas):
+    """Reconstruye la respuesta del coordinador a partir de sus chunks"""
+    buffer = bytearray()
+    sha = hashlib.sha256()
+
+    for chunk in respuestas:
+        buffer += chunk.data
+        sha.update(chunk.data)
+        if chunk.fin:
+            if chunk.status == "ok" and chunk.sha256 != sha.hexdigest():
+                return procesador_pb2.ImagenReply(status="error", mensaje="Checksum de la respuesta no coincide")
+            return procesador_pb2.ImagenReply(status=chunk.status, imagen_data=bytes(buffer), mensaje=chunk.mensaje)
+
+    return procesador_pb2.ImagenReply(status="error", mensaje="Respuesta incompleta del coordinador")
+
+def agrupar_en_lotes(tamanos, limite=TAMANO_MAX_LOTE):
+    """Agrupa los indices de las imagenes en lotes que no superan el limite, las mayores van solas"""
+    lotes, actual, tamano_actual = [], [], 0
+    for indice, tamano in enumerate(tamanos):
+        if actual and tamano_actual + tamano > limite:
+            lotes.append(actual)
+            actual, tamano_actual = [], 0
+        actual.append(indice)
+        tamano_actual += tamano
+    if actual:
+        lotes.append(actual)
+    return lotes
+
+def iniciar_almacenamiento(usuario_id, data, tipo_imagen, carpeta, nombre_imagen, base_url, imagen_hash=None, origen_id=None):
+    """
+    Empieza a guardar la imagen en GlusterFS, en segundo plano junto con las demas escrituras.
+    Retorna una funcion que espera a que la imagen quede guardada y retorna su URL; si GlusterFS
+    no esta disponible o la escritura falla, la imagen se guarda en la carpeta local
+    """
+    escritura = None
+    if gfs:
+        try:
+            escritura = gfs.guardar_imagen_diferida(
+                usuario_id=usuario_id, imagen_data=data, tipo_imagen=tipo_imagen,
+                imagen_hash=imagen_hash, origen_id=origen_id
+            )
         except Exception as e:
-            logger.debug(f"Nodo {direccion_proc} no disponible: {e}")
-            continue
-    
-    duracion = time.time() - inicio
-    recolector_metricas_cliente.track_tiempo_coordinador(duracion)
-    
-    if not coordinador_encontrado:
-        recolector_metricas_cliente.actualizar_coordinador(0)
-    
-    return coordinador_encontrado
+            logger.error(f"Error almacenando en GlusterFS: {e}")
+
+    def obtener_url():
+        if escritura:
+            if escritura.esperar():
+                return f"{base_url}/usuario/{usuario_id}/imagen/{escritura.imagen_id}"
+            logger.error(f"Error almacenando {escritura.imagen_id} en GlusterFS, se guarda en {carpeta}: {escritura.error}")
+
+        with open(os.path.join(carpeta, nombre_imagen), "wb") as f:
+            f.write(data)
+        ruta = "subidos" if carpeta == CARPETA_SUBIDOS else "procesados"
+        return f"{base_url}/{ruta}/{nombre_imagen}"
+
+    return obtener_url
+
+def almacenar_imagen(usuario_id, data, tipo_imagen, carpeta, nombre_imagen, base_url, imagen_hash=None, origen_id=None):
+    """Guarda la imagen en GlusterFS o, si no esta disponible, en la carpeta local; retorna su URL"""
+    return iniciar_almacenamiento(usuario_id, data, tipo_imagen, carpeta, nombre_imagen, base_url, imagen_hash, origen_id)()
+
+def agregar_urls(imagenes, usuario_id, base_url):
+    """URL de cada imagen y de sus miniaturas, para las grillas"""
+    for imagen in imagenes:
+        if imagen.get('imagen_id'):
+            imagen['url'] = f"{base_url}/usuario/{usuario_id}/imagen/{imagen['imagen_id']}"
+            if miniaturas_disponibles():
+                imagen['miniatura'], imagen['miniatura_2x'] = (
+                    f"{imagen['url']}/miniatura/{tamano}" for tamano in TAMANOS_MINIATURA
+                )
+
+def enviar_inmutable(archivo, mimetype, etag):
+    """
+    Respuesta de una imagen guardada con ETag fuerte y cache de un año;
+    send_file responde 304 a If-None-Match y 206 a peticiones Range, y
+    con una ruta envia el archivo por partes sin leerlo completo
+    """
+    response = send_file(archivo, mimetype=mimetype, etag=etag, conditional=True,
+                         max_age=CACHE_IMAGENES_SEGUNDOS)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def no_modificada(etag):
+    """304 si el navegador ya tiene esa version, antes de leer o generar la imagen"""
+    if not request.if_none_match.contains(etag):
+        return None
+    response = make_response("", 304)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_IMAGENES_SEGUNDOS
+    response.cache_control.immutable = True
+    return response
 
 def categorizar_tamano_mb(tamano_mb):
     """Categoriza el tamaño de imagen en MB"""
@@ -138,39 +322,39 @@ def index():
     if gfs:
         try:
             imagenes = gfs.get_imagenes_usuario(usuario_id=usuario_id, limite=6)
-            base_url = get_url_base(request)
-            for imagen in imagenes:
-                if imagen.get('imagen_id'):
-                    imagen['url'] = f"{base_url}/usuario/{usuario_id}/imagen/{imagen['imagen_id']}"
+            agregar_urls(imagenes, usuario_id, get_url_base(request))
         except Exception as e:
             logger.error(f"Error obteniendo imagenes del usuario: {e}")
     return render_template("index.html", 
                          imagenes=imagenes, 
                          usuario_id=usuario_id,
-                         glusterfs_disponible=gfs is not None)
+                         glusterfs_disponible=gfs is not None,
+                         tamano_max_mb=TAMANO_MAX_MB)
 
 @app.route("/galeria")
 @monitor_request("galeria")
 def galeria():
     usuario_id = request.cookies.get("usuario_id", str(uuid.uuid4()))
+    pagina = max(1, request.args.get("pagina", 1, type=int))
     
-    # todas las imagenes del usuario  
+    # una pagina de imagenes del usuario, las mas recientes primero
     imagenes_originales = []
     imagenes_procesadas = []
-    total_imagenes = 0
+    total_originales = 0
+    total_procesadas = 0
+    total_paginas = 1
 
     if gfs:
         try:
-            imagenes_originales = gfs.get_imagenes_usuario(usuario_id, "original")
-            imagenes_procesadas = gfs.get_imagenes_usuario(usuario_id, "procesada")
+            desplazamiento = (pagina - 1) * IMAGENES_POR_PAGINA
+            imagenes_originales = gfs.get_imagenes_usuario(usuario_id, "original", IMAGENES_POR_PAGINA, desplazamiento)
+            imagenes_procesadas = gfs.get_imagenes_usuario(usuario_id, "procesada", IMAGENES_POR_PAGINA, desplazamiento)
+            total_originales = gfs.contar_imagenes_usuario(usuario_id, "original")
+            total_procesadas = gfs.contar_imagenes_usuario(usuario_id, "procesada")
             base_url = get_url_base(request)
-            for imagen in imagenes_originales:
-                if imagen.get('imagen_id'):
-                    imagen['url'] = f"{base_url}/usuario/{usuario_id}/imagen/{imagen['imagen_id']}"
-            for imagen in imagenes_procesadas:
-                if imagen.get('imagen_id'):
-                    imagen['url'] = f"{base_url}/usuario/{usuario_id}/imagen/{imagen['imagen_id']}"
-            total_imagenes = len(imagenes_originales) + len(imagenes_procesadas)
+            agregar_urls(imagenes_originales, usuario_id, base_url)
+            agregar_urls(imagenes_procesadas, usuario_id, base_url)
+            total_paginas = max(1, -(-max(total_originales, total_procesadas) // IMAGENES_POR_PAGINA))
         except Exception as e:
             logger.error(f"Error obteniendo galería del usuario: {e}")
 
@@ -178,7 +362,11 @@ def galeria():
                          originales=imagenes_originales,
                          procesadas=imagenes_procesadas,
                          usuario_id=usuario_id,
-                         total_imagenes=total_imagenes
+                         total_imagenes=total_originales + total_procesadas,
+                         total_originales=total_originales,
+                         total_procesadas=total_procesadas,
+                         pagina=pagina,
+                         total_paginas=total_paginas
                         )
 
 @app.route("/resultado")
@@ -191,124 +379,504 @@ def resultado():
 @app.route("/procesar", methods=["POST"])
 @monitor_request("procesar")
 def procesar_imagen():
+    """Valida la subida y encola su procesamiento, el avance se sigue en /trabajos/<id>"""
     usuario_id = request.cookies.get('usuario_id', str(uuid.uuid4()))
-    try:
-        if "img" not in request.files:
-            recolector_metricas_cliente.track_imagen_subida("error_no_archivo")
-            return jsonify({"error": "No se ha enviado ninguna imagen"}), 400
-        
-        archivo_imagen = request.files["img"]
+    if "img" not in request.files:
+        recolector_metricas_cliente.track_imagen_subida("error_no_archivo")
+        return jsonify({"error": "No se ha enviado ninguna imagen"}), 400
 
-        if archivo_imagen.filename.split(".")[-1].lower() not in ["jpg", "jpeg", "png", "webp"]:
-            recolector_metricas_cliente.track_imagen_subida("error_formato")
-            return jsonify({"error": "Formato de imagen no soportado"}), 400
-        
-        data = archivo_imagen.read()
-        tamaño_mb = len(data) / (1024 * 1024)
-        categoria_tamano = categorizar_tamano_mb(tamaño_mb)
-        
-        if tamaño_mb > 20:
-            recolector_metricas_cliente.track_imagen_subida("error_tamaño")
-            return jsonify({"error": "El tamaño de la imagen no debe exceder los 20 MB"}), 400
-        archivo_imagen.seek(0)
+    archivos = request.files.getlist("img")
+
+    if any(a.filename.split(".")[-1].lower() not in ["jpg", "jpeg", "png", "webp"] for a in archivos):
+        recolector_metricas_cliente.track_imagen_subida("error_formato")
+        return jsonify({"error": "Formato de imagen no soportado"}), 400
 
-        nombre_imagen = str(uuid.uuid4()) + "-" + secure_filename(archivo_imagen.filename)
-        path_original = os.path.join(CARPETA_SUBIDOS, nombre_imagen)
+    try:
+        pipeline = leer_pipeline()
+    except (ValueError, KeyError, TypeError, AttributeError):
+        recolector_metricas_cliente.track_imagen_subida("error_pipeline")
+        return jsonify({"error": "Pipeline de operaciones invalido"}), 400
+
+    # cada archivo ya llego completo a memoria con su tamaño y hash
+    subidas = [archivo.stream for archivo in archivos]
+    if any(subida.excedido for subida in subidas):
+        recolector_metricas_cliente.track_imagen_subida("error_tamaño")
+        return jsonify({"error": f"El tamaño de la imagen no debe exceder los {TAMANO_MAX_MB} MB"}), 400
+    datos = [subida.getvalue() for subida in subidas]
+    hashes = [subida.sha256 for subida in subidas]
+
+    nombres = [str(uuid.uuid4()) + "-" + secure_filename(archivo.filename) for archivo in archivos]
+    nombres_archivo = [archivo.filename for archivo in archivos]
+    base_url = get_url_base(request)
+
+    # el trabajo corre en un despachador, el hilo web queda libre
+    if len(datos) == 1:
+        funcion = lambda trabajo: ejecutar_procesamiento(
+            trabajo, datos[0], hashes[0], nombres[0], pipeline, usuario_id, base_url
+        )
+    else:
+        funcion = lambda trabajo: ejecutar_lote(
+            trabajo, datos, hashes, nombres, nombres_archivo, pipeline, usuario_id, base_url
+        )
 
-        #guardar imagen original
-        archivo_imagen.save(path_original)
+    try:
+        trabajo = cola_trabajos.encolar(usuario_id, funcion, tamano=sum(len(data) for data in datos))
+    except ColaLlena:
+        recolector_metricas_cliente.track_imagen_subida("error_cola_llena")
+        return jsonify({"error": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503
+
+    response = make_response(jsonify({
+        "trabajo_id": trabajo.id,
+        "estado": trabajo.estado,
+        "estado_url": f"/trabajos/{trabajo.id}",
+        "eventos_url": f"/trabajos/{trabajo.id}/eventos",
+    }), 202)
+    response.set_cookie("usuario_id", usuario_id, max_age=30*24*60*60)
+    return response
+
+@app.route("/usuario/<usuario_id>/imagen/<imagen_id>/reprocesar", methods=["POST"])
+@monitor_request("reprocesar")
+def reprocesar_imagen(usuario_id, imagen_id):
+    """Encola un nuevo procesamiento de una imagen ya guardada, sin volver a subirla"""
+    if request.cookies.get("usuario_id") != usuario_id:
+        return jsonify({"error": "Imagen no encontrada"}), 404
+    if not gfs:
+        return jsonify({"error": "Sistema de archivos distribuido no disponible"}), 503
 
-        #nombre final de la imagen procesada
-        nombre_final_imagen = "final-" + nombre_imagen
-        path_final = os.path.join(CARPETA_PROCESADOS, nombre_final_imagen)
+    metadata = gfs.get_metadata(usuario_id, imagen_id)
+    if not metadata or not metadata.get("principal_path"):
+        return jsonify({"error": "Imagen no encontrada"}), 404
 
-        with open(path_original, "rb") as f:
-            data = f.read()
+    try:
+        pipeline = leer_pipeline()
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return jsonify({"error": "Pipeline de operaciones invalido"}), 400
 
-        imagen_original_id = None
-        if gfs:
+    base_url = get_url_base(request)
+    try:
+        trabajo = cola_trabajos.encolar(
+            usuario_id, lambda trabajo: ejecutar_reprocesamiento(trabajo, metadata, pipeline, usuario_id, base_url)
+        )
+    except ColaLlena:
+        return jsonify({"error": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503
+
+    return jsonify({
+        "trabajo_id": trabajo.id,
+        "estado": trabajo.estado,
+        "estado_url": f"/trabajos/{trabajo.id}",
+        "eventos_url": f"/trabajos/{trabajo.id}/eventos",
+    }), 202
+
+def unir_parte_final(partes):
+    """Entrega las teselas tal como llegan y la imagen final, que llega en varios mensajes, en una sola parte"""
+    buffer = bytearray()
+    for parte in partes:
+        if not parte.final:
+            yield parte
+        elif parte.continua:
+            buffer += parte.imagen_data
+        else:
+            if buffer:
+                buffer += parte.imagen_data
+                parte.imagen_data = bytes(buffer)
+            yield parte
+            return
+
+def recibir_partes_progresivas(partes, trabajo):
+    """Publica el avance de cada tesela y retorna la imagen final como ImagenReply"""
+    completadas = 0
+    for parte in unir_parte_final(partes):
+        if not parte.final:
+            completadas += 1
+            trabajo.publicar("progreso", {
+                "completadas": completadas,
+                "total": parte.total_partes,
+                "indice": parte.indice,
+            })
+            continue
+        return procesador_pb2.ImagenReply(status=parte.status, imagen_data=parte.imagen_data, mensaje=parte.mensaje)
+
+    return procesador_pb2.ImagenReply(status="error", mensaje="Respuesta incompleta del coordinador")
+
+def enviar_imagen(stub, trabajo, data, pipeline, imagen_hash=None):
+    """Envia la imagen al coordinador, con avance por tesela si cabe en un mensaje; retorna ImagenReply"""
+    tamaño_mb = len(data) / (1024 * 1024)
+    if len(data) < TAMANO_MAX_PROGRESIVO:
+        return recibir_partes_progresivas(
+            stub.ProcesarImagenProgresivo(
+                procesador_pb2.ImagenRequest(data=data, pipeline=pipeline), timeout=30.0 + tamaño_mb
+            ),
+            trabajo
+        )
+    # no cabe en un mensaje unario: viaja en chunks, sin avance por tesela
+    return recibir_chunks_imagen(
+        stub.ProcesarImagenStream(generar_chunks_imagen(data, pipeline, imagen_hash), timeout=30.0 + tamaño_mb)
+    )
+
+def procesar_en_cluster(llamada, pipeline, categoria_tamano):
+    """Ejecuta llamada(stub) en el coordinador; retorna los bytes procesados o lanza ErrorTrabajo"""
+    if not encontrar_coordinador():
+        recolector_metricas_cliente.track_imagen_subida("error_no_coordinador")
+        raise ErrorTrabajo("No hay nodos coordinadores disponibles")
+
+    procesamiento_inicio = time.time()
+    try:
+        response = llamar_coordinador(llamada)
+    except grpc.RpcError as e:
+        logger.error(f"Error gRPC procesando imagen: {e}")
+        recolector_metricas_cliente.track_imagen_subida("error_grpc")
+        recolector_metricas_cliente.track_procesamiento_imagen(0, "error", "error")
+        raise ErrorTrabajo("Error de comunicación con el servidor")
+
+    recolector_metricas_cliente.track_procesamiento_imagen(
+        time.time() - procesamiento_inicio,
+        categoria_tamano,
+        describir_pipeline(pipeline)
+    )
+    if response.status != "ok":
+        recolector_metricas_cliente.track_imagen_subida("error_procesamiento")
+        raise ErrorTrabajo("Error en el procesamiento de la imagen: " + response.mensaje)
+    return response.imagen_data
+
+def obtener_resultado(trabajo, imagen_hash, pipeline, calcular):
+    """
+    Resultado desde la cache o calculado con calcular(); una imagen ya procesada con el
+    mismo pipeline no vuelve al cluster, y peticiones iguales simultaneas esperan un solo procesamiento
+    """
+    if not cache_resultados or not imagen_hash:
+        return calcular()
+
+    imagen_procesada, origen = cache_resultados.obtener_o_calcular(clave_resultado(imagen_hash, pipeline), calcular)
+    if origen != MISS:
+        trabajo.publicar("progreso", {"completadas": 1, "total": 1, "cache": origen})
+    return imagen_procesada
+
+def ejecutar_procesamiento(trabajo, data, imagen_hash, nombre_imagen, pipeline, usuario_id, base_url):
+    """Procesa una imagen en un despachador, publicando el avance de cada tesela"""
+    categoria_tamano = categorizar_tamano_mb(len(data) / (1024 * 1024))
+    # la original se guarda mientras se procesa, su URL se publica al terminar
+    original = iniciar_almacenamiento(usuario_id, data, "original", CARPETA_SUBIDOS, nombre_imagen, base_url, imagen_hash)
+
+    imagen_procesada = obtener_resultado(trabajo, imagen_hash, pipeline, lambda: procesar_en_cluster(
+        lambda stub: enviar_imagen(stub, trabajo, data, pipeline, imagen_hash), pipeline, categoria_tamano
+    ))
+
+    final = almacenar_imagen(usuario_id, imagen_procesada, "procesada", CARPETA_PROCESADOS, "final-" + nombre_imagen, base_url)
+    recolector_metricas_cliente.track_imagen_subida("exito")
+    return {"original": original(), "final": final}
+
+def ejecutar_reprocesamiento(trabajo, metadata, pipeline, usuario_id, base_url):
+    """
+    Procesa una imagen ya guardada en GlusterFS: el coordinador la lee de su montaje,
+    sin que el cliente la lea ni la vuelva a subir. Si el coordinador no tiene el
+    volumen montado, se lee aqui y se envia en la peticion
+    """
+    imagen_id = metadata["imagen_id"]
+    ruta_origen = os.path.relpath(metadata["principal_path"], gfs.mnt_punto)
+    tamaño_mb = metadata.get("tamano_mb", 0)
+
+    def procesar_desde_origen(stub):
+        try:
+            return recibir_partes_progresivas(
+                stub.ProcesarImagenProgresivo(
+                    procesador_pb2.ImagenRequest(ruta_origen=ruta_origen, pipeline=pipeline), timeout=30.0 + tamaño_mb
+                ),
+                trabajo
+            )
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.FAILED_PRECONDITION:
+                raise
+            logger.warning(f"Coordinador sin acceso a {ruta_origen}, se envia la imagen: {e.details()}")
+
+        data = gfs.get_imagen_distribuida(usuario_id, imagen_id)
+        if data is None:
+            raise ErrorTrabajo("Imagen no encontrada en sistema distribuido")
+        return enviar_imagen(stub, trabajo, data, pipeline)
+
+    imagen_procesada = obtener_resultado(trabajo, metadata.get("imagen_hash"), pipeline, lambda: procesar_en_cluster(
+        procesar_desde_origen, pipeline, categorizar_tamano_mb(tamaño_mb)
+    ))
+
+    final = almacenar_imagen(
+        usuario_id, imagen_procesada, "procesada", CARPETA_PROCESADOS,
+        f"final-{uuid.uuid4()}-{imagen_id}.png", base_url, origen_id=imagen_id
+    )
+    recolector_metricas_cliente.track_imagen_subida("exito")
+    return {"original": f"{base_url}/usuario/{usuario_id}/imagen/{imagen_id}", "final": final}
+
+def ejecutar_lote(trabajo, datos, hashes, nombres, nombres_archivo, pipeline, usuario_id, base_url):
+    """
+    Procesa varias imagenes con el mismo pipeline. Se agrupan en lotes de hasta
+    TAMANO_MAX_LOTE y cada lote es una llamada ProcesarImagenes, que entrega cada
+    imagen apenas termina; una imagen mayor al lote viaja sola por chunks
+    """
+    resultados = [None] * len(datos)
+    claves = [clave_resultado(imagen_hash, pipeline) for imagen_hash in hashes]
+    # las escrituras se confirman juntas al final, las URL se publican solo ya guardadas
+    originales = [iniciar_almacenamiento(usuario_id, data, "original", CARPETA_SUBIDOS, nombre, base_url, imagen_hash)
+                  for data, nombre, imagen_hash in zip(datos, nombres, hashes)]
+
+    def guardar_resultado(indice, status, imagen_data, mensaje, duracion=None):
+        if duracion is not None:
+            categoria_tamano = categorizar_tamano_mb(len(datos[indice]) / (1024 * 1024))
+            recolector_metricas_cliente.track_procesamiento_imagen(duracion, categoria_tamano, describir_pipeline(pipeline))
+        if status != "ok":
+            recolector_metricas_cliente.track_imagen_subida("error_procesamiento")
+            resultados[indice] = {"error": "Error en el procesamiento de la imagen: " + mensaje}
+        else:
+            final = iniciar_almacenamiento(usuario_id, imagen_data, "procesada", CARPETA_PROCESADOS, "final-" + nombres[indice], base_url)
+            recolector_metricas_cliente.track_imagen_subida("exito")
+            resultados[indice] = {"final": final}
+
+        trabajo.publicar("progreso", {
+            "completadas": sum(r is not None for r in resultados),
+            "total": len(datos),
+            "indice": indice,
+        })
+
+    def completar(indice, status, imagen_data, mensaje, duracion=None):
+        # el resultado tambien vale para las copias de la misma imagen dentro del lote
+        guardar_resultado(indice, status, imagen_data, mensaje, duracion)
+        for repetida in repetidas.get(indice, []):
+            guardar_resultado(repetida, status, imagen_data, mensaje)
+
+    def guardar_en_cache(indice, respuesta):
+        if respuesta.status == "ok" and cache_resultados:
             try:
-                imagen_original_id = gfs.guardar_imagen(
-                    usuario_id=usuario_id,
-                    imagen_data=data,
-                    tipo_imagen="original",
-                )
+                cache_resultados.guardar(claves[indice], respuesta.imagen_data)
+            except OSError as e:
+                logger.error(f"Error guardando resultado en cache: {e}")
+
+    # las imagenes repetidas dentro del lote se procesan una sola vez
+    unicas, repetidas = {}, {}
+    for indice, clave in enumerate(claves):
+        if clave in unicas:
+            repetidas.setdefault(unicas[clave], []).append(indice)
+            if cache_resultados:
+                cache_resultados.registrar(COALESCIDO)
+        else:
+            unicas[clave] = indice
+
+    # las ya procesadas salen de la cache, el resto va al cluster
+    pendientes = []
+    for clave, indice in unicas.items():
+        imagen_cache = cache_resultados.buscar(clave) if cache_resultados else None
+        if imagen_cache is not None:
+            completar(indice, "ok", imagen_cache, "")
+        else:
+            pendientes.append(indice)
 
-            except Exception as e:
-                logger.error(f"Error almacenando en GlusterFS: {e}")
+    if pendientes and not encontrar_coordinador():
+        recolector_metricas_cliente.track_imagen_subida("error_no_coordinador")
+        raise ErrorTrabajo("No hay nodos coordinadores disponibles")
+
+    logger.info(f"Enviando {len(pendientes)} de {len(datos)} imagenes al coordinador para procesamiento...")
+    try:
+        for lote in agrupar_en_lotes([len(datos[i]) for i in pendientes]):
+            lote = [pendientes[i] for i in lote]
+            inicio = time.time()
+            tamano_mb = sum(len(datos[i]) for i in lote) / (1024 * 1024)
+
+            if len(lote) == 1 and len(datos[lote[0]]) > TAMANO_MAX_LOTE:
+                indice = lote[0]
+                respuesta = llamar_coordinador(lambda stub: recibir_chunks_imagen(
+                    stub.ProcesarImagenStream(generar_chunks_imagen(datos[indice], pipeline, hashes[indice]), timeout=30.0 + tamano_mb)
+                ))
+                guardar_en_cache(indice, respuesta)
+                completar(indice, respuesta.status, respuesta.imagen_data, respuesta.mensaje, time.time() - inicio)
+                continue
+
+            # cada imagen se guarda apenas llega, mientras el resto del lote se sigue procesando
+            def procesar_lote(stub, lote=lote, inicio=inicio, tamano_mb=tamano_mb):
+                peticion = procesador_pb2.ImagenesRequest(imagenes=[datos[i] for i in lote], pipeline=pipeline)
+                for respuesta in stub.ProcesarImagenes(peticion, timeout=30.0 + 2 * tamano_mb):
+                    guardar_en_cache(lote[respuesta.indice], respuesta)
+                    completar(lote[respuesta.indice], respuesta.status, respuesta.imagen_data,
+                              respuesta.mensaje, time.time() - inicio)
+
+            llamar_coordinador(procesar_lote)
+
+    except grpc.RpcError as e:
+        logger.error(f"Error gRPC procesando lote de imagenes: {e}")
+        recolector_metricas_cliente.track_imagen_subida("error_grpc")
+        if not any(resultados):
+            raise ErrorTrabajo("Error de comunicación con el servidor")
+
+    resultados = [r or {"error": "Imagen no procesada"} for r in resultados]
+    for nombre_archivo, original, resultado in zip(nombres_archivo, originales, resultados):
+        # la original se confirma aunque su procesamiento haya fallado
+        url_original = original()
+        if "final" in resultado:
+            resultado["original"] = url_original
+            resultado["final"] = resultado["final"]()
+        resultado["nombre"] = nombre_archivo
+
+    if not any("final" in r for r in resultados):
+        raise ErrorTrabajo("No se pudo procesar ninguna imagen")
+    return {"resultados": resultados}
+
+def obtener_trabajo_usuario(trabajo_id):
+    """Trabajo del usuario de la cookie, None si no existe o es de otro usuario"""
+    trabajo = cola_trabajos.obtener(trabajo_id)
+    if trabajo and trabajo.usuario_id == request.cookies.get("usuario_id"):
+        return trabajo
+    return None
+
+@app.route("/trabajos/<trabajo_id>")
+@monitor_request("trabajo")
+def estado_trabajo(trabajo_id):
+    trabajo = obtener_trabajo_usuario(trabajo_id)
+    if not trabajo:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    return jsonify(trabajo.a_dict())
+
+@app.route("/trabajos/<trabajo_id>/eventos")
+@monitor_request("trabajo_eventos")
+def eventos_trabajo(trabajo_id):
+    """Server-Sent Events con el avance del trabajo, hasta el evento final o de error"""
+    trabajo = obtener_trabajo_usuario(trabajo_id)
+    if not trabajo:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+
+    # al reconectar, el navegador envia el id del ultimo evento recibido
+    try:
+        posicion = int(request.headers.get("Last-Event-ID", "-1")) + 1
+    except ValueError:
+        posicion = 0
+
+    def generar_eventos():
+        nonlocal posicion
+        while True:
+            eventos = trabajo.esperar_eventos(posicion, INTERVALO_KEEPALIVE_SSE)
+            if not eventos:
+                if trabajo.finalizado:
+                    return
+                yield ": keepalive\n\n"
+                continue
+            for tipo, datos in eventos:
+                yield f"id: {posicion}\nevent: {tipo}\ndata: {json.dumps(datos)}\n\n"
+                posicion += 1
+            if trabajo.finalizado and posicion >= len(trabajo.eventos):
+                return
+
+    response = Response(stream_with_context(generar_eventos()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route("/procesar/progresivo", methods=["POST"])
+@monitor_request("procesar_progresivo")
+def procesar_imagen_progresivo():
+    """Procesa la imagen y reenvia cada franja al navegador apenas esta lista (NDJSON)"""
+    usuario_id = request.cookies.get('usuario_id', str(uuid.uuid4()))
+
+    if "img" not in request.files:
+        recolector_metricas_cliente.track_imagen_subida("error_no_archivo")
+        return jsonify({"error": "No se ha enviado ninguna imagen"}), 400
+
+    archivo_imagen = request.files["img"]
+
+    if archivo_imagen.filename.split(".")[-1].lower() not in ["jpg", "jpeg", "png", "webp"]:
+        recolector_metricas_cliente.track_imagen_subida("error_formato")
+        return jsonify({"error": "Formato de imagen no soportado"}), 400
+
+    try:
+        pipeline = leer_pipeline()
+    except (ValueError, KeyError, TypeError, AttributeError):
+        recolector_metricas_cliente.track_imagen_subida("error_pipeline")
+        return jsonify({"error": "Pipeline de operaciones invalido"}), 400
+
+    subida = archivo_imagen.stream
+    tamaño_mb = subida.tamano / (1024 * 1024)
+    categoria_tamano = categorizar_tamano_mb(tamaño_mb)
+
+    # la peticion progresiva es unaria, se respeta el limite de mensaje gRPC
+    if subida.excedido or subida.tamano >= TAMANO_MAX_PROGRESIVO:
+        recolector_metricas_cliente.track_imagen_subida("error_tamaño")
+        return jsonify({"error": f"El tamaño de la imagen debe ser menor a {TAMANO_MAX_PROGRESIVO // (1024 * 1024)} MB"}), 400
+
+    data = subida.getvalue()
+    imagen_hash = subida.sha256
+    nombre_imagen = str(uuid.uuid4()) + "-" + secure_filename(archivo_imagen.filename)
+
+    clave_cache = clave_resultado(imagen_hash, pipeline)
+    imagen_cache = cache_resultados.buscar(clave_cache) if cache_resultados else None
 
-        # se intenta encontrar un nodo coordinador
+    coordinador = None
+    if imagen_cache is None:
         coordinador = encontrar_coordinador()
         if not coordinador:
             recolector_metricas_cliente.track_imagen_subida("error_no_coordinador")
             return jsonify({"error": "No hay nodos coordinadores disponibles"}), 503
 
-        logger.info(f"Enviando imagen a coordinador {coordinador} para procesamiento...")
-        
+    base_url = get_url_base(request)
+    original = iniciar_almacenamiento(usuario_id, data, "original", CARPETA_SUBIDOS, nombre_imagen, base_url, imagen_hash)
+
+    def generar_eventos():
         procesamiento_inicio = time.time()
-        with grpc.insecure_channel(coordinador, options=[
-                ('grpc.max_receive_message_length', 20 * 1024 * 1024),  # 20MB
-                ('grpc.max_send_message_length', 20 * 1024 * 1024)
-            ]) as channel:
-            
-            stub = procesador_pb2_grpc.ProcesadorImagenStub(channel)
-            response = stub.ProcesarImagen(procesador_pb2.ImagenRequest(data=data), timeout=30.0)
-            
-            procesamiento_duracion = time.time() - procesamiento_inicio        
-            recolector_metricas_cliente.track_procesamiento_imagen(
-                procesamiento_duracion, 
-                categoria_tamano, 
-                "escala grises"
-            )
-            if response.status == "ok":
-                with open(path_final, "wb") as f:
-                    f.write(response.imagen_data)
+        try:
+            if imagen_cache is not None:
+                # resultado en cache: solo la parte final, sin pasar por el cluster
+                partes = [procesador_pb2.ParteProcesada(final=True, status="ok", imagen_data=imagen_cache)]
+            else:
+                stub = conexiones_nodos.stub(coordinador)
+                partes = unir_parte_final(stub.ProcesarImagenProgresivo(
+                    procesador_pb2.ImagenRequest(data=data, pipeline=pipeline), timeout=30.0
+                ))
+
+            for parte in partes:
+                # franja lista, se reenvia de inmediato
+                if not parte.final:
+                    yield json.dumps({
+                        "tipo": "parte",
+                        "indice": parte.indice,
+                        "fila_inicio": parte.fila_inicio,
+                        "columna_inicio": parte.columna_inicio,
+                        "total_partes": parte.total_partes,
+                        "alto_total": parte.alto_total,
+                        "ancho_total": parte.ancho_total,
+                        "imagen": base64.b64encode(parte.imagen_data).decode("ascii"),
+                    }) + "\n"
+                    continue
+
+                recolector_metricas_cliente.track_procesamiento_imagen(
+                    time.time() - procesamiento_inicio,
+                    categoria_tamano,
+                    describir_pipeline(pipeline)
+                )
+
+                if parte.status != "ok":
+                    recolector_metricas_cliente.track_imagen_subida("error_procesamiento")
+                    yield json.dumps({"tipo": "error", "error": "Error en el procesamiento de la imagen: " + parte.mensaje}) + "\n"
+                    return
 
-                imagen_procesada_id = None
-                if gfs:
+                if imagen_cache is None and cache_resultados:
                     try:
-                        imagen_procesada_id = gfs.guardar_imagen(
-                            usuario_id=usuario_id,
-                            imagen_data=response.imagen_data,
-                            tipo_imagen="procesada",
-                        )
-                    except Exception as e:
-                        logger.error(f"Error almacenando en GlusterFS: {e}")
-                        
-                base_url = get_url_base(request)
-                response_data = {}
-                if imagen_procesada_id and imagen_original_id:
-                    response_data.update({
-                        "original": f"{base_url}/usuario/{usuario_id}/imagen/{imagen_original_id}",
-                        "final": f"{base_url}/usuario/{usuario_id}/imagen/{imagen_procesada_id}",
-                    })
-                else:
-                    response_data.update({
-                        "original": f"{base_url}/subidos/{nombre_imagen}",
-                        "final": f"{base_url}/procesados/{nombre_final_imagen}",
-                    })
+                        cache_resultados.guardar(clave_cache, parte.imagen_data)
+                    except OSError as e:
+                        logger.error(f"Error guardando resultado en cache: {e}")
+
+                final = iniciar_almacenamiento(
+                    usuario_id, parte.imagen_data, "procesada", CARPETA_PROCESADOS, "final-" + nombre_imagen, base_url
+                )
+                urls = {"original": original(), "final": final()}
 
                 recolector_metricas_cliente.track_imagen_subida("exito")
-                
-                response = make_response(jsonify(response_data))
-                response.set_cookie("usuario_id", usuario_id, max_age=30*24*60*60)
-                return response, 200
-            else:
-                recolector_metricas_cliente.track_imagen_subida("error_procesamiento")
-                return jsonify({"error": "Error en el procesamiento de la imagen: " + response.mensaje}), 500
-                
-    except grpc.RpcError as e:
-        logger.error(f"Error gRPC procesando imagen: {e}")
-        recolector_metricas_cliente.track_imagen_subida("error_grpc")
-        recolector_metricas_cliente.track_procesamiento_imagen(0, "error", "error")
-        return jsonify({"error": "Error de comunicación con el servidor"}), 503
-        
-    except Exception as e:
-        recolector_metricas_cliente.track_imagen_subida("error_general")
-        recolector_metricas_cliente.track_procesamiento_imagen(0, "error", "error")
+                yield json.dumps({"tipo": "final", **urls}) + "\n"
+                return
+
+            yield json.dumps({"tipo": "error", "error": "Respuesta incompleta del coordinador"}) + "\n"
 
-        logger.error(f"Error procesando imagen: {e}")
-        return jsonify({"error": "Error interno del servidor"}), 500
+        except grpc.RpcError as e:
+            logger.error(f"Error gRPC procesando imagen: {e}")
+            # las franjas ya enviadas no se pueden repetir, solo se invalida el coordinador
+            conexiones_nodos.invalidar(coordinador, reconectar=e.code() == grpc.StatusCode.UNAVAILABLE)
+            recolector_metricas_cliente.track_imagen_subida("error_grpc")
+            yield json.dumps({"tipo": "error", "error": "Error de comunicación con el servidor"}) + "\n"
+
+    response = Response(stream_with_context(generar_eventos()), mimetype="application/x-ndjson")
+    response.set_cookie("usuario_id", usuario_id, max_age=30*24*60*60)
+    return response
 
 @app.route("/usuario/<usuario_id>/imagen/<imagen_id>")
 @monitor_request("imagen_distribuida")
@@ -317,17 +885,44 @@ def get_imagen_distribuida(usuario_id, imagen_id):
         return "Sistema de archivos distribuido no disponible", 503
     
     try:
-        imagen_data = gfs.get_imagen_distribuida(usuario_id, imagen_id)
-        
-        if imagen_data:
-            return Response(imagen_data, mimetype='image/jpeg')
-        else:
+        archivo, metadata = gfs.get_archivo_imagen(usuario_id, imagen_id)
+        if archivo is None:
             return "Imagen no encontrada en sistema distribuido", 404
-            
+
+        etag = metadata.get("imagen_hash") or imagen_id
+        return enviar_inmutable(archivo, metadata.get("mimetype", "image/jpeg"), etag)
+
+    except FileNotFoundError:
+        return "Imagen no encontrada en sistema distribuido", 404
     except Exception as e:
         logger.error(f"Error sirviendo imagen distribuida: {e}")
         return "Error accediendo al sistema distribuido", 500
     
+@app.route("/usuario/<usuario_id>/imagen/<imagen_id>/miniatura/<int:tamano>")
+@monitor_request("miniatura")
+def get_miniatura(usuario_id, imagen_id, tamano):
+    if tamano not in TAMANOS_MINIATURA:
+        return "Tamaño de miniatura no soportado", 404
+    if not gfs:
+        return "Sistema de archivos distribuido no disponible", 503
+    if not miniaturas_disponibles():
+        return redirect(f"/usuario/{usuario_id}/imagen/{imagen_id}")
+
+    etag = f"{imagen_id}-{tamano}"
+    response = no_modificada(etag)
+    if response:
+        return response
+
+    try:
+        datos = miniaturas.obtener(usuario_id, imagen_id, tamano)
+        if datos is None:
+            return "Imagen no encontrada en sistema distribuido", 404
+        return enviar_inmutable(io.BytesIO(datos), "image/jpeg", etag)
+
+    except Exception as e:
+        logger.error(f"Error sirviendo miniatura de {imagen_id}: {e}")
+        return "Error generando miniatura", 500
+
 @app.route("/cluster/health")
 @monitor_request("cluster_health")
 def cluster_health():
@@ -378,6 +973,10 @@ def cleanup():
             logger.info("Servidor de métricas detenido correctamente")
         except Exception as e:
             logger.error(f"Error deteniendo servidor de métricas: {e}")
+    cola_trabajos.detener()
+    conexiones_nodos.cerrar()
+    if gfs:
+        gfs.cerrar()
 atexit.register(cleanup)
 
 if __name__ == "__main__":
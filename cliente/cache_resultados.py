@@ -0,0 +1,193 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# tamaño maximo de la cache, se eliminan los resultados usados hace mas tiempo
+TAMANO_MAX_CACHE_MB = int(os.environ.get("TAMANO_MAX_CACHE_MB", "1024"))
+
+# resultado de una consulta, etiqueta de la metrica
+HIT = "hit"
+MISS = "miss"
+COALESCIDO = "coalescido"
+
+# el mismo pipeline que aplica el nodo cuando la peticion no indica ninguno
+PIPELINE_POR_DEFECTO = [("escala_grises", {})]
+
+def clave_resultado(imagen_hash, pipeline):
+    """Clave de un resultado: hash de la imagen de entrada y pipeline en forma canonica"""
+    operaciones = [(op.nombre, op.parametros) for op in pipeline] or PIPELINE_POR_DEFECTO
+    especificacion = json.dumps(
+        [[nombre, sorted((clave, float(valor)) for clave, valor in parametros.items())] for nombre, parametros in operaciones],
+        separators=(",", ":")
+    )
+    return hashlib.sha256(f"{imagen_hash}:{especificacion}".encode()).hexdigest()
+
+class CacheResultados:
+    """
+    Resultados procesados guardados por contenido en el almacenamiento compartido,
+    con desalojo LRU por tamaño y una sola ejecucion para peticiones iguales simultaneas
+    """
+
+    def __init__(self, directorio, tamano_max_bytes=TAMANO_MAX_CACHE_MB * 1024 * 1024, recolector_metricas=None):
+        self.directorio = directorio
+        self.tamano_max_bytes = tamano_max_bytes
+        self.recolector_metricas = recolector_metricas
+
+        self._indice = OrderedDict()  # clave -> tamaño, del menos al mas usado recientemente
+        self._tamano_total = 0
+        self._en_curso = {}  # clave -> Future del calculo en ejecucion
+        self._lock = threading.Lock()
+
+        os.makedirs(directorio, exist_ok=True)
+        self._cargar_indice()
+
+    def obtener(self, clave):
+        """Resultado guardado, None si no esta en la cache"""
+        with self._lock:
+            if clave not in self._indice:
+                return None
+            self._indice.move_to_end(clave)
+
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "rb") as f:
+                datos = f.read()
+            # el mtime guarda el orden LRU entre reinicios
+            os.utime(ruta)
+            return datos
+        except FileNotFoundError:
+            # eliminado por otra instancia del cliente
+            with self._lock:
+                self._olvidar(clave)
+            return None
+
+    def buscar(self, clave):
+        """Como obtener, registrando el hit o miss en las metricas"""
+        datos = self.obtener(clave)
+        self.registrar(MISS if datos is None else HIT)
+        return datos
+
+    def guardar(self, clave, datos):
+        """Guarda un resultado y desaloja los menos usados si se supera el tamaño maximo"""
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temp_path = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(datos)
+        os.replace(temp_path, ruta)
+
+        with self._lock:
+            self._olvidar(clave)
+            self._indice[clave] = len(datos)
+            self._tamano_total += len(datos)
+            desalojadas = self._desalojar()
+            tamano_total = self._tamano_total
+
+        for vieja in desalojadas:
+            try:
+                os.remove(self._ruta(vieja))
+            except FileNotFoundError:
+                pass
+        if desalojadas:
+            logger.info(f"Cache de resultados: {len(desalojadas)} resultados desalojados")
+        if self.recolector_metricas:
+            self.recolector_metricas.actualizar_tamano_cache(tamano_total)
+
+    def obtener_o_calcular(self, clave, calcular):
+        """
+        Retorna el resultado guardado o lo calcula una sola vez aunque lleguen
+        varias peticiones iguales a la vez; las demas esperan ese calculo
+
+        Args:
+            calcular: funcion sin argumentos que retorna los bytes del resultado o lanza una excepcion
+
+        Returns:
+            datos: bytes del resultado
+            origen: HIT, MISS o COALESCIDO
+        """
+        datos = self.obtener(clave)
+        if datos is not None:
+            self.registrar(HIT)
+            return datos, HIT
+
+        with self._lock:
+            future = self._en_curso.get(clave)
+            propio = future is None
+            if propio:
+                future = self._en_curso[clave] = Future()
+
+        if not propio:
+            self.registrar(COALESCIDO)
+            return future.result(), COALESCIDO
+
+        self.registrar(MISS)
+        try:
+            datos = calcular()
+        except BaseException as e:
+            with self._lock:
+                del self._en_curso[clave]
+            future.set_exception(e)
+            raise
+
+        # se guarda antes de liberar la clave, asi una peticion que llegue ahora ya lo encuentra
+        try:
+            self.guardar(clave, datos)
+        except OSError as e:
+            logger.error(f"Error guardando resultado en cache: {e}")
+        with self._lock:
+            del self._en_curso[clave]
+        future.set_result(datos)
+        return datos, MISS
+
+    def _ruta(self, clave):
+        # subdirectorios por prefijo para no tener miles de archivos en uno solo
+        return os.path.join(self.directorio, clave[:2], f"{clave}.png")
+
+    def _cargar_indice(self):
+        """Reconstruye el indice LRU desde los archivos, ordenados por ultimo uso"""
+        entradas = []
+        for subdir in os.listdir(self.directorio):
+            ruta_subdir = os.path.join(self.directorio, subdir)
+            if not os.path.isdir(ruta_subdir):
+                continue
+            for nombre in os.listdir(ruta_subdir):
+                if not nombre.endswith(".png"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(ruta_subdir, nombre))
+                except FileNotFoundError:
+                    continue
+                entradas.append((stat.st_mtime, nombre[:-4], stat.st_size))
+
+        for _, clave, tamano in sorted(entradas):
+            self._indice[clave] = tamano
+            self._tamano_total += tamano
+        logger.info(f"Cache de resultados: {len(self._indice)} resultados, {self._tamano_total / (1024 * 1024):.1f} MB")
+        if self.recolector_metricas:
+            self.recolector_metricas.actualizar_tamano_cache(self._tamano_total)
+
+    def _olvidar(self, clave):
+        """Quita una clave del indice, con el lock tomado"""
+        tamano = self._indice.pop(clave, None)
+        if tamano is not None:
+            self._tamano_total -= tamano
+
+    def _desalojar(self):
+        """Quita del indice los menos usados hasta respetar el maximo, con el lock tomado"""
+        desalojadas = []
+        while self._tamano_total > self.tamano_max_bytes and len(self._indice) > 1:
+            clave, tamano = self._indice.popitem(last=False)
+            self._tamano_total -= tamano
+            desalojadas.append(clave)
+        return desalojadas
+
+    def registrar(self, resultado):
+        """Registra el resultado de una consulta en las metricas"""
+        if self.recolector_metricas:
+            self.recolector_metricas.track_cache_resultados(resultado)
@@ -0,0 +1,127 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+from proto import procesador_pb2
+from proto import procesador_pb2_grpc
+
+logger = logging.getLogger(__name__)
+
+OPCIONES_CANAL = [
+    ('grpc.max_receive_message_length', 20 * 1024 * 1024),  # 20MB
+    ('grpc.max_send_message_length', 20 * 1024 * 1024),
+    ('grpc.keepalive_time_ms', 10000),
+    ('grpc.keepalive_timeout_ms', 5000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+]
+
+TIMEOUT_ESTADO = 2.0
+# cada cuanto se confirma que el coordinador en cache sigue siendolo
+INTERVALO_VERIFICACION = float(os.environ.get("INTERVALO_VERIFICACION_COORDINADOR", "5.0"))
+
+class ConexionesNodos:
+    """Canales persistentes a los nodos y coordinador actual en cache"""
+
+    def __init__(self, direcciones, recolector_metricas=None):
+        # se cambia puerto de bully (50053) a procesamiento (50052)
+        self.direcciones = [d.strip().replace(":50053", ":50052") for d in direcciones if d.strip()]
+        self.recolector_metricas = recolector_metricas
+        self.canales = {}
+        self.stubs = {}
+        self.coordinador_actual = None
+
+        self._lock = threading.Lock()
+        self._lock_descubrimiento = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.direcciones)))
+        self.running = True
+        threading.Thread(target=self._verificar_coordinador, daemon=True).start()
+
+    def stub(self, direccion):
+        """Stub sobre el canal persistente de un nodo"""
+        with self._lock:
+            stub = self.stubs.get(direccion)
+            if stub is None:
+                canal = grpc.insecure_channel(direccion, options=OPCIONES_CANAL)
+                stub = procesador_pb2_grpc.ProcesadorImagenStub(canal)
+                self.canales[direccion] = canal
+                self.stubs[direccion] = stub
+            return stub
+
+    def coordinador(self):
+        """Coordinador en cache, o se busca si no hay uno conocido"""
+        coordinador = self.coordinador_actual
+        if coordinador:
+            return coordinador
+
+        # una sola busqueda a la vez, las demas peticiones esperan su resultado
+        with self._lock_descubrimiento:
+            if self.coordinador_actual is None:
+                self.coordinador_actual = self._descubrir()
+            return self.coordinador_actual
+
+    def invalidar(self, direccion, reconectar=False):
+        """Olvida el coordinador si es esa direccion y opcionalmente recrea su canal"""
+        if self.coordinador_actual == direccion:
+            logger.info(f"Coordinador {direccion} invalidado")
+            self.coordinador_actual = None
+
+        if reconectar:
+            with self._lock:
+                canal = self.canales.pop(direccion, None)
+                self.stubs.pop(direccion, None)
+            if canal:
+                canal.close()
+
+    def cerrar(self):
+        """Cierra todos los canales"""
+        self.running = False
+        with self._lock:
+            for canal in self.canales.values():
+                canal.close()
+            self.canales.clear()
+            self.stubs.clear()
+        self._executor.shutdown(wait=False)
+
+    def _estado_nodo(self, direccion):
+        """EstadoNodo de un nodo, None si no responde"""
+        try:
+            return self.stub(direccion).EstadoNodo(procesador_pb2.EstadoRequest(), timeout=TIMEOUT_ESTADO)
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.UNAVAILABLE:
+                self.invalidar(direccion, reconectar=True)
+            logger.debug(f"Nodo {direccion} no disponible: {e.code()}")
+            return None
+
+    def _descubrir(self):
+        """Consulta todos los nodos en paralelo y retorna el coordinador"""
+        inicio = time.time()
+        estados = list(self._executor.map(self._estado_nodo, self.direcciones))
+
+        # durante un cambio puede haber dos nodos que se creen coordinador, gana el mandato mas reciente
+        candidatos = [(e.token, e.nodo_id, d) for d, e in zip(self.direcciones, estados) if e and e.es_coordinador]
+        _, nodo_id, coordinador = max(candidatos) if candidatos else (0, 0, None)
+
+        if self.recolector_metricas:
+            self.recolector_metricas.track_tiempo_coordinador(time.time() - inicio)
+            self.recolector_metricas.actualizar_coordinador(nodo_id)
+
+        if coordinador:
+            logger.info(f"Coordinador encontrado: {coordinador} (nodo {nodo_id})")
+        else:
+            logger.warning("No se encontro coordinador")
+        return coordinador
+
+    def _verificar_coordinador(self):
+        """Invalida la cache si el coordinador dejo de serlo"""
+        while self.running:
+            time.sleep(INTERVALO_VERIFICACION)
+            coordinador = self.coordinador_actual
+            if not coordinador:
+                continue
+            estado = self._estado_nodo(coordinador)
+            if estado is None or not estado.es_coordinador:
+                self.invalidar(coordinador)
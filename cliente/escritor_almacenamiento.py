@@ -0,0 +1,143 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# escrituras aceptadas sin confirmar; al llegar al maximo quien guarda espera (contrapresion)
+MAX_ESCRITURAS_PENDIENTES = int(os.environ.get("MAX_ESCRITURAS_PENDIENTES", "64"))
+# imagenes confirmadas juntas y tiempo que se espera para juntar mas tras la primera
+TAMANO_GRUPO_ESCRITURA = int(os.environ.get("TAMANO_GRUPO_ESCRITURA", "32"))
+ESPERA_GRUPO_ESCRITURA = float(os.environ.get("ESPERA_GRUPO_ESCRITURA", "0.005"))
+# fsync simultaneos de un grupo, en GlusterFS cada uno es una ida y vuelta de red
+HILOS_FSYNC = int(os.environ.get("HILOS_FSYNC", "8"))
+
+class EscrituraPendiente:
+    """Imagen aceptada para guardar: su id se conoce de inmediato y es durable cuando termina"""
+
+    def __init__(self, metadata, imagen_data):
+        self.metadata = metadata
+        self.imagen_data = imagen_data
+        self.imagen_id = metadata["imagen_id"]
+        self.usuario_id = metadata["usuario_id"]
+        self.error = None
+        self._terminada = threading.Event()
+
+    @property
+    def durable(self):
+        return self._terminada.is_set() and self.error is None
+
+    def esperar(self, timeout=None):
+        """Espera a que la escritura termine, retorna True si quedo guardada"""
+        self._terminada.wait(timeout)
+        return self.durable
+
+    def _terminar(self, error=None):
+        self.error = error
+        self.imagen_data = None
+        self._terminada.set()
+
+class EscritorAlmacenamiento:
+    """
+    Guarda imagenes en segundo plano: junta las escrituras que llegan a la
+    vez y hace sus fsync en paralelo, en lugar de un fsync por peticion.
+    Mientras una imagen no se confirma se sirve desde memoria
+    """
+
+    def __init__(self, escribir_archivo, registrar, max_pendientes=MAX_ESCRITURAS_PENDIENTES,
+                 recolector_metricas=None):
+        self.escribir_archivo = escribir_archivo  # escribir_archivo(metadata, datos): archivo durable
+        self.registrar = registrar  # registrar(metadatas): metadatos e indice de las ya escritas
+        self.recolector_metricas = recolector_metricas
+
+        self._cola = queue.Queue()
+        self._lugares = threading.BoundedSemaphore(max_pendientes)  # cuenta tambien el grupo en curso
+        self._pendientes = {}  # (usuario_id, imagen_id) -> EscrituraPendiente
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=HILOS_FSYNC)
+        self._hilo = threading.Thread(target=self._escribir, name="escritor-almacenamiento", daemon=True)
+        self._hilo.start()
+
+    def encolar(self, metadata, imagen_data):
+        """Acepta una imagen para guardar, bloquea si hay demasiadas pendientes"""
+        self._lugares.acquire()
+        escritura = EscrituraPendiente(metadata, imagen_data)
+        with self._lock:
+            self._pendientes[(escritura.usuario_id, escritura.imagen_id)] = escritura
+        self._cola.put(escritura)
+        self._actualizar_metricas()
+        return escritura
+
+    def pendiente(self, usuario_id, imagen_id):
+        """Escritura aun no confirmada de esa imagen, None si no hay"""
+        with self._lock:
+            return self._pendientes.get((usuario_id, imagen_id))
+
+    def cerrar(self, timeout=None):
+        """Termina de guardar lo pendiente y detiene el escritor"""
+        self._cola.put(None)
+        self._hilo.join(timeout)
+        self._executor.shutdown(wait=False)
+
+    def _escribir(self):
+        """Toma una escritura, junta las que llegan enseguida y las confirma en grupo"""
+        cerrar = False
+        while not cerrar:
+            primera = self._cola.get()
+            if primera is None:
+                break
+
+            grupo = [primera]
+            limite = time.time() + ESPERA_GRUPO_ESCRITURA
+            while len(grupo) < TAMANO_GRUPO_ESCRITURA:
+                try:
+                    escritura = self._cola.get(timeout=max(0, limite - time.time()))
+                except queue.Empty:
+                    break
+                if escritura is None:
+                    cerrar = True
+                    break
+                grupo.append(escritura)
+
+            self._confirmar_grupo(grupo)
+
+    def _confirmar_grupo(self, grupo):
+        inicio = time.time()
+        errores = list(self._executor.map(self._escribir_una, grupo))
+
+        escritas = [e for e, error in zip(grupo, errores) if error is None]
+        if escritas:
+            try:
+                self.registrar([e.metadata for e in escritas])
+            except Exception as ex:
+                # sin metadatos ni indice la imagen no se puede listar: no queda guardada
+                logger.error(f"Error registrando metadatos de {len(escritas)} imagenes: {ex}")
+                errores = [error or ex for error in errores]
+
+        with self._lock:
+            for escritura, error in zip(grupo, errores):
+                # la misma imagen guardada dos veces en el mismo segundo comparte imagen_id
+                clave = (escritura.usuario_id, escritura.imagen_id)
+                if self._pendientes.get(clave) is escritura:
+                    del self._pendientes[clave]
+                escritura._terminar(error)
+                self._lugares.release()
+
+        if self.recolector_metricas:
+            self.recolector_metricas.track_grupo_escritura(len(grupo), time.time() - inicio)
+        self._actualizar_metricas()
+
+    def _escribir_una(self, escritura):
+        try:
+            self.escribir_archivo(escritura.metadata, escritura.imagen_data)
+            return None
+        except Exception as e:
+            logger.error(f"Error almacenando imagen {escritura.imagen_id}: {e}")
+            return e
+
+    def _actualizar_metricas(self):
+        if self.recolector_metricas:
+            self.recolector_metricas.actualizar_escrituras_pendientes(len(self._pendientes))
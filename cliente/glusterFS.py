@@ -1,22 +1,62 @@
+import io
 import os
 import json
 import hashlib
+import time
 import subprocess
+import threading
 from datetime import datetime
 import logging
 
+from indice_imagenes import IndiceImagenes
+from escritor_almacenamiento import EscritorAlmacenamiento
+
 logger = logging.getLogger(__name__)
 
+# segundos que se reutiliza la salida de `gluster volume info` y el archivo de salud guardado
+TTL_INFO_GLUSTER = float(os.environ.get("TTL_INFO_GLUSTER", "30"))
+# segundos entre recuentos de usuarios e imagenes; otras replicas del cliente tambien escriben en el volumen
+INTERVALO_RECUENTO = float(os.environ.get("INTERVALO_RECUENTO", "300"))
+
+def tipo_mime(imagen_data):
+    """Tipo MIME segun la firma del archivo; todas se guardan como .jpg aunque las procesadas son PNG"""
+    if imagen_data.startswith(b"\x89PNG"):
+        return "image/png"
+    if imagen_data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if imagen_data[:4] == b"RIFF" and imagen_data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
 # replicación automatica, alta disponibilidad y tolerancia a fallos
 class GlusterFS:
-    def __init__(self, mnt_punto="/mnt/almacenamiento_dist"):
+    def __init__(self, mnt_punto="/mnt/almacenamiento_dist", recolector_metricas=None):
         self.mnt_punto = mnt_punto
         self.usuarios_dir = os.path.join(mnt_punto, "usuarios")
         self.cluster_dir = os.path.join(mnt_punto, "cluster")
+        self.indice = IndiceImagenes(self.usuarios_dir)
+
+        # contadores para el estado del cluster, se actualizan con cada escritura y se recuentan cada INTERVALO_RECUENTO
+        self.total_usuarios = 0
+        self.total_imagenes = 0
+        self._lock_contadores = threading.Lock()
+        self._detener = threading.Event()
+
+        self._info_gluster = None
+        self._info_gluster_expira = 0
+        self._lock_info_gluster = threading.Lock()
+        self._salud_guardada_expira = 0
         
         # se verifica y configura glusterFS
         self._verificar_gluster_mnt()
         self._iniciar_estructura_directorios()
+        self._recontar()
+
+        # escrituras en segundo plano, con fsync en grupo
+        self.escritor = EscritorAlmacenamiento(
+            self._escribir_imagen, self._registrar_imagenes, recolector_metricas=recolector_metricas
+        )
+        threading.Thread(target=self._recontar_periodicamente, name="recuento-gluster", daemon=True).start()
     
     def _verificar_gluster_mnt(self):
         """Verifica que GlusterFS esta montado"""
@@ -24,7 +64,7 @@ class GlusterFS:
             if not os.path.exists(self.mnt_punto):
                 raise Exception(f"Punto de montaje {self.mnt_punto} no existe")
             
-            data = self._get_gluster_info()
+            data = self._get_gluster_info_cache()
             if not data.get("informacion_disponible", False):
                 raise Exception("No se pudo obtener informacion del volumen GlusterFS")
         except Exception as e:
@@ -45,7 +85,30 @@ class GlusterFS:
             except Exception as e:
                 logger.error(f"Error creando directorio {direc}: {e}")
 
-    def guardar_imagen(self, usuario_id, imagen_data, tipo_imagen="procesada"):
+    def _recontar(self):
+        """Cuenta usuarios e imagenes en el volumen, un JSON de metadata por imagen, y corrige los contadores"""
+        total_usuarios = 0
+        total_imagenes = 0
+        for u_dir in os.listdir(self.usuarios_dir):
+            metadata_dir = os.path.join(self.usuarios_dir, u_dir, "metadata")
+            if os.path.isdir(metadata_dir):
+                total_usuarios += 1
+                total_imagenes += sum(1 for nombre in os.listdir(metadata_dir) if nombre.endswith(".json"))
+
+        # lo escrito durante el recuento puede quedar fuera hasta el proximo
+        with self._lock_contadores:
+            self.total_usuarios = total_usuarios
+            self.total_imagenes = total_imagenes
+        logger.info(f"GlusterFS: {total_usuarios} usuarios, {total_imagenes} imagenes")
+
+    def _recontar_periodicamente(self):
+        while not self._detener.wait(INTERVALO_RECUENTO):
+            try:
+                self._recontar()
+            except Exception as e:
+                logger.error(f"Error recontando imagenes: {e}")
+
+    def guardar_imagen(self, usuario_id, imagen_data, tipo_imagen="procesada", imagen_hash=None, origen_id=None):
         """
         Almacena imagen en el sistema distribuido con replicación automática
         
@@ -53,54 +116,18 @@ class GlusterFS:
             usuario_id: ID único del usuario
             imagen_data: Datos binarios de la imagen
             tipo_imagen: 'original' o 'procesada'
+            imagen_hash: SHA-256 ya calculado de imagen_data, se calcula si no se indica
+            origen_id: imagen de la que se obtuvo esta, para resultados reprocesados
             
         Returns:
             imagen_id: ID único de la imagen almacenada
         """
-        
-        # genera id de imagen
-        imagen_hash = hashlib.sha256(imagen_data).hexdigest()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        imagen_id = f"{timestamp}_{imagen_hash[:12]}"
+        imagen_metadata = self._nueva_imagen(usuario_id, imagen_data, tipo_imagen, imagen_hash, origen_id)
+        imagen_id = imagen_metadata["imagen_id"]
         
         try:
-            # estructura de directorio del usuario
-            usuario_path = os.path.join(self.usuarios_dir, usuario_id)
-            tipo_imagen_path = os.path.join(usuario_path, tipo_imagen)
-            metadata_path = os.path.join(usuario_path, "metadata")
-            
-            for path in [usuario_path, tipo_imagen_path, metadata_path]:
-                os.makedirs(path, exist_ok=True)
-            
-            # se guarda la imagen principal
-            imagen_nombre = f"{imagen_id}.jpg"
-            imagen_principal_path = os.path.join(tipo_imagen_path, imagen_nombre)
-            
-            # se escribe la imagen en disco
-            temp_path = imagen_principal_path + ".tmp"
-            with open(temp_path, "wb") as f:
-                f.write(imagen_data)
-                f.flush()
-                os.fsync(f.fileno())
-            
-            os.rename(temp_path, imagen_principal_path)
-            
-            # crear metadatos
-            imagen_metadata = {
-                "imagen_id": imagen_id,
-                "usuario_id": usuario_id,
-                "tipo": tipo_imagen,
-                "fecha_creado": datetime.now().isoformat(),
-                "tamano_mb": round(len(imagen_data) / (1024 * 1024), 2),
-                "principal_path": imagen_principal_path,
-                "imagen_hash": imagen_hash,
-                "alta_disponibilidad": True
-            }
-            
-            # guradar metadatos
-            metadata_path = os.path.join(metadata_path, f"{imagen_id}.json")
-            with open(metadata_path, "w") as f:
-                json.dump(imagen_metadata, f, indent=2)
+            self._escribir_imagen(imagen_metadata, imagen_data)
+            self._registrar_imagenes([imagen_metadata])
             
             logger.info(f"Imagen {imagen_id} almacenada exitosamente")
             return imagen_id
@@ -108,52 +135,121 @@ class GlusterFS:
         except Exception as e:
             logger.error(f"Error almacenando imagen {imagen_id}: {e}")
             raise
-    
 
-    def get_imagenes_usuario(self, usuario_id, tipo_imagen=None, limite=None):
-        """Lista de imagenes de un usuario"""
+    def guardar_imagen_diferida(self, usuario_id, imagen_data, tipo_imagen="procesada", imagen_hash=None, origen_id=None):
+        """
+        Como guardar_imagen, pero la escritura se hace en segundo plano junto con
+        las demas que lleguen a la vez; la imagen se puede leer desde ya
+
+        Returns:
+            escritura: EscrituraPendiente con el imagen_id, durable al terminar
+        """
+        imagen_metadata = self._nueva_imagen(usuario_id, imagen_data, tipo_imagen, imagen_hash, origen_id)
+        return self.escritor.encolar(imagen_metadata, imagen_data)
+
+    def _nueva_imagen(self, usuario_id, imagen_data, tipo_imagen, imagen_hash, origen_id):
+        """Metadatos de una imagen por guardar, con su id y ruta"""
+        # genera id de imagen
+        imagen_hash = imagen_hash or hashlib.sha256(imagen_data).hexdigest()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        imagen_id = f"{timestamp}_{imagen_hash[:12]}"
+
+        imagen_metadata = {
+            "imagen_id": imagen_id,
+            "usuario_id": usuario_id,
+            "tipo": tipo_imagen,
+            "fecha_creado": datetime.now().isoformat(),
+            "tamano_mb": round(len(imagen_data) / (1024 * 1024), 2),
+            "principal_path": os.path.join(self.usuarios_dir, usuario_id, tipo_imagen, f"{imagen_id}.jpg"),
+            "imagen_hash": imagen_hash,
+            "mimetype": tipo_mime(imagen_data),
+            "alta_disponibilidad": True
+        }
+        if origen_id:
+            imagen_metadata["origen_id"] = origen_id
+        return imagen_metadata
+
+    def _escribir_imagen(self, imagen_metadata, imagen_data):
+        """Escribe la imagen principal de forma durable: archivo temporal, fsync y rename"""
+        imagen_principal_path = imagen_metadata["principal_path"]
+        usuario_path = os.path.join(self.usuarios_dir, imagen_metadata["usuario_id"])
+        
+        # estructura de directorio del usuario
+        for path in [os.path.dirname(imagen_principal_path), os.path.join(usuario_path, "metadata")]:
+            os.makedirs(path, exist_ok=True)
+        
+        # se escribe la imagen en disco, el temporal es por hilo porque el grupo escribe en paralelo
+        temp_path = f"{imagen_principal_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(imagen_data)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        os.rename(temp_path, imagen_principal_path)
+
+    def _registrar_imagenes(self, metadatas):
+        """Guarda los metadatos de imagenes ya escritas, con una escritura al indice por usuario"""
+        por_usuario = {}
+        for imagen_metadata in metadatas:
+            metadata_path = os.path.join(
+                self.usuarios_dir, imagen_metadata["usuario_id"], "metadata", f"{imagen_metadata['imagen_id']}.json"
+            )
+            with open(metadata_path, "w") as f:
+                json.dump(imagen_metadata, f, indent=2)
+            por_usuario.setdefault(imagen_metadata["usuario_id"], []).append(imagen_metadata)
+
+        usuarios_nuevos = sum(self.indice.agregar(usuario_id, lista) for usuario_id, lista in por_usuario.items())
+        with self._lock_contadores:
+            self.total_imagenes += len(metadatas)
+            self.total_usuarios += usuarios_nuevos
+
+    def cerrar(self):
+        """Termina las escrituras pendientes y detiene el recuento"""
+        self._detener.set()
+        self.escritor.cerrar()
+
+    def get_imagenes_usuario(self, usuario_id, tipo_imagen=None, limite=None, desplazamiento=0):
+        """Lista de imagenes de un usuario, de la mas reciente a la mas antigua"""
         try:
-            metadata_dir = os.path.join(self.usuarios_dir, usuario_id, "metadata")
-            
-            if not os.path.exists(metadata_dir):
-                logger.info(f"Usuario {usuario_id} no tiene imagenes almacenadas")
-                return []
-            
-            imagenes = []
-            
-            # se leen todos metadatos
-            for metadt in os.listdir(metadata_dir):
-                if metadt.endswith(".json"):
-                    metadata_path = os.path.join(metadata_dir, metadt)
-                    
-                    try:
-                        with open(metadata_path, "r") as f:
-                            metadata = json.load(f)
-                        
-                        # se filtra por tipo
-                        if tipo_imagen and metadata.get("tipo") != tipo_imagen:
-                            continue
-                        
-                        principal_path = metadata.get("principal_path")
-                        if principal_path and os.path.exists(principal_path): # se verifica que exista la imagen principal
-                            metadata["disponible"] = self._verificar_imagen_disponible(usuario_id, metadata["imagen_id"])
-                            imagenes.append(metadata)
-                        else:
-                            logger.warning(f"Imagen {metadata.get('imagen_id')} no encontrada")
-                    
-                    except Exception as e:
-                        logger.error(f"Error leyendo metadatos {metadt}: {e}")
-            
-            if limite:
-                imagenes = imagenes[:limite]
+            imagenes, _ = self.indice.consultar(usuario_id, tipo_imagen, limite, desplazamiento)
             return imagenes
-            
         except Exception as e:
             logger.error(f"Error obteniendo imagenes del usuario {usuario_id}: {e}")
             return []
-    
+
+    def contar_imagenes_usuario(self, usuario_id, tipo_imagen=None):
+        """Cantidad de imagenes de un usuario"""
+        try:
+            _, total = self.indice.consultar(usuario_id, tipo_imagen, limite=0)
+            return total
+        except Exception as e:
+            logger.error(f"Error contando imagenes del usuario {usuario_id}: {e}")
+            return 0
+
+    def get_metadata(self, usuario_id, imagen_id):
+        """Metadatos de una imagen del usuario, None si no existe"""
+        escritura = self.escritor.pendiente(usuario_id, imagen_id)
+        if escritura:
+            return escritura.metadata
+
+        metadata_path = os.path.join(self.usuarios_dir, usuario_id, "metadata", f"{imagen_id}.json")
+        try:
+            with open(metadata_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error leyendo metadatos {imagen_id}: {e}")
+            return None
+
     def get_imagen_distribuida(self, usuario_id, imagen_id):
         """Obtiene imagen del sistema distribuido"""
+        # aceptada pero aun no escrita
+        escritura = self.escritor.pendiente(usuario_id, imagen_id)
+        if escritura:
+            imagen_data = escritura.imagen_data
+            if imagen_data is not None:
+                return imagen_data
         
         search_paths = [
             os.path.join(self.usuarios_dir, usuario_id, "original", f"{imagen_id}.jpg"),
@@ -173,26 +269,58 @@ class GlusterFS:
         
         return None
     
-    def _verificar_imagen_disponible(self, usuario_id, imagen_id):
-        """Verifica disponibilidad de imagen"""
-        disponibilidad = {
-            "disponibilidad_principal": False,
-            "total_copias": 0
-        }
-    
-        principal_paths = [
-            os.path.join(self.usuarios_dir, usuario_id, "original", f"{imagen_id}.jpg"),
-            os.path.join(self.usuarios_dir, usuario_id, "procesada", f"{imagen_id}.jpg")
-        ]
-        
-        for path in principal_paths:
-            if os.path.exists(path):
-                disponibilidad["disponibilidad_principal"] = True
-                disponibilidad["total_copias"] += 1
-                break
-        
-        return disponibilidad
-    
+    def get_archivo_imagen(self, usuario_id, imagen_id):
+        """
+        Imagen para enviar sin leerla completa en memoria
+
+        Returns:
+            archivo: ruta en el montaje, o BytesIO si aun no se escribe; None si no existe
+            metadata: metadatos de la imagen, con imagen_hash y mimetype
+        """
+        escritura = self.escritor.pendiente(usuario_id, imagen_id)
+        if escritura:
+            imagen_data = escritura.imagen_data
+            if imagen_data is not None:
+                return io.BytesIO(imagen_data), escritura.metadata
+
+        metadata = self.get_metadata(usuario_id, imagen_id) or {}
+        if metadata.get("principal_path"):
+            rutas = [metadata["principal_path"]]
+        else:
+            rutas = [
+                os.path.join(self.usuarios_dir, usuario_id, "original", f"{imagen_id}.jpg"),
+                os.path.join(self.usuarios_dir, usuario_id, "procesada", f"{imagen_id}.jpg")
+            ]
+
+        for ruta in rutas:
+            if os.path.exists(ruta):
+                if "mimetype" not in metadata:
+                    # imagenes guardadas antes de registrar el tipo
+                    with open(ruta, "rb") as f:
+                        metadata["mimetype"] = tipo_mime(f.read(12))
+                return ruta, metadata
+        return None, metadata
+
+    def get_miniatura(self, usuario_id, imagen_id, tamano):
+        """Miniatura guardada de una imagen, None si aun no se genero"""
+        try:
+            with open(self._ruta_miniatura(usuario_id, imagen_id, tamano), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def guardar_miniatura(self, usuario_id, imagen_id, tamano, datos):
+        """Guarda una miniatura junto a las imagenes del usuario, sin fsync porque se puede regenerar"""
+        ruta = self._ruta_miniatura(usuario_id, imagen_id, tamano)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temp_path = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(datos)
+        os.replace(temp_path, ruta)
+
+    def _ruta_miniatura(self, usuario_id, imagen_id, tamano):
+        return os.path.join(self.usuarios_dir, usuario_id, "miniaturas", f"{imagen_id}_{tamano}.jpg")
+
     def get_gluster_health(self):
         """Obtiene estado de salud completo dle sistema"""
         try:
@@ -202,20 +330,8 @@ class GlusterFS:
             espacio_libre = stat.f_bavail * stat.f_frsize
             espacio_usado = espacio_total - espacio_libre
             
-            # toral archivos
-            total_usuarios = 0
-            total_imagenes = 0
-            
-            if os.path.exists(self.usuarios_dir):
-                for u_dir in os.listdir(self.usuarios_dir):
-                    usuario_path = os.path.join(self.usuarios_dir, u_dir)
-                    if os.path.isdir(usuario_path):
-                        total_usuarios += 1
-                        imagenes_usuario = self.get_imagenes_usuario(u_dir)
-                        total_imagenes += len(imagenes_usuario)
-            
-            # informacion de glusterfs
-            gluster_info = self._get_gluster_info()
+            # informacion de glusterfs, reutilizada durante TTL_INFO_GLUSTER
+            gluster_info = self._get_gluster_info_cache()
             
             data = {
                 "estado": "healthy",
@@ -229,18 +345,20 @@ class GlusterFS:
                     "porcentaje_uso": round((espacio_usado / espacio_total) * 100, 2)
                 },
                 "datos_distribucion": {
-                    "total_usuarios": total_usuarios,
-                    "total_imagenes": total_imagenes,
+                    "total_usuarios": self.total_usuarios,
+                    "total_imagenes": self.total_imagenes,
                     "alta_disponibilidad": True
                 },
                 "gluster_info": gluster_info
             }
             
-            # guardar datos
-            health_file = os.path.join(self.cluster_dir, "health", "cluster_health.json")
-            os.makedirs(os.path.dirname(health_file), exist_ok=True)
-            with open(health_file, "w") as f:
-                json.dump(data, f, indent=2)
+            # guardar datos, a lo sumo una vez por TTL
+            if time.time() >= self._salud_guardada_expira:
+                self._salud_guardada_expira = time.time() + TTL_INFO_GLUSTER
+                health_file = os.path.join(self.cluster_dir, "health", "cluster_health.json")
+                os.makedirs(os.path.dirname(health_file), exist_ok=True)
+                with open(health_file, "w") as f:
+                    json.dump(data, f, indent=2)
             
             return data
             
@@ -252,6 +370,15 @@ class GlusterFS:
                 "timestamp": datetime.now().isoformat()
             }
     
+    def _get_gluster_info_cache(self):
+        """Informacion del volumen, consultando gluster solo si la anterior vencio"""
+        # una sola consulta a la vez, las demas peticiones esperan y usan su resultado
+        with self._lock_info_gluster:
+            if time.time() >= self._info_gluster_expira:
+                self._info_gluster = self._get_gluster_info()
+                self._info_gluster_expira = time.time() + TTL_INFO_GLUSTER
+            return self._info_gluster
+
     def _get_gluster_info(self):
         """Obtiene informacion especifica del volumen glusterfs"""
         try: 
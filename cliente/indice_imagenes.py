@@ -0,0 +1,157 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+NOMBRE_INDICE = "indice.jsonl"
+# usuarios con el indice en memoria, se descartan los consultados hace mas tiempo
+MAX_USUARIOS_EN_MEMORIA = int(os.environ.get("MAX_USUARIOS_EN_MEMORIA", "256"))
+# locks compartidos por los usuarios cuyo id cae en la misma franja
+NUM_LOCKS_USUARIO = int(os.environ.get("NUM_LOCKS_USUARIO", "64"))
+
+class IndiceImagenes:
+    """
+    Indice por usuario de los metadatos de sus imagenes: un archivo de solo
+    agregado (una linea JSON por imagen) junto a la carpeta metadata. Las
+    consultas leen solo lo agregado desde la ultima vez, sin abrir cada JSON
+    """
+
+    def __init__(self, usuarios_dir, max_usuarios=MAX_USUARIOS_EN_MEMORIA):
+        self.usuarios_dir = usuarios_dir
+        self.max_usuarios = max_usuarios
+        # usuario_id -> {"offset": bytes leidos, "imagenes": metadatos en orden de creacion, "ids": imagen_id vistos}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._locks_usuario = [threading.Lock() for _ in range(NUM_LOCKS_USUARIO)]
+
+    def agregar(self, usuario_id, metadatas):
+        """
+        Agrega imagenes nuevas al indice, despues de escribir sus JSON
+
+        Returns:
+            creado: True si el usuario no tenia indice
+        """
+        lineas = "".join(json.dumps(metadata, separators=(",", ":")) + "\n" for metadata in metadatas)
+        with self._lock_usuario(usuario_id):
+            if not os.path.exists(self._ruta(usuario_id)):
+                # el indice se crea desde la carpeta metadata, que ya incluye estas imagenes
+                self._preparar(usuario_id)
+                return True
+            # una sola escritura en modo append por grupo de imagenes
+            with open(self._ruta(usuario_id), "a") as f:
+                f.write(lineas)
+            return False
+
+    def consultar(self, usuario_id, tipo_imagen=None, limite=None, desplazamiento=0):
+        """
+        Imagenes del usuario, de la mas reciente a la mas antigua
+
+        Args:
+            tipo_imagen: 'original' o 'procesada', todas si no se indica
+            limite: maximo de imagenes a retornar
+            desplazamiento: imagenes a saltar, para paginar
+
+        Returns:
+            imagenes: lista de metadatos
+            total: imagenes que cumplen el filtro, sin paginar
+        """
+        imagenes = self._imagenes(usuario_id)
+        if tipo_imagen:
+            imagenes = [m for m in imagenes if m.get("tipo") == tipo_imagen]
+
+        total = len(imagenes)
+        fin = total - desplazamiento
+        inicio = max(0, fin - limite) if limite is not None else 0
+        pagina = imagenes[inicio:max(0, fin)]
+        pagina.reverse()
+        return [dict(m) for m in pagina], total
+
+    def _imagenes(self, usuario_id):
+        """Metadatos del usuario en orden de creacion, leyendo solo las lineas nuevas del indice"""
+        with self._lock_usuario(usuario_id):
+            self._preparar(usuario_id)
+            ruta = self._ruta(usuario_id)
+            try:
+                tamano = os.path.getsize(ruta)
+            except FileNotFoundError:
+                return []
+
+            entrada = self._entrada(usuario_id)
+            if entrada is None or tamano < entrada["offset"]:
+                # primera lectura o indice reconstruido
+                entrada = {"offset": 0, "imagenes": [], "ids": set()}
+                self._guardar_entrada(usuario_id, entrada)
+
+            if tamano > entrada["offset"]:
+                with open(ruta, "rb") as f:
+                    f.seek(entrada["offset"])
+                    nuevos = f.read(tamano - entrada["offset"])
+                # una linea a medio escribir se lee en la proxima consulta
+                completos = nuevos[:nuevos.rfind(b"\n") + 1]
+                for linea in completos.splitlines():
+                    try:
+                        metadata = json.loads(linea)
+                    except ValueError:
+                        logger.warning(f"Linea invalida en el indice de {usuario_id}")
+                        continue
+                    # la misma imagen guardada dos veces en el mismo segundo comparte imagen_id
+                    if metadata.get("imagen_id") in entrada["ids"]:
+                        continue
+                    entrada["ids"].add(metadata.get("imagen_id"))
+                    entrada["imagenes"].append(metadata)
+                entrada["offset"] += len(completos)
+
+            return entrada["imagenes"]
+
+    def _preparar(self, usuario_id):
+        """Crea el indice desde los JSON de metadata si el usuario aun no tiene uno"""
+        ruta = self._ruta(usuario_id)
+        if os.path.exists(ruta):
+            return
+
+        metadata_dir = os.path.join(self.usuarios_dir, usuario_id, "metadata")
+        if not os.path.isdir(metadata_dir):
+            return
+
+        imagenes = []
+        for metadt in os.listdir(metadata_dir):
+            if not metadt.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(metadata_dir, metadt), "r") as f:
+                    imagenes.append(json.load(f))
+            except Exception as e:
+                logger.error(f"Error leyendo metadatos {metadt}: {e}")
+        imagenes.sort(key=lambda m: m.get("fecha_creado", ""))
+
+        temp_path = ruta + ".tmp"
+        with open(temp_path, "w") as f:
+            for metadata in imagenes:
+                f.write(json.dumps(metadata, separators=(",", ":")) + "\n")
+        os.replace(temp_path, ruta)
+        logger.info(f"Indice de {usuario_id} creado con {len(imagenes)} imagenes")
+
+    def _entrada(self, usuario_id):
+        """Indice en memoria del usuario, None si no esta cargado"""
+        with self._lock:
+            entrada = self._cache.get(usuario_id)
+            if entrada is not None:
+                self._cache.move_to_end(usuario_id)
+            return entrada
+
+    def _guardar_entrada(self, usuario_id, entrada):
+        """Guarda el indice en memoria del usuario y descarta los usados hace mas tiempo"""
+        with self._lock:
+            self._cache[usuario_id] = entrada
+            self._cache.move_to_end(usuario_id)
+            while len(self._cache) > self.max_usuarios:
+                self._cache.popitem(last=False)
+
+    def _ruta(self, usuario_id):
+        return os.path.join(self.usuarios_dir, usuario_id, NOMBRE_INDICE)
+
+    def _lock_usuario(self, usuario_id):
+        return self._locks_usuario[hash(usuario_id) % len(self._locks_usuario)]
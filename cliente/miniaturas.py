@@ -0,0 +1,73 @@
+import io
+import os
+import logging
+import threading
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # sin Pillow se sirven las imagenes completas
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# lado maximo en pixeles de cada miniatura; las grillas muestran 1x y 2x
+TAMANOS_MINIATURA = (256, 512)
+CALIDAD_MINIATURA = int(os.environ.get("CALIDAD_MINIATURA", "80"))
+
+def miniaturas_disponibles():
+    return Image is not None
+
+def generar_miniatura(imagen_data, tamano):
+    """JPEG de la imagen reducida para que su lado mayor no supere tamano"""
+    with Image.open(io.BytesIO(imagen_data)) as img:
+        # los JPEG se decodifican directamente a una escala reducida
+        img.draft("RGB", (tamano, tamano))
+        img.thumbnail((tamano, tamano))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=CALIDAD_MINIATURA, optimize=True)
+        return buffer.getvalue()
+
+class Miniaturas:
+    """Miniaturas guardadas en GlusterFS junto a las imagenes, generadas la primera vez que se piden"""
+
+    def __init__(self, gfs):
+        self.gfs = gfs
+        self._locks = {}  # clave -> [lock, peticiones que lo usan]; una generacion a la vez por miniatura
+        self._lock = threading.Lock()
+
+    def obtener(self, usuario_id, imagen_id, tamano):
+        """Bytes JPEG de la miniatura, None si la imagen no existe"""
+        datos = self.gfs.get_miniatura(usuario_id, imagen_id, tamano)
+        if datos is not None:
+            return datos
+
+        clave = (usuario_id, imagen_id, tamano)
+        with self._lock:
+            entrada = self._locks.setdefault(clave, [threading.Lock(), 0])
+            entrada[1] += 1
+        try:
+            with entrada[0]:
+                # otra peticion pudo generarla mientras se esperaba
+                datos = self.gfs.get_miniatura(usuario_id, imagen_id, tamano)
+                if datos is not None:
+                    return datos
+
+                imagen_data = self.gfs.get_imagen_distribuida(usuario_id, imagen_id)
+                if imagen_data is None:
+                    return None
+                datos = generar_miniatura(imagen_data, tamano)
+                try:
+                    self.gfs.guardar_miniatura(usuario_id, imagen_id, tamano, datos)
+                except OSError as e:
+                    logger.error(f"Error guardando miniatura de {imagen_id}: {e}")
+                return datos
+        finally:
+            # el lock se elimina cuando ninguna peticion lo espera
+            with self._lock:
+                entrada[1] -= 1
+                if entrada[1] == 0:
+                    del self._locks[clave]
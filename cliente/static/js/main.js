@@ -15,10 +15,12 @@ class ImageProcessor {
     this.fileDimensions = document.querySelector("#fileDimensions");
     this.fileType = document.querySelector("#fileType");
     this.processBtn = document.querySelector("#processBtn");
+    this.pipelineSelect = document.querySelector("#pipelineSelect");
     this.uploadStatus = document.querySelector(".upload-status");
     this.imageOverlay = document.querySelector(".image-overlay");
 
     this.selectedFile = null;
+    this.selectedFiles = [];
     this.originalPath = null;
     this.finalPath = null;
 
@@ -65,6 +67,7 @@ class ImageProcessor {
     const files = e.dataTransfer.files;
     if (files.length > 0 && files[0].type.startsWith("image/")) {
       this.fileInput.files = files;
+      this.selectedFiles = Array.from(files).filter((f) => f.type.startsWith("image/"));
       this.processFile(files[0]);
     }
   }
@@ -72,6 +75,7 @@ class ImageProcessor {
   handleFileSelect(e) {
     const file = e.target.files[0];
     if (file && file.type.startsWith("image/")) {
+      this.selectedFiles = Array.from(e.target.files).filter((f) => f.type.startsWith("image/"));
       this.processFile(file);
     }
   }
@@ -94,7 +98,8 @@ class ImageProcessor {
   }
 
   displayFileInfo(file) {
-    this.fileName.textContent = file.name;
+    const extra = this.selectedFiles.length > 1 ? ` (+${this.selectedFiles.length - 1} imagenes)` : "";
+    this.fileName.textContent = file.name + extra;
 
     const sizeInMB = (file.size / (1024 * 1024)).toFixed(2);
     this.fileSize.textContent = `${sizeInMB} MB`;
@@ -123,7 +128,8 @@ class ImageProcessor {
 
   enableProcessButton() {
     this.processBtn.disabled = false;
-    this.processBtn.querySelector(".btn-text").textContent = "Procesar imagen";
+    this.processBtn.querySelector(".btn-text").textContent =
+      this.selectedFiles.length > 1 ? `Procesar ${this.selectedFiles.length} imagenes` : "Procesar imagen";
   }
 
   async startProcessing() {
@@ -145,7 +151,12 @@ class ImageProcessor {
 
     // Crear FormData para enviar
     const formData = new FormData();
-    formData.append("img", this.selectedFile);
+    // varias imagenes se envian juntas y el servidor las procesa por lotes
+    const files = this.selectedFiles.length > 0 ? this.selectedFiles : [this.selectedFile];
+    files.forEach((file) => formData.append("img", file));
+    if (this.pipelineSelect && this.pipelineSelect.value) {
+      formData.append("pipeline", this.pipelineSelect.value);
+    }
 
     try {
       this.simulateUploadProgress();
@@ -156,23 +167,32 @@ class ImageProcessor {
         body: formData
       });
 
-      // Detener simulacion de subida
-      this.stopSimulation = true;
-
       if (!response.ok) {
+        this.stopSimulation = true;
         const errorData = await response.json();
         throw new Error(errorData.error);
       }
 
-      // Simular la segunda fase de procesamiento
-      this.simulateProcessingProgress();
+      // el servidor encola el trabajo y responde de inmediato, el avance llega por eventos
+      const trabajo = await response.json();
+      const data = await this.seguirTrabajo(trabajo);
 
-      // Procesar la respuesta JSON
-      const data = await response.json();
-      
       // Completar la barra a 100%
       this.updateProgress(100);
 
+      // lote de imagenes: los resultados quedan en la galeria
+      if (data.resultados) {
+        const fallidas = data.resultados.filter((r) => r.error).length;
+        this.completeUpload();
+        if (fallidas > 0) {
+          this.progressText.textContent = `${fallidas} de ${data.resultados.length} imagenes fallaron`;
+        }
+        setTimeout(() => {
+          window.location.href = "galeria";
+        }, 1500);
+        return;
+      }
+
       // Almacenar las rutas de las imagenes
       this.originalPath = data.original;
       this.finalPath = data.final;
@@ -219,22 +239,47 @@ class ImageProcessor {
     requestAnimationFrame(simulateUpload);
   }
 
-  simulateProcessingProgress() {
-    this.stopSimulation = false;
-    let progress = 50;
-    
-    const simulateProcessing = () => {
-      if (this.stopSimulation || progress >= 95) return;
-      
-      progress += 1;
-      this.updateProgress(progress);
-      
-      if (progress < 95) {
-        setTimeout(simulateProcessing, 100);
-      }
-    };
-    
-    simulateProcessing();
+  seguirTrabajo(trabajo) {
+    // Server-Sent Events del trabajo: cada tesela (o imagen de un lote) terminada avanza la barra
+    return new Promise((resolve, reject) => {
+      const eventos = new EventSource(trabajo.eventos_url);
+
+      eventos.addEventListener("estado", (e) => {
+        const datos = JSON.parse(e.data);
+        if (datos.estado === "procesando") {
+          this.stopSimulation = true;
+          this.updateProgress(50);
+        }
+      });
+
+      eventos.addEventListener("progreso", (e) => {
+        const datos = JSON.parse(e.data);
+        this.stopSimulation = true;
+        this.updateProgress(50 + (45 * datos.completadas) / datos.total);
+      });
+
+      eventos.addEventListener("final", (e) => {
+        eventos.close();
+        resolve(JSON.parse(e.data));
+      });
+
+      eventos.addEventListener("fallo", (e) => {
+        eventos.close();
+        reject(new Error(JSON.parse(e.data).error));
+      });
+
+      // el navegador reconecta solo; si el stream se cerro, se consulta el estado del trabajo
+      eventos.onerror = async () => {
+        if (eventos.readyState !== EventSource.CLOSED) return;
+        try {
+          const estado = await (await fetch(trabajo.estado_url)).json();
+          if (estado.estado === "completado") resolve(estado.resultado);
+          else reject(new Error(estado.error || "Se perdio la conexion con el servidor"));
+        } catch (error) {
+          reject(error);
+        }
+      };
+    });
   }
 
   updateProgress(progress) {
@@ -0,0 +1,42 @@
+import io
+import hashlib
+
+from flask import Request
+
+class ArchivoSubido(io.BytesIO):
+    """
+    Destino de un archivo del formulario: se queda en memoria, sin el archivo
+    temporal que werkzeug usa para subidas grandes, y calcula su tamaño y
+    SHA-256 a medida que llegan los datos
+    """
+
+    def __init__(self, tamano_max=None):
+        super().__init__()
+        self.tamano_max = tamano_max
+        self.tamano = 0
+        self.excedido = False
+        self._sha = hashlib.sha256()
+
+    def write(self, datos):
+        self.tamano += len(datos)
+        if self.excedido or (self.tamano_max is not None and self.tamano > self.tamano_max):
+            # se descarta el resto, la peticion se rechaza al validarla
+            if not self.excedido:
+                self.excedido = True
+                self.seek(0)
+                self.truncate()
+            return len(datos)
+        self._sha.update(datos)
+        return super().write(datos)
+
+    @property
+    def sha256(self):
+        return self._sha.hexdigest()
+
+class PeticionSubida(Request):
+    """Peticion cuyos archivos se reciben en ArchivoSubido, con el limite de tamaño por archivo"""
+
+    tamano_max_archivo = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return ArchivoSubido(self.tamano_max_archivo)
@@ -0,0 +1,194 @@
+import os
+import time
+import uuid
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# estados de un trabajo
+EN_COLA = "en_cola"
+PROCESANDO = "procesando"
+COMPLETADO = "completado"
+ERROR = "error"
+
+# hilos que envian trabajos al coordinador y trabajos que pueden esperar en cola
+NUM_DESPACHADORES = int(os.environ.get("NUM_DESPACHADORES", "4"))
+MAX_TRABAJOS_EN_COLA = int(os.environ.get("MAX_TRABAJOS_EN_COLA", "100"))
+# bytes de imagenes que retienen los trabajos en cola y en proceso, acota la memoria del cliente
+MAX_MB_EN_COLA = int(os.environ.get("MAX_MB_EN_COLA", "2048"))
+# segundos que se conserva un trabajo terminado para consultar su resultado
+RETENCION_TRABAJOS = float(os.environ.get("RETENCION_TRABAJOS", "600"))
+
+class ColaLlena(Exception):
+    """No hay lugar para mas trabajos en la cola"""
+
+class ErrorTrabajo(Exception):
+    """Error esperado de un trabajo, su mensaje se muestra al usuario"""
+
+class Trabajo:
+    """Peticion de procesamiento ejecutada en segundo plano, con su historial de eventos"""
+
+    def __init__(self, usuario_id, funcion, tamano=0):
+        self.id = str(uuid.uuid4())
+        self.usuario_id = usuario_id
+        self.funcion = funcion  # funcion(trabajo) que retorna el resultado
+        self.tamano = tamano  # bytes de imagenes que retiene funcion
+        self.estado = EN_COLA
+        self.progreso = {}
+        self.resultado = None
+        self.error = None
+        self.creado = time.time()
+        self.iniciado = None
+        self.terminado = None
+
+        self.eventos = []  # (tipo, datos), se conservan para quien se conecte tarde
+        self._condicion = threading.Condition()
+
+    @property
+    def finalizado(self):
+        return self.estado in (COMPLETADO, ERROR)
+
+    def publicar(self, tipo, datos):
+        """Agrega un evento y despierta a quienes esperan"""
+        with self._condicion:
+            if tipo == "progreso":
+                self.progreso = datos
+            self.eventos.append((tipo, datos))
+            self._condicion.notify_all()
+
+    def esperar_eventos(self, desde, timeout):
+        """Eventos a partir de la posicion desde, esperando hasta timeout si no hay nuevos"""
+        with self._condicion:
+            if len(self.eventos) <= desde and not self.finalizado:
+                self._condicion.wait(timeout)
+            return self.eventos[desde:]
+
+    def terminar(self, resultado=None, error=None):
+        """Marca el trabajo como terminado y publica el evento final"""
+        with self._condicion:
+            self.terminado = time.time()
+            if error:
+                self.estado, self.error = ERROR, error
+                # "fallo" y no "error": EventSource usa "error" para los problemas de conexion
+                self.eventos.append(("fallo", {"error": error}))
+            else:
+                self.estado, self.resultado = COMPLETADO, resultado
+                self.eventos.append(("final", resultado))
+            self._condicion.notify_all()
+
+    def a_dict(self):
+        """Estado del trabajo para la API"""
+        datos = {
+            "trabajo_id": self.id,
+            "estado": self.estado,
+            "progreso": self.progreso,
+            "creado": self.creado,
+        }
+        if self.resultado is not None:
+            datos["resultado"] = self.resultado
+        if self.error:
+            datos["error"] = self.error
+        return datos
+
+class ColaTrabajos:
+    """
+    Cola de trabajos atendida por un grupo fijo de despachadores, acotada en
+    cantidad y en bytes retenidos: cada trabajo guarda las imagenes subidas
+    hasta que termina
+    """
+
+    def __init__(self, num_despachadores=NUM_DESPACHADORES, max_en_cola=MAX_TRABAJOS_EN_COLA,
+                 max_bytes=MAX_MB_EN_COLA * 1024 * 1024, retencion=RETENCION_TRABAJOS, recolector_metricas=None):
+        self.retencion = retencion
+        self.recolector_metricas = recolector_metricas
+        self.max_bytes = max_bytes
+        self.trabajos = {}
+        self._pendientes = queue.Queue(maxsize=max_en_cola)
+        self._lock = threading.Lock()
+        self._en_proceso = 0
+        self._bytes_retenidos = 0
+        self.running = True
+
+        for i in range(num_despachadores):
+            threading.Thread(target=self._despachar, name=f"despachador-{i}", daemon=True).start()
+
+    def encolar(self, usuario_id, funcion, tamano=0):
+        """
+        Crea un trabajo y lo encola, lanza ColaLlena si no hay lugar
+
+        Args:
+            tamano: bytes de imagenes que retiene funcion hasta terminar
+        """
+        trabajo = Trabajo(usuario_id, funcion, tamano)
+        trabajo.publicar("estado", {"estado": EN_COLA, "en_cola": self._pendientes.qsize()})
+        self._limpiar()
+        with self._lock:
+            # sin otros trabajos se acepta aunque supere el maximo, para no rechazarlo siempre
+            if tamano and self._bytes_retenidos and self._bytes_retenidos + tamano > self.max_bytes:
+                raise ColaLlena("Demasiados datos en cola")
+            self._bytes_retenidos += tamano
+            self.trabajos[trabajo.id] = trabajo
+        try:
+            self._pendientes.put_nowait(trabajo)
+        except queue.Full:
+            with self._lock:
+                del self.trabajos[trabajo.id]
+                self._bytes_retenidos -= tamano
+            raise ColaLlena("Demasiados trabajos en cola")
+
+        self._actualizar_metricas()
+        return trabajo
+
+    def obtener(self, trabajo_id):
+        """Trabajo por id, None si no existe o ya expiro"""
+        with self._lock:
+            return self.trabajos.get(trabajo_id)
+
+    def detener(self):
+        """Deja de despachar trabajos"""
+        self.running = False
+
+    def _despachar(self):
+        """Toma trabajos de la cola y los ejecuta de a uno"""
+        while self.running:
+            try:
+                trabajo = self._pendientes.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            with self._lock:
+                self._en_proceso += 1
+            trabajo.estado = PROCESANDO
+            trabajo.iniciado = time.time()
+            trabajo.publicar("estado", {"estado": PROCESANDO})
+            self._actualizar_metricas()
+
+            try:
+                trabajo.terminar(resultado=trabajo.funcion(trabajo))
+            except ErrorTrabajo as e:
+                trabajo.terminar(error=str(e))
+            except Exception as e:
+                logger.error(f"Error en trabajo {trabajo.id}: {e}")
+                trabajo.terminar(error="Error interno del servidor")
+            finally:
+                trabajo.funcion = None  # libera los datos de la imagen
+                with self._lock:
+                    self._en_proceso -= 1
+                    self._bytes_retenidos -= trabajo.tamano
+                if self.recolector_metricas:
+                    self.recolector_metricas.track_trabajo(trabajo.estado, trabajo.iniciado - trabajo.creado)
+                self._actualizar_metricas()
+
+    def _limpiar(self):
+        """Olvida los trabajos terminados hace mas de la retencion"""
+        limite = time.time() - self.retencion
+        with self._lock:
+            vencidos = [i for i, t in self.trabajos.items() if t.finalizado and t.terminado < limite]
+            for trabajo_id in vencidos:
+                del self.trabajos[trabajo_id]
+
+    def _actualizar_metricas(self):
+        if self.recolector_metricas:
+            self.recolector_metricas.actualizar_trabajos(self._pendientes.qsize(), self._en_proceso, self._bytes_retenidos)
@@ -44,6 +44,74 @@ class RecolectorMetricas:
             registry=self.registro,
         )
         
+        # trabajos en segundo plano
+        self.trabajos_en_cola = Gauge(
+            'trabajos_en_cola',
+            'Trabajos de procesamiento esperando un despachador',
+            registry=self.registro
+        )
+
+        self.trabajos_en_proceso = Gauge(
+            'trabajos_en_proceso',
+            'Trabajos de procesamiento en ejecucion',
+            registry=self.registro
+        )
+
+        self.bytes_trabajos = Gauge(
+            'bytes_trabajos',
+            'Bytes de imagenes retenidos por los trabajos en cola y en ejecucion',
+            registry=self.registro
+        )
+
+        self.total_trabajos = Counter(
+            'total_trabajos',
+            'Total de trabajos de procesamiento terminados',
+            ['estado'],
+            registry=self.registro
+        )
+
+        self.espera_trabajos = Histogram(
+            'espera_trabajos_segundos',
+            'Tiempo de un trabajo en cola hasta que lo toma un despachador',
+            buckets=[0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0],
+            registry=self.registro
+        )
+
+        # cache de resultados
+        self.total_cache_resultados = Counter(
+            'total_cache_resultados',
+            'Consultas a la cache de resultados (hit, miss, coalescido)',
+            ['resultado'],
+            registry=self.registro
+        )
+
+        self.tamano_cache_resultados = Gauge(
+            'tamano_cache_resultados_bytes',
+            'Bytes ocupados por la cache de resultados',
+            registry=self.registro
+        )
+
+        # escrituras a GlusterFS en segundo plano
+        self.escrituras_pendientes = Gauge(
+            'escrituras_pendientes',
+            'Imagenes aceptadas que aun no se guardan en GlusterFS',
+            registry=self.registro
+        )
+
+        self.tamano_grupo_escritura = Histogram(
+            'tamano_grupo_escritura',
+            'Imagenes confirmadas en cada grupo de escritura',
+            buckets=[1, 2, 4, 8, 16, 32],
+            registry=self.registro
+        )
+
+        self.duracion_grupo_escritura = Histogram(
+            'duracion_grupo_escritura_segundos',
+            'Duración de la escritura y fsync de un grupo',
+            buckets=[0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5],
+            registry=self.registro
+        )
+
         # métricas de GlusterFS     
         self.estado_glusterfs = Gauge(
             'estado_glusterfs',
@@ -107,6 +175,40 @@ class RecolectorMetricas:
                 tipo_procesamiento=tipo_procesamiento
             ).observe(duracion)
     
+    def actualizar_trabajos(self, en_cola, en_proceso, bytes_retenidos=0):
+        """Actualiza los trabajos en cola y en ejecucion y los bytes que retienen"""
+        with self._lock:
+            self.trabajos_en_cola.set(en_cola)
+            self.trabajos_en_proceso.set(en_proceso)
+            self.bytes_trabajos.set(bytes_retenidos)
+
+    def track_trabajo(self, estado, espera):
+        """Registra un trabajo terminado y su tiempo en cola"""
+        with self._lock:
+            self.total_trabajos.labels(estado=estado).inc()
+            self.espera_trabajos.observe(espera)
+
+    def track_cache_resultados(self, resultado):
+        """Registra una consulta a la cache de resultados"""
+        with self._lock:
+            self.total_cache_resultados.labels(resultado=resultado).inc()
+
+    def actualizar_tamano_cache(self, tamano_bytes):
+        """Actualiza el tamaño de la cache de resultados"""
+        with self._lock:
+            self.tamano_cache_resultados.set(tamano_bytes)
+
+    def actualizar_escrituras_pendientes(self, pendientes):
+        """Actualiza las escrituras a GlusterFS sin confirmar"""
+        with self._lock:
+            self.escrituras_pendientes.set(pendientes)
+
+    def track_grupo_escritura(self, tamano, duracion):
+        """Registra un grupo de escrituras confirmado"""
+        with self._lock:
+            self.tamano_grupo_escritura.observe(tamano)
+            self.duracion_grupo_escritura.observe(duracion)
+
     def actualizar_estado_glusterfs(self, disponible):
         """Actualiza estado de GlusterFS"""
         with self._lock:
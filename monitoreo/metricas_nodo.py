@@ -53,6 +53,21 @@ class RecolectorMetricas:
             registry=self.registro
         )
         
+        self.brecha_lider = Histogram(
+            'brecha_lider_segundos',
+            'Tiempo sin coordinador entre el ultimo contacto con el anterior y el nuevo',
+            ['nodo_id'],
+            buckets=[0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0],
+            registry=self.registro
+        )
+
+        self.total_tomas_liderazgo = Counter(
+            'total_tomas_liderazgo',
+            'Veces que este nodo asumio como coordinador (sucesor o eleccion)',
+            ['nodo_id', 'metodo'],
+            registry=self.registro
+        )
+        
         # métricas de nodos
         self.nodos_activos = Gauge(
             'nodos_activos',
@@ -60,6 +75,65 @@ class RecolectorMetricas:
             registry=self.registro
         )
         
+        self.estado_nodo = Gauge(
+            'estado_nodo',
+            'Estado de cada nodo en la tabla de membresia (2 activo, 1 sospechoso, 0 caido)',
+            ['nodo_id', 'nodo'],
+            registry=self.registro
+        )
+        
+        # métricas del pool de canales gRPC
+        self.total_pool_canales = Counter(
+            'total_pool_canales',
+            'Accesos al pool de canales gRPC (hit, miss, reconexion)',
+            ['nodo_id', 'resultado'],
+            registry=self.registro
+        )
+        
+        # métricas del motor de procesos
+        self.procesos_trabajo = Gauge(
+            'procesos_trabajo',
+            'Procesos de trabajo del motor de procesamiento',
+            ['nodo_id'],
+            registry=self.registro
+        )
+
+        self.teselas_en_proceso = Gauge(
+            'teselas_en_proceso',
+            'Teselas procesandose en el motor de procesos',
+            ['nodo_id'],
+            registry=self.registro
+        )
+        
+        # métricas de capacidad estimada de los nodos (vista del coordinador)
+        self.capacidad_nodo = Gauge(
+            'capacidad_nodo_mpx',
+            'Rendimiento estimado de cada nodo en megapixeles por segundo',
+            ['nodo_id', 'nodo'],
+            registry=self.registro
+        )
+
+        self.peso_nodo = Gauge(
+            'peso_nodo',
+            'Peso usado para repartir teselas entre nodos',
+            ['nodo_id', 'nodo'],
+            registry=self.registro
+        )
+        
+        self.total_teselas_nodo = Counter(
+            'total_teselas_nodo',
+            'Teselas procesadas por cada nodo (vista del coordinador)',
+            ['nodo_id', 'nodo'],
+            registry=self.registro
+        )
+        
+        self.total_hedges = Counter(
+            'total_hedges',
+            'Partes duplicadas en otro nodo por demora (lanzado, gano_duplicado, gano_original)',
+            ['nodo_id', 'resultado'],
+            registry=self.registro
+        )
+        
         # métricas del sistema
         self.porcentaje_uso_cpu = Gauge(
             'porcentaje_uso_cpu',
@@ -140,11 +214,26 @@ class RecolectorMetricas:
                 1 if es_coordinador_flag else 0
             )
 
+    def track_brecha_lider(self, duracion):
+        """Registra el tiempo sin coordinador"""
+        with self._lock:
+            self.brecha_lider.labels(nodo_id=str(self.nodo_id)).observe(duracion)
+
+    def track_toma_liderazgo(self, metodo):
+        """Registra que este nodo asumio como coordinador"""
+        with self._lock:
+            self.total_tomas_liderazgo.labels(nodo_id=str(self.nodo_id), metodo=metodo).inc()
+
     def actualizar_nodos_activos(self, cantidad):
         """Actualiza cantidad de nodos activos"""
         with self._lock:
             self.nodos_activos.set(cantidad)
     
+    def actualizar_estado_nodo(self, nodo, valor):
+        """Actualiza el estado de un nodo en la tabla de membresia"""
+        with self._lock:
+            self.estado_nodo.labels(nodo_id=str(self.nodo_id), nodo=nodo).set(valor)
+    
     def track_cambio_coordinador(self, antiguo_c, nuevo_c):
         """Registra cambio de coordinador"""
         with self._lock:
@@ -153,6 +242,40 @@ class RecolectorMetricas:
                 nuevo_c=str(nuevo_c)
             ).inc()
 
+    def track_pool_canales(self, resultado):
+        """Registra acceso al pool de canales"""
+        with self._lock:
+            self.total_pool_canales.labels(
+                nodo_id=str(self.nodo_id),
+                resultado=resultado
+            ).inc()
+
+    def actualizar_procesos_trabajo(self, cantidad):
+        """Actualiza cantidad de procesos de trabajo"""
+        with self._lock:
+            self.procesos_trabajo.labels(nodo_id=str(self.nodo_id)).set(cantidad)
+
+    def track_tesela_en_proceso(self, delta):
+        """Registra una tesela que entra (+1) o sale (-1) del motor de procesos"""
+        with self._lock:
+            self.teselas_en_proceso.labels(nodo_id=str(self.nodo_id)).inc(delta)
+
+    def actualizar_capacidad_nodo(self, nodo, capacidad, peso):
+        """Actualiza capacidad estimada y peso de un nodo"""
+        with self._lock:
+            self.capacidad_nodo.labels(nodo_id=str(self.nodo_id), nodo=nodo).set(capacidad)
+            self.peso_nodo.labels(nodo_id=str(self.nodo_id), nodo=nodo).set(peso)
+
+    def track_tesela_nodo(self, nodo):
+        """Registra una tesela procesada por un nodo"""
+        with self._lock:
+            self.total_teselas_nodo.labels(nodo_id=str(self.nodo_id), nodo=nodo).inc()
+
+    def track_hedge(self, resultado):
+        """Registra una parte duplicada por demora"""
+        with self._lock:
+            self.total_hedges.labels(nodo_id=str(self.nodo_id), resultado=resultado).inc()
+
     def stop_monitoring(self):
         """Detiene el monitoreo"""
         self._monitoring_running = False
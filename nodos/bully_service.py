@@ -1,27 +1,62 @@
-import random
+import os
 import threading
 import time
 import grpc
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 
 from proto import bully_pb2
 from proto import bully_pb2_grpc
+from membresia import TablaMembresia
+from pool_canales import PoolCanales
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# tiempos del algoritmo (segundos), valores bajos dan failover mas rapido a costa de mas trafico
+# el coordinador renueva su lease cada DURACION_LEASE / 3
+DURACION_LEASE = float(os.environ.get("DURACION_LEASE", "3.0"))
+TIMEOUT_HEARTBEAT = float(os.environ.get("TIMEOUT_HEARTBEAT", "2.0"))
+TIMEOUT_ELECCION = float(os.environ.get("TIMEOUT_ELECCION", "3.0"))
+# espera del anuncio de coordinador tras recibir una respuesta, antes de repetir la eleccion
+ESPERA_COORDINADOR = float(os.environ.get("ESPERA_COORDINADOR", "3.0"))
+RETRASO_ELECCION_INICIAL = float(os.environ.get("RETRASO_ELECCION_INICIAL", "2.0"))
+
 class BullyService(bully_pb2_grpc.BullyServiceServicer):
-    def __init__(self, nodo_id, lista_nodos, recolector_metricas_nodo=None):
+    def __init__(self, nodo_id, lista_nodos, recolector_metricas_nodo=None, pool_canales=None):
         self.nodo_id = nodo_id
         self.lista_nodos = lista_nodos  # ["nodo1:50053", "nodo2:50053"]
         self.coordinador_actual = None
         self.es_coordinador = False
         self.eleccion_en_proceso = False
-        self.intervalo_heartbeat = 5.0  #segundos
-        self.timeout_eleccion = 3.0 
+        self.duracion_lease = DURACION_LEASE
+        self.timeout_eleccion = TIMEOUT_ELECCION
         self.recolector_metricas = recolector_metricas_nodo
         
         self.lock = threading.RLock() #mutex
+
+        # canales reutilizados hacia los demas nodos y mensajes enviados en paralelo
+        self.pool_canales = pool_canales or PoolCanales(nodo_id)
+        self._executor = ThreadPoolExecutor(max_workers=max(2, len(lista_nodos)))
+        # se activa con cada anuncio de coordinador y al detener el servicio
+        self._evento_coordinador = threading.Event()
+        self._evento_detener = threading.Event()
+
+        # mandato del coordinador: token de fencing, vencimiento del lease y sucesor designado
+        self.token = 0
+        self.token_nodo = 0  # nodo que emitio el token, desempata tokens iguales
+        self.lease_expira = None  # time.monotonic()
+        self.ultimo_lease = None  # time.time() del ultimo lease recibido
+        self.sucesor_id = None
+        self.fin_lider = None  # ultimo contacto con el coordinador anterior, para medir la brecha
+
+        # tabla de nodos de procesamiento (50052) mantenida en segundo plano
+        self.membresia = TablaMembresia(
+            nodo_id,
+            [d.replace(":50053", ":50052") for d in lista_nodos if self._get_nodo_id(d) != nodo_id],
+            self.pool_canales,
+            recolector_metricas_nodo
+        )
         
         self.running = True
         
@@ -29,8 +64,10 @@ class BullyService(bully_pb2_grpc.BullyServiceServicer):
 
     def iniciar_servicios(self):
         """Inicia los servicios de Bully"""        
+        self.membresia.iniciar()
+
         # se espera un poco antes de iniciar eleccion para que todos los nodos esten listos
-        threading.Timer(2.0, self._iniciar_eleccion_inicial).start()
+        threading.Timer(RETRASO_ELECCION_INICIAL, self._iniciar_eleccion_inicial).start()
 
         # se inicia monitor de coordinador
         threading.Thread(target=self._monitor_coordinador, daemon=True).start()
@@ -43,6 +80,8 @@ class BullyService(bully_pb2_grpc.BullyServiceServicer):
     def detener_servicios(self):
         """Detiene todos los servicios"""
         self.running = False
+        self._evento_detener.set()
+        self.membresia.detener()
 
     # implementacion gRPC
     def Eleccion(self, request, context):
@@ -59,15 +98,21 @@ class BullyService(bully_pb2_grpc.BullyServiceServicer):
 
     def _responder_y_elegir(self, nodo_solicitante):
         """Envía respuesta y luego inicia elección"""
+        direccion = self._get_nodo_direccion(nodo_solicitante)
         try:
             # mensaje de respuesta
-            direccion = self._get_nodo_direccion(nodo_solicitante)
             if direccion:
-                with grpc.insecure_channel(direccion) as channel:
-                    stub = bully_pb2_grpc.BullyServiceStub(channel)
-                    stub.Respuesta(bully_pb2.RespuestaRequest(nodo_id=self.nodo_id), timeout=2.0)
+                self._stub(direccion).Respuesta(bully_pb2.RespuestaRequest(nodo_id=self.nodo_id), timeout=self.timeout_eleccion)
         except Exception as e:
             logger.warning(f"Error enviando respuesta a nodo {nodo_solicitante}: {e}")
+
+        # si ya es coordinador basta con reanunciar el mandato vigente, sin cambiar el token
+        with self.lock:
+            es_coordinador, token = self.es_coordinador, self.token
+        if es_coordinador:
+            if direccion:
+                self._anunciar_coordinador(direccion, token)
+            return
         
         # se inicia la propia elección
         self._iniciar_eleccion()
@@ -82,129 +127,315 @@ class BullyService(bully_pb2_grpc.BullyServiceServicer):
     def Coordinador(self, request, context):
         """Recibe anuncio de nuevo coordinador"""
         with self.lock:
-            antiguo_coordinador = self.coordinador_actual
-            
-            logger.info(f"Nodo {self.nodo_id}: Nuevo coordinador anunciado: {request.coordinador_id}")
-            self.coordinador_actual = request.coordinador_id
-            self.es_coordinador = (request.coordinador_id == self.nodo_id)
-            self.eleccion_en_proceso = False
-            
-            #Cambio de coordinador
-            if self.recolector_metricas and antiguo_coordinador != request.coordinador_id:
+            logger.info(f"Nodo {self.nodo_id}: Nuevo coordinador anunciado: {request.coordinador_id} (token {request.token})")
+            if not self._aceptar_mandato(request.coordinador_id, request.token):
+                return bully_pb2.CoordinadorReply(status="rechazado", token=self.token)
+
+            # el anuncio vale como primer lease, el sucesor llega con las renovaciones
+            self._renovar_lease_local(self.duracion_lease, None)
+            return bully_pb2.CoordinadorReply(status="ok", token=self.token)
+
+    def RenovarLease(self, request, context):
+        """Recibe la renovacion del lease del coordinador"""
+        with self.lock:
+            if not self._aceptar_mandato(request.coordinador_id, request.token):
+                return bully_pb2.LeaseReply(status="rechazado", token=self.token, nodo_id=self.nodo_id)
+
+            preparar = request.sucesor_id == self.nodo_id and self.sucesor_id != self.nodo_id
+            self._renovar_lease_local(request.duracion_ms / 1000, request.sucesor_id or None)
+
+        if preparar:
+            self._executor.submit(self._preparar_sucesion)
+        return bully_pb2.LeaseReply(status="ok", token=self.token, nodo_id=self.nodo_id)
+
+    def Heartbeat(self, request, context):
+        """Responde a heartbeat"""
+        return bully_pb2.HeartbeatReply(status="ok", is_alive=True)
+
+    # funciones auxiliares del mandato del coordinador
+    def _aceptar_mandato(self, coordinador_id, token):
+        """Acepta un coordinador si su token no es anterior al conocido (fencing), con el lock tomado"""
+        if (token, coordinador_id) < (self.token, self.token_nodo):
+            logger.warning(f"Nodo {self.nodo_id}: Rechazado coordinador {coordinador_id} con token antiguo {token} (vigente {self.token})")
+            return False
+
+        antiguo_coordinador = self.coordinador_actual
+        self.token, self.token_nodo = token, coordinador_id
+        self.coordinador_actual = coordinador_id
+        self.es_coordinador = (coordinador_id == self.nodo_id)
+        self.eleccion_en_proceso = False
+        self._evento_coordinador.set()
+
+        #Cambio de coordinador
+        if antiguo_coordinador != coordinador_id:
+            self._registrar_brecha_lider()
+            if self.recolector_metricas:
                 self.recolector_metricas.track_cambio_coordinador(
                     antiguo_coordinador or 0, 
-                    request.coordinador_id
+                    coordinador_id
                 )
                 self.recolector_metricas.actualizar_es_coordinador(self.es_coordinador)
-            
-            return bully_pb2.CoordinadorReply(status="ok")
+        return True
 
-    def Heartbeat(self, request, context):
-        """Responde a heartbeat"""
-        return bully_pb2.HeartbeatReply(status="ok", is_alive=True)
+    def _renovar_lease_local(self, duracion, sucesor_id):
+        """Extiende el lease del coordinador actual, con el lock tomado"""
+        self.lease_expira = time.monotonic() + duracion
+        self.ultimo_lease = time.time()
+        self.sucesor_id = sucesor_id
+
+    def _registrar_brecha_lider(self):
+        """Registra el tiempo sin coordinador desde el ultimo contacto con el anterior"""
+        if self.fin_lider is None:
+            return
+        brecha = time.time() - self.fin_lider
+        self.fin_lider = None
+        logger.info(f"Nodo {self.nodo_id}: Brecha entre coordinadores de {brecha:.3f}s")
+        if self.recolector_metricas:
+            self.recolector_metricas.track_brecha_lider(brecha)
+
+    def _preparar_sucesion(self):
+        """Como sucesor, abre los canales hacia todos los nodos para tomar el mando sin demora"""
+        logger.info(f"Nodo {self.nodo_id}: Designado sucesor del coordinador {self.coordinador_actual}")
+        for direccion in self.lista_nodos:
+            if self._get_nodo_id(direccion) != self.nodo_id:
+                self._executor.submit(self._enviar_heartbeat, direccion)
+
+    def _enviar_heartbeat(self, direccion):
+        """Heartbeat a un nodo, True si responde"""
+        try:
+            response = self._stub(direccion).Heartbeat(
+                bully_pb2.HeartbeatRequest(nodo_id=self.nodo_id),
+                timeout=TIMEOUT_HEARTBEAT
+            )
+            return response.is_alive
+        except Exception as e:
+            self._error_canal(direccion, e)
+            return False
+
+    def _enviar_lease(self, direccion, peticion):
+        """Envia la renovacion del lease a un nodo, None si no responde"""
+        try:
+            return self._stub(direccion).RenovarLease(peticion, timeout=TIMEOUT_HEARTBEAT)
+        except Exception as e:
+            self._error_canal(direccion, e)
+            return None
+
+    def _renovar_leases(self, token):
+        """Mientras sea coordinador con este token, renueva el lease en todos los nodos"""
+        otros = [d for d in self.lista_nodos if self._get_nodo_id(d) != self.nodo_id]
+        while self.running:
+            inicio = time.monotonic()
+            with self.lock:
+                if not self.es_coordinador or self.token != token:
+                    return
+                peticion = bully_pb2.LeaseRequest(
+                    coordinador_id=self.nodo_id,
+                    token=token,
+                    duracion_ms=int(self.duracion_lease * 1000),
+                    sucesor_id=self.sucesor_id or 0
+                )
+
+            respuestas = [r for r in self._executor.map(lambda d: self._enviar_lease(d, peticion), otros) if r]
+            rechazos = [r.token for r in respuestas if r.status == "rechazado"]
+
+            with self.lock:
+                if self.token != token:
+                    return
+                if rechazos:
+                    # hay un coordinador con un token mayor: este mandato ya no es valido
+                    self._dejar_coordinacion(max(rechazos))
+                    return
+                # sucesor: el nodo de mayor id que confirmo, el mismo que ganaria una eleccion
+                confirmados = [r.nodo_id for r in respuestas if r.status == "ok"]
+                self.sucesor_id = max(confirmados) if confirmados else None
+
+            if self._evento_detener.wait(max(0.0, self.duracion_lease / 3 - (time.monotonic() - inicio))):
+                return
+
+    def _dejar_coordinacion(self, token_vigente):
+        """Deja de ser coordinador al conocer un token mayor, con el lock tomado"""
+        logger.warning(f"Nodo {self.nodo_id}: Existe un coordinador con token {token_vigente}, dejando la coordinacion")
+        self.token, self.token_nodo = max(self.token, token_vigente), 0
+        self.es_coordinador = False
+        self.coordinador_actual = None
+        self.lease_expira = None
+        if self.recolector_metricas:
+            self.recolector_metricas.actualizar_es_coordinador(False)
+
+    def _lease_vencido(self, expira):
+        """El lease del coordinador vencio: el sucesor toma el mando, los demas lo esperan"""
+        with self.lock:
+            if self.lease_expira != expira or self.es_coordinador:
+                return
+            anterior = self.coordinador_actual
+            sucesor = self.sucesor_id
+            logger.warning(f"Nodo {self.nodo_id}: Vencio el lease del coordinador {anterior}")
+
+            self.coordinador_actual = None
+            self.lease_expira = None
+            self.fin_lider = self.ultimo_lease
+            self._evento_coordinador.clear()
+
+            # Coordinador caído
+            if self.recolector_metricas:
+                self.recolector_metricas.track_eleccion_bully("coordinador_caido")
+
+            token = None
+            if sucesor == self.nodo_id:
+                logger.info(f"Nodo {self.nodo_id}: Tomando el mando como sucesor designado")
+                token = self._convertirse_coordinador("sucesor")
+
+        if token is not None:
+            self._anunciar_mandato(token)
+            return
+
+        # el sucesor se anuncia apenas vence su lease; si no lo hace, eleccion Bully
+        if sucesor is not None and sucesor != anterior and self._evento_coordinador.wait(self.duracion_lease):
+            return
+        threading.Thread(target=self._iniciar_eleccion, daemon=True).start()
 
     # funciones auxiliares del algoritmo Bully
+    def _stub(self, direccion):
+        """Stub de Bully sobre el canal reutilizado de un nodo"""
+        return self.pool_canales.get_stub(direccion, bully_pb2_grpc.BullyServiceStub)
+
+    def _error_canal(self, direccion, error):
+        """Recrea el canal de un nodo caido para no esperar el backoff de reconexion"""
+        if isinstance(error, grpc.RpcError) and error.code() == grpc.StatusCode.UNAVAILABLE:
+            self.pool_canales.reconectar(direccion)
+
+    def _enviar_eleccion(self, direccion):
+        """Envia mensaje de eleccion a un nodo, True si respondio que sigue en carrera"""
+        try:
+            response = self._stub(direccion).Eleccion(
+                bully_pb2.EleccionRequest(nodo_id=self.nodo_id),
+                timeout=self.timeout_eleccion
+            )
+            return response.status == "respuesta"
+        except Exception as e:
+            self._error_canal(direccion, e)
+            logger.warning(f"Nodo {self.nodo_id}: No se pudo contactar {direccion}: {e}")
+            return False
+
     def _iniciar_eleccion(self):
         """Inicia el proceso de elección"""
         with self.lock:
-            if self.eleccion_en_proceso:
+            if self.eleccion_en_proceso or not self.running:
                 return
                 
             self.eleccion_en_proceso = True
+            self._evento_coordinador.clear()
             logger.info(f"Nodo {self.nodo_id}: Iniciando eleccion")
 
         # elección iniciada
         if self.recolector_metricas:
             self.recolector_metricas.track_eleccion_bully("iniciada")
 
-        # se envian mensajes a los nodos con mayor ID
+        # se envian mensajes a todos los nodos con mayor ID a la vez
         nodos_mayores = [nodo for nodo in self.lista_nodos if self._get_nodo_id(nodo) > self.nodo_id]
-        
+        futures = {self._executor.submit(self._enviar_eleccion, direccion): direccion for direccion in nodos_mayores}
+
+        # basta la primera respuesta, no se espera a los nodos caidos
         respuestas_recibidas = False
-        
-        for direccion in nodos_mayores:
-            try:
-                with grpc.insecure_channel(direccion) as channel:
-                    stub = bully_pb2_grpc.BullyServiceStub(channel)
-                    response = stub.Eleccion(
-                        bully_pb2.EleccionRequest(nodo_id=self.nodo_id), 
-                        timeout=self.timeout_eleccion
-                    )
-                    if response.status == "respuesta":
-                        respuestas_recibidas = True
-                        logger.info(f"Nodo {self.nodo_id}: Recibida respuesta de {direccion}")
-            except Exception as e:
-                logger.warning(f"Nodo {self.nodo_id}: No se pudo contactar {direccion}: {e}")
+        for future in as_completed(futures):
+            if future.result():
+                respuestas_recibidas = True
+                logger.info(f"Nodo {self.nodo_id}: Recibida respuesta de {futures[future]}")
+                break
 
         # Si no se recibieron respuestas, se convierte en coordinador
         if not respuestas_recibidas:
-            time.sleep(2)
+            token = None
             with self.lock:
                 if self.eleccion_en_proceso:
-                    self._convertirse_coordinador()
+                    token = self._convertirse_coordinador("eleccion")
                     
                     # elección ganada
                     if self.recolector_metricas:
                         self.recolector_metricas.track_eleccion_bully("ganada")
+            if token is not None:
+                self._anunciar_mandato(token)
         else:
             # elección perdida
             if self.recolector_metricas:
                 self.recolector_metricas.track_eleccion_bully("perdida")
 
-    def _convertirse_coordinador(self):
-        """Se convierte en coordinador"""
-        logger.info(f"Nodo {self.nodo_id}: Convirtiéndose en coordinador")
-        
-        antiguo_coordinador = self.coordinador_actual
-        self.coordinador_actual = self.nodo_id
-        self.es_coordinador = True
-        self.eleccion_en_proceso = False
-        
-        # Nuevo coordinador
-        if self.recolector_metricas:
-            self.recolector_metricas.track_cambio_coordinador(
-                antiguo_coordinador or 0, 
-                self.nodo_id
+            # un nodo mayor sigue la eleccion: se espera su anuncio, si no llega se repite
+            if not self._evento_coordinador.wait(ESPERA_COORDINADOR) and self.running:
+                logger.warning(f"Nodo {self.nodo_id}: Sin anuncio de coordinador, repitiendo eleccion")
+                with self.lock:
+                    self.eleccion_en_proceso = False
+                threading.Thread(target=self._iniciar_eleccion, daemon=True).start()
+
+    def _anunciar_coordinador(self, direccion, token):
+        """Anuncia a un nodo que este nodo es el coordinador, retorna su respuesta o None"""
+        try:
+            response = self._stub(direccion).Coordinador(
+                bully_pb2.CoordinadorRequest(coordinador_id=self.nodo_id, token=token),
+                timeout=self.timeout_eleccion
             )
-            self.recolector_metricas.actualizar_es_coordinador(True)
-        
-        for direccion in self.lista_nodos:
-            if self._get_nodo_id(direccion) != self.nodo_id:
-                try:
-                    with grpc.insecure_channel(direccion) as channel:
-                        stub = bully_pb2_grpc.BullyServiceStub(channel)
-                        stub.Coordinador(
-                            bully_pb2.CoordinadorRequest(coordinador_id=self.nodo_id), 
-                            timeout=2.0
-                        )
-                        logger.info(f"Coordinador {self.nodo_id}: Anunciado a {direccion}")
-                except Exception as e:
-                    logger.warning(f"Error anunciando a {direccion}: {e}")
+            logger.info(f"Coordinador {self.nodo_id}: Anunciado a {direccion} ({response.status})")
+            return response
+        except Exception as e:
+            self._error_canal(direccion, e)
+            logger.warning(f"Error anunciando a {direccion}: {e}")
+            return None
+
+    def _convertirse_coordinador(self, metodo):
+        """
+        Se convierte en coordinador con un token mayor a todos los conocidos, con el lock
+        tomado; retorna el token, que se anuncia con _anunciar_mandato tras soltar el lock
+        """
+        logger.info(f"Nodo {self.nodo_id}: Convirtiéndose en coordinador ({metodo})")
+
+        self._aceptar_mandato(self.nodo_id, self.token + 1)
+        self.lease_expira = None
+
+        if self.recolector_metricas:
+            self.recolector_metricas.track_toma_liderazgo(metodo)
+        return self.token
+
+    def _anunciar_mandato(self, token):
+        """Anuncia el mandato a todos los nodos a la vez y empieza a renovar el lease, sin el lock tomado"""
+        # se espera sin el lock: un nodo lento no bloquea las RPC de eleccion y lease que llegan
+        futures = [
+            self._executor.submit(self._anunciar_coordinador, direccion, token)
+            for direccion in self.lista_nodos
+            if self._get_nodo_id(direccion) != self.nodo_id
+        ]
+        wait(futures)
+
+        rechazos = [f.result().token for f in futures if f.result() and f.result().status == "rechazado"]
+        with self.lock:
+            if self.token != token or not self.es_coordinador:
+                # mientras se anunciaba llego un mandato mayor
+                return
+            if rechazos:
+                self._dejar_coordinacion(max(rechazos))
+                return
+
+        threading.Thread(target=self._renovar_leases, args=(token,), daemon=True).start()
 
     def _monitor_coordinador(self):
-        """Monitorea coordinador actual"""
-        delay_inicial = random.uniform(0, self.intervalo_heartbeat)
-        time.sleep(delay_inicial)
+        """Vigila el lease del coordinador actual y actua cuando vence"""
         while self.running:
-            time.sleep(self.intervalo_heartbeat)
+            with self.lock:
+                expira = self.lease_expira
+                vigilar = not self.es_coordinador and self.coordinador_actual is not None and expira is not None
 
-            coordinador_a_revisar = None
+            if not vigilar:
+                if self._evento_detener.wait(self.duracion_lease / 3):
+                    break
+                continue
 
-            with self.lock:
-                if not self.es_coordinador and self.coordinador_actual is not None:
-                    coordinador_a_revisar = self.coordinador_actual
-            
-            if coordinador_a_revisar and not self._verificar_coordinador_alive():
-                logger.warning(f"Nodo {self.nodo_id}: Coordinador {coordinador_a_revisar} no responde")
-                with self.lock:
-                    if self.coordinador_actual == coordinador_a_revisar:
-                        self.coordinador_actual = None
+            # se duerme hasta el vencimiento; si hubo renovacion se vuelve a calcular
+            restante = expira - time.monotonic()
+            if restante > 0:
+                if self._evento_detener.wait(restante):
+                    break
+                continue
 
-                        # Coordinador caído
-                        if self.recolector_metricas:
-                            self.recolector_metricas.track_eleccion_bully("coordinador_caido")
-                            
-                threading.Thread(target=self._iniciar_eleccion, daemon=True).start()
+            self._lease_vencido(expira)
 
     def _monitor_nodos_activos(self):
         """Monitorea cantidad de nodos activos periódicamente"""
@@ -221,26 +452,6 @@ class BullyService(bully_pb2_grpc.BullyServiceServicer):
                 logger.error(f"Error monitoreando nodos activos: {e}")
                 time.sleep(15)
 
-    def _verificar_coordinador_alive(self):
-        """Verifica si el coordinador actual está vivo"""
-        if self.coordinador_actual is None:
-            return False
-            
-        direccion = self._get_nodo_direccion(self.coordinador_actual)
-        if not direccion:
-            return False
-            
-        try:
-            with grpc.insecure_channel(direccion) as channel:
-                stub = bully_pb2_grpc.BullyServiceStub(channel)
-                response = stub.Heartbeat(
-                    bully_pb2.HeartbeatRequest(nodo_id=self.nodo_id),
-                    timeout=2.0
-                )
-                return response.is_alive
-        except Exception:
-            return False
-
     def _get_nodo_id(self, direccion):
         """Extrae el ID del nodo"""
         try:
@@ -257,17 +468,5 @@ class BullyService(bully_pb2_grpc.BullyServiceServicer):
         return None
 
     def get_nodos_disponibles(self):
-        """Lista de nodos disponibles para procesamiento"""
-        disponibles = []
-        for direccion in self.lista_nodos:
-            if self._get_nodo_id(direccion) != self.nodo_id:
-                try:
-                    # se cambia puerto de bully (50053) a procesamiento (50052)
-                    direccion_proc = direccion.replace(":50053", ":50052")
-                    with grpc.insecure_channel(direccion_proc) as channel:
-                        channel_listo = grpc.channel_ready_future(channel)
-                        channel_listo.result(timeout=1.0)
-                        disponibles.append(direccion_proc)
-                except:
-                    pass
-        return disponibles
\ No newline at end of file
+        """Lista de nodos disponibles para procesamiento, leida de la tabla de membresia"""
+        return self.membresia.disponibles()
@@ -2,120 +2,625 @@ import logging
 import numpy as np
 import cv2
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import math
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from proto import procesador_pb2
+from operaciones import halo_pipeline, escala_pipeline, alineacion_pipeline, costo_pipeline, describir_pipeline, escalar
+from imagen_helper import DISPOSICION_GRILLA
+from estadisticas_nodos import EstimadorCapacidad, EstadisticasLatencia, clase_tamano
 
 logger = logging.getLogger(__name__)
 
+# tamaño maximo de una parte para no superar el limite de mensaje gRPC (20MB)
+TAMANO_MAX_PARTE = 16 * 1024 * 1024
+
+# trabajo minimo por tesela (megapixeles x costo del pipeline) para que valga la pena enviarla
+TRABAJO_MIN_TESELA = float(os.environ.get("TRABAJO_MIN_TESELA", "0.25"))
+
+# el coordinador tambien procesa teselas, con este peso relativo a un nodo (0 = no procesa)
+NODO_LOCAL = "local"
+PESO_COORDINADOR = float(os.environ.get("PESO_COORDINADOR", "1.0"))
+
+# modos de reparto: una tesela por nodo asignada de antemano, o muchas teselas en una cola
+MODO_ESTATICO = "estatico"
+MODO_COLA = "cola"
+MODO_REPARTO = os.environ.get("MODO_REPARTO", MODO_ESTATICO)
+# en modo cola: teselas por nodo y teselas que pide un nodo en cada llamada
+FACTOR_SOBREDESCOMPOSICION = int(os.environ.get("FACTOR_SOBREDESCOMPOSICION", "4"))
+TESELAS_POR_LOTE = int(os.environ.get("TESELAS_POR_LOTE", "2"))
+
+# imagenes de un lote decodificadas y en proceso a la vez, limita la memoria del coordinador
+IMAGENES_EN_VUELO = int(os.environ.get("IMAGENES_EN_VUELO", "4"))
+
+# hilos para las llamadas originales y duplicadas (hedging) de todas las peticiones
+MAX_LLAMADAS_PARALELAS = 32
+
+class PlanProcesamiento:
+    """Teselas de una imagen y el nodo asignado a cada una"""
+
+    def __init__(self, img, pipeline, teselas, partes, asignacion, nodos_remotos):
+        self.img = img
+        self.pipeline = pipeline
+        self.teselas = teselas
+        self.partes = partes
+        self.asignacion = asignacion  # nodo objetivo de cada tesela, None en modo cola
+        self.nodos_remotos = nodos_remotos
+        self.teselas_por_nodo = {}  # nodo que proceso efectivamente cada tesela
+        self._lock = threading.Lock()
+
+    def registrar_tesela(self, nodo):
+        """Cuenta una tesela procesada por un nodo"""
+        with self._lock:
+            self.teselas_por_nodo[nodo] = self.teselas_por_nodo.get(nodo, 0) + 1
+
 class CoordinadorService:
     def __init__(self, nodo_id, bully_service, imagen_helper, recolector_metricas_nodo=None):
         self.nodo_id = nodo_id
         self.bully_service = bully_service
         self.imagen_helper = imagen_helper
         self.recolector_metricas = recolector_metricas_nodo
+        self.peso_local = PESO_COORDINADOR
+        self.estimador = EstimadorCapacidad(nodo_id, recolector_metricas_nodo=recolector_metricas_nodo)
+        self.modo_reparto = MODO_REPARTO
+        self.latencias = EstadisticasLatencia(nodo_id)
+        self._executor_llamadas = ThreadPoolExecutor(max_workers=MAX_LLAMADAS_PARALELAS)
 
-    def procesar_imagen_distribuida(self, imagen_data):
+    def procesar_imagen_distribuida(self, imagen_data, pipeline):
         """Distribuye imagen a nodos disponibles"""
         try:
-            imagen_np = np.frombuffer(imagen_data, dtype=np.uint8)
-            img = cv2.imdecode(imagen_np, cv2.IMREAD_COLOR)
-            
-            if img is None:
+            plan, mensaje_error = self._preparar_partes(imagen_data, pipeline)
+            if mensaje_error:
                 return procesador_pb2.ImagenReply(
-                    status="error", 
-                    imagen_data=b"", 
-                    mensaje="Error al decodificar imagen"
+                    status="error",
+                    imagen_data=b"",
+                    mensaje=mensaje_error
                 )
 
-            # nodos disponibles
-            nodos_disponibles = self.bully_service.get_nodos_disponibles()
-            if not nodos_disponibles:
+            partes_procesadas = self._procesar_partes_paralelo(plan)
+
+            if len(partes_procesadas) != len(plan.partes):
                 return procesador_pb2.ImagenReply(
-                    status="error", 
-                    imagen_data=b"", 
-                    mensaje="No hay nodos disponibles"
+                    status="error",
+                    imagen_data=b"",
+                    mensaje=f"Solo se procesaron {len(partes_procesadas)}/{len(plan.partes)} partes"
                 )
 
-            logger.info(f"Coordinador {self.nodo_id}: Procesando imagen con {len(nodos_disponibles)} nodos")
-            logger.info(f"Nodos disponibles: {nodos_disponibles}")
+            # se recorta el halo y se une todas las partes
+            alto, ancho = plan.img.shape[:2]
+            imagen_final_bytes = self.imagen_helper.unir_teselas(
+                plan.teselas, partes_procesadas, alto, ancho, escala_pipeline(pipeline)
+            )
+
+            logger.info(f"Coordinador {self.nodo_id}: Imagen procesada exitosamente, teselas por nodo: {plan.teselas_por_nodo}")
+            return procesador_pb2.ImagenReply(
+                status="ok",
+                imagen_data=imagen_final_bytes,
+                teselas_por_nodo=plan.teselas_por_nodo
+            )
+
+        except Exception as e:
+            logger.error(f"Error en procesamiento distribuido: {e}")
+            return procesador_pb2.ImagenReply(
+                status="error",
+                imagen_data=b"",
+                mensaje=str(e)
+            )
+
+    def procesar_imagen_progresiva(self, imagen_data, pipeline):
+        """Distribuye imagen y entrega cada tesela apenas termina de procesarse"""
+        try:
+            plan, mensaje_error = self._preparar_partes(imagen_data, pipeline)
+            if mensaje_error:
+                yield procesador_pb2.ParteProcesada(final=True, status="error", mensaje=mensaje_error)
+                return
 
-            # dividir imagen
-            num_nodos = len(nodos_disponibles)
-            partes = self.imagen_helper.dividir_imagen(img, num_nodos)
+            alto, ancho = plan.img.shape[:2]
+            escala = escala_pipeline(pipeline)
+            alto_total, ancho_total = escalar(alto, escala), escalar(ancho, escala)
+            total_partes = len(plan.partes)
 
-            partes_procesadas = self._procesar_partes_paralelo(partes, nodos_disponibles)
+            partes_procesadas = [None] * total_partes
+            for index, resultado in self._iterar_partes_paralelo(plan):
+                if resultado is None:
+                    continue
+                partes_procesadas[index] = resultado
 
-            if len(partes_procesadas) != len(partes):
-                return procesador_pb2.ImagenReply(
-                    status="error", 
-                    imagen_data=b"", 
-                    mensaje=f"Solo se procesaron {len(partes_procesadas)}/{len(partes)} partes"
+                # se envia solo la region propia de la tesela, sin halo
+                nucleo, (fila, columna) = self.imagen_helper.recortar_tesela(plan.teselas[index], resultado, escala)
+
+                _, buf = cv2.imencode(".png", nucleo)
+                yield procesador_pb2.ParteProcesada(
+                    indice=index,
+                    fila_inicio=fila,
+                    columna_inicio=columna,
+                    total_partes=total_partes,
+                    alto_total=alto_total,
+                    ancho_total=ancho_total,
+                    imagen_data=buf.tobytes(),
+                    status="ok"
                 )
 
-            # se une todas las partes
-            imagen_final_bytes = self.imagen_helper.unir_imagen(partes_procesadas)
-            
-            logger.info(f"Coordinador {self.nodo_id}: Imagen procesada exitosamente")
-            return procesador_pb2.ImagenReply(status="ok", imagen_data=imagen_final_bytes)
+            completadas = [p for p in partes_procesadas if p is not None]
+            if len(completadas) != total_partes:
+                yield procesador_pb2.ParteProcesada(
+                    final=True,
+                    status="error",
+                    mensaje=f"Solo se procesaron {len(completadas)}/{total_partes} partes"
+                )
+                return
+
+            # la imagen completa se envia al final para almacenarla
+            yield procesador_pb2.ParteProcesada(
+                total_partes=total_partes,
+                alto_total=alto_total,
+                ancho_total=ancho_total,
+                imagen_data=self.imagen_helper.unir_teselas(plan.teselas, completadas, alto, ancho, escala),
+                final=True,
+                status="ok",
+                teselas_por_nodo=plan.teselas_por_nodo
+            )
+            logger.info(f"Coordinador {self.nodo_id}: Imagen progresiva procesada exitosamente, teselas por nodo: {plan.teselas_por_nodo}")
 
         except Exception as e:
-            logger.error(f"Error en procesamiento distribuido: {e}")
-            return procesador_pb2.ImagenReply(
-                status="error", 
-                imagen_data=b"", 
-                mensaje=str(e)
+            logger.error(f"Error en procesamiento progresivo: {e}")
+            yield procesador_pb2.ParteProcesada(final=True, status="error", mensaje=str(e))
+
+    def procesar_imagenes(self, imagenes, pipeline):
+        """
+        Procesa varias imagenes con las teselas de todas en una sola cola, asi los nodos
+        no quedan ociosos entre una imagen y la siguiente. Mientras los nodos procesan,
+        un hilo decodifica y divide las imagenes siguientes
+
+        Yields:
+            ImagenProcesada de cada imagen, en el orden en que terminan
+        """
+        total = len(imagenes)
+        planes = {}
+        pendientes = queue.Queue()  # (imagen, tesela)
+        resultados = queue.Queue()  # ((imagen, tesela), resultado, nodo), tesela None si no se pudo decodificar
+        produccion_terminada = threading.Event()
+        cancelado = threading.Event()
+        en_vuelo = threading.Semaphore(IMAGENES_EN_VUELO)
+
+        def decodificar():
+            try:
+                for indice, imagen_data in enumerate(imagenes):
+                    en_vuelo.acquire()
+                    if cancelado.is_set():
+                        return
+                    try:
+                        plan, mensaje_error = self._preparar_partes(imagen_data, pipeline, MODO_COLA)
+                    except Exception as e:
+                        plan, mensaje_error = None, str(e)
+                    if mensaje_error:
+                        resultados.put(((indice, None), mensaje_error, None))
+                        continue
+
+                    planes[indice] = plan
+                    for i in sorted(range(len(plan.partes)), key=lambda i: plan.partes[i].size, reverse=True):
+                        pendientes.put((indice, i))
+            finally:
+                produccion_terminada.set()
+
+        def parte_de(elemento):
+            indice, i = elemento
+            return planes[indice].partes[i]
+
+        nodos = self._nodos_cola(self.bully_service.get_nodos_disponibles())
+        logger.info(f"Coordinador {self.nodo_id}: Procesando lote de {total} imagenes con {len(nodos)} nodos ({describir_pipeline(pipeline)})")
+
+        partes_recibidas = {}  # imagen -> partes procesadas
+        entregadas = set()
+        escala = escala_pipeline(pipeline)
+
+        executor = ThreadPoolExecutor(max_workers=len(nodos) + 1)
+        try:
+            executor.submit(decodificar)
+            workers = [
+                executor.submit(self._trabajar_cola, nodo, pendientes, resultados, parte_de, pipeline, produccion_terminada)
+                for nodo in nodos
+            ]
+
+            while len(entregadas) < total:
+                try:
+                    (indice, i), resultado, nodo = resultados.get(timeout=0.1)
+                except queue.Empty:
+                    # sin nodos que tomen teselas: las que quedan las procesa el coordinador
+                    if all(w.done() for w in workers):
+                        for elemento, resultado in self._vaciar_cola_local(pendientes, parte_de, pipeline):
+                            resultados.put((elemento, resultado, NODO_LOCAL))
+                        if produccion_terminada.is_set() and resultados.empty():
+                            break
+                    continue
+
+                if indice in entregadas:
+                    continue  # tesela de una imagen que ya fallo
+
+                if i is None or resultado is None:
+                    entregadas.add(indice)
+                    partes_recibidas.pop(indice, None)
+                    en_vuelo.release()
+                    mensaje = resultado if i is None else f"Tesela {i} no se pudo procesar"
+                    yield procesador_pb2.ImagenProcesada(indice=indice, status="error", mensaje=mensaje)
+                    continue
+
+                plan = planes[indice]
+                self._registrar_tesela(plan, nodo)
+                partes = partes_recibidas.setdefault(indice, [None] * len(plan.partes))
+                partes[i] = resultado
+                if any(p is None for p in partes):
+                    continue
+
+                # imagen completa: se une y se libera su lugar para decodificar la siguiente
+                alto, ancho = plan.img.shape[:2]
+                try:
+                    respuesta = procesador_pb2.ImagenProcesada(
+                        indice=indice,
+                        status="ok",
+                        imagen_data=self.imagen_helper.unir_teselas(plan.teselas, partes, alto, ancho, escala),
+                        teselas_por_nodo=plan.teselas_por_nodo
+                    )
+                except Exception as e:
+                    logger.error(f"Coordinador {self.nodo_id}: Error uniendo imagen {indice} del lote: {e}")
+                    respuesta = procesador_pb2.ImagenProcesada(indice=indice, status="error", mensaje=str(e))
+                del planes[indice], partes_recibidas[indice]
+                entregadas.add(indice)
+                en_vuelo.release()
+                yield respuesta
+
+            # imagenes que quedaron incompletas
+            for indice in range(total):
+                if indice not in entregadas:
+                    yield procesador_pb2.ImagenProcesada(indice=indice, status="error", mensaje="Imagen no procesada")
+
+            logger.info(f"Coordinador {self.nodo_id}: Lote de {total} imagenes terminado")
+
+        finally:
+            # si el cliente cancela, el decodificador y los nodos dejan de tomar trabajo
+            cancelado.set()
+            for _ in range(total):
+                en_vuelo.release()
+            while not pendientes.empty():
+                try:
+                    pendientes.get_nowait()
+                except queue.Empty:
+                    break
+            executor.shutdown(wait=False)
+
+    def _preparar_partes(self, imagen_data, pipeline, modo=None):
+        """Decodifica la imagen, la divide en teselas y asigna cada una a un nodo"""
+        modo = modo or self.modo_reparto
+        imagen_np = np.frombuffer(imagen_data, dtype=np.uint8)
+        img = cv2.imdecode(imagen_np, cv2.IMREAD_COLOR)
+
+        if img is None:
+            return None, "Error al decodificar imagen"
+
+        # nodos disponibles, el coordinador participa con su peso
+        nodos_disponibles = self.bully_service.get_nodos_disponibles()
+        pesos = self._pesos_nodos(nodos_disponibles)
+
+        logger.info(f"Coordinador {self.nodo_id}: Procesando imagen con {len(pesos)} nodos ({describir_pipeline(pipeline)})")
+        logger.info(f"Nodos disponibles: {nodos_disponibles}")
+
+        alto, ancho = img.shape[:2]
+        halo = halo_pipeline(pipeline)
+        alineacion = alineacion_pipeline(pipeline)
+        if alineacion is None:
+            # con una escala que no cae en pixeles enteros las teselas dejarian costuras
+            logger.info(f"Coordinador {self.nodo_id}: Escala {escala_pipeline(pipeline)} sin alineacion exacta, una sola tesela")
+            num_partes = 1
+        else:
+            num_partes = self._planificar_num_teselas(img, pipeline, halo, len(pesos), modo)
+
+        disposicion = self.imagen_helper.elegir_disposicion(alto, ancho, halo)
+        tam_tesela = self.imagen_helper.calcular_tam_tesela(alto, ancho, num_partes, disposicion)
+
+        # si el pipeline cambia el tamaño, los bordes de tesela se alinean a la grilla de salida
+        if alineacion and alineacion > 1:
+            tam_tesela = tuple(math.ceil(t / alineacion) * alineacion for t in tam_tesela)
+            halo = math.ceil(halo / alineacion) * alineacion
+
+        if modo == MODO_COLA:
+            # muchas teselas iguales, cada nodo toma la siguiente cuando termina
+            teselas, partes = self.imagen_helper.dividir_en_teselas(img, tam_tesela, halo, disposicion)
+            plan = PlanProcesamiento(img, pipeline, teselas, partes, None, nodos_disponibles)
+            return plan, None
+
+        # los nodos de mayor peso reciben las teselas
+        nodos_elegidos = sorted(pesos, key=lambda n: pesos[n], reverse=True)[:num_partes]
+
+        if num_partes == len(nodos_elegidos) and disposicion != DISPOSICION_GRILLA and alineacion == 1:
+            # una tesela por nodo, de tamaño proporcional a su peso
+            teselas, partes = self.imagen_helper.dividir_en_teselas(
+                img, tam_tesela, halo, disposicion, pesos=[pesos[n] for n in nodos_elegidos]
             )
+            asignacion = list(nodos_elegidos)
+        else:
+            teselas, partes = self.imagen_helper.dividir_en_teselas(img, tam_tesela, halo, disposicion)
+            asignacion = self._asignar_teselas(teselas, {n: pesos[n] for n in nodos_elegidos})
+
+        plan = PlanProcesamiento(img, pipeline, teselas, partes, asignacion, nodos_disponibles)
+        return plan, None
+
+    def _pesos_nodos(self, nodos_disponibles):
+        """Peso de cada nodo segun su rendimiento medido, incluido el coordinador"""
+        if not nodos_disponibles:
+            # sin nodos remotos el coordinador procesa todo
+            return {NODO_LOCAL: 1.0}
+
+        candidatos = list(nodos_disponibles) + ([NODO_LOCAL] if self.peso_local > 0 else [])
+        pesos = self.estimador.pesos(candidatos)
+        if NODO_LOCAL in pesos:
+            pesos[NODO_LOCAL] *= self.peso_local
+        # solo se publican los pesos del reparto, no los de las alternativas de un reintento
+        self.estimador.publicar(pesos)
+        return pesos
+
+    def _asignar_teselas(self, teselas, pesos):
+        """Asigna teselas a nodos equilibrando el area por peso (mayor area primero)"""
+        areas = [(t.y1 - t.y0) * (t.x1 - t.x0) for t in teselas]
+        carga = {nodo: 0.0 for nodo in pesos}
+        asignacion = [None] * len(teselas)
+
+        for i in sorted(range(len(teselas)), key=lambda i: areas[i], reverse=True):
+            nodo = min(pesos, key=lambda n: (carga[n] + areas[i]) / pesos[n])
+            carga[nodo] += areas[i]
+            asignacion[i] = nodo
+
+        return asignacion
+
+    def _planificar_num_teselas(self, img, pipeline, halo, num_nodos, modo):
+        """Cantidad de teselas segun el costo del pipeline, su halo y los nodos disponibles"""
+        alto, ancho = img.shape[:2]
+
+        # imagenes pequeñas u operaciones baratas no justifican repartir entre todos los nodos
+        trabajo = (alto * ancho / 1e6) * costo_pipeline(pipeline)
+        objetivo = num_nodos * FACTOR_SOBREDESCOMPOSICION if modo == MODO_COLA else num_nodos
+        num_partes = min(objetivo, max(1, math.ceil(trabajo / TRABAJO_MIN_TESELA)))
+
+        # con halo grande, teselas chicas repiten demasiados pixeles (lado >= 4 * halo)
+        if halo > 0:
+            max_por_halo = max(1, (alto * ancho) // ((4 * halo) ** 2))
+            num_partes = min(num_partes, max_por_halo)
 
-    def _procesar_partes_paralelo(self, partes, nodos_disponibles):
+        # nunca una parte mayor al limite de mensaje
+        return max(num_partes, math.ceil(img.nbytes / TAMANO_MAX_PARTE))
+
+    def _procesar_partes_paralelo(self, plan):
         """Procesa todas las partes en paralelo"""
-        partes_procesadas = [None] * len(partes)
-        
-        max_workers = min(len(nodos_disponibles), 8) # 8 hilos max
-        
+        partes_procesadas = [None] * len(plan.partes)
+
+        for index, resultado in self._iterar_partes_paralelo(plan):
+            partes_procesadas[index] = resultado
+
+        # solo resultados validos
+        return [p for p in partes_procesadas if p is not None]
+
+    def _iterar_partes_paralelo(self, plan):
+        """Procesa las partes en paralelo y las entrega conforme van terminando"""
+        if plan.asignacion is None:
+            yield from self._iterar_partes_cola(plan)
+            return
+
+        max_workers = min(len(set(plan.asignacion)), 8) # 8 hilos max
+
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             future_to_index = {}
-            
-            for i, pt in enumerate(partes):
-                nodo_objetivo = nodos_disponibles[i % len(nodos_disponibles)]
-                
+
+            for i, pt in enumerate(plan.partes):
                 future = executor.submit(
-                    self._procesar_parte_con_reintentos, 
-                    pt, 
-                    nodo_objetivo, 
-                    nodos_disponibles, 
+                    self._procesar_parte_con_reintentos,
+                    pt,
+                    plan.asignacion[i],
+                    plan.nodos_remotos,
+                    plan.pipeline,
                 )
                 future_to_index[future] = i
-            
+
             # se recogen los resultados conforme van terminando
             for future in as_completed(future_to_index):
                 index = future_to_index[future]
+                resultado = None
                 try:
-                    resultado = future.result(timeout=15.0)  # 15 segundos timeout
+                    resultado, nodo = future.result()
                     if resultado is not None:
-                        partes_procesadas[index] = resultado
+                        self._registrar_tesela(plan, nodo)
                         logger.info(f"Parte {index} completada")
                     else:
                         logger.error(f"Parte {index} fallo despues de reintentos")
                 except Exception as e:
                     logger.error(f"Error en parte {index}: {e}")
-        
-        # solo resultados validos
-        return [p for p in partes_procesadas if p is not None]
-    
-    def _procesar_parte_con_reintentos(self, parte, nodo_objetivo, nodos_disponibles, max_intentos=2):
-        """Procesa una parte con reintentos en diferentes nodos"""
-
-        # con el nodo objetivo 
-        resultado = self.imagen_helper.enviar_parte_a_nodo(parte, nodo_objetivo)
-        if resultado is not None:
-            return resultado
-        
-        # con otros nodos
-        for intento in range(max_intentos):
-            for otro in nodos_disponibles:
-                if otro != nodo_objetivo:
-                    resultado = self.imagen_helper.enviar_parte_a_nodo(parte, otro)
-                    if resultado is not None:
-                        return resultado
-        
-        return None
\ No newline at end of file
+                yield index, resultado
+
+    def _iterar_partes_cola(self, plan):
+        """Cada nodo toma lotes de teselas de una cola hasta vaciarla, entregandolas conforme terminan"""
+        pendientes = queue.Queue()
+        # las teselas mas grandes primero, las pequeñas equilibran el final
+        for i in sorted(range(len(plan.partes)), key=lambda i: plan.partes[i].size, reverse=True):
+            pendientes.put(i)
+        resultados = queue.Queue()
+
+        nodos = self._nodos_cola(plan.nodos_remotos)
+
+        recibidas = 0
+        with ThreadPoolExecutor(max_workers=len(nodos)) as executor:
+            futures = [
+                executor.submit(self._trabajar_cola, nodo, pendientes, resultados, plan.partes.__getitem__, plan.pipeline)
+                for nodo in nodos
+            ]
+
+            while recibidas < len(plan.partes):
+                try:
+                    index, resultado, nodo = resultados.get(timeout=0.1)
+                except queue.Empty:
+                    if all(f.done() for f in futures) and resultados.empty():
+                        break
+                    continue
+                recibidas += 1
+                self._registrar_tesela(plan, nodo)
+                yield index, resultado
+
+        # teselas devueltas a la cola cuando ya no quedaban nodos: las procesa el coordinador
+        for index, resultado in self._vaciar_cola_local(pendientes, plan.partes.__getitem__, plan.pipeline):
+            if resultado is not None:
+                self._registrar_tesela(plan, NODO_LOCAL)
+            yield index, resultado
+
+    def _nodos_cola(self, nodos_remotos):
+        """Nodos que toman teselas de la cola, el coordinador incluido si procesa"""
+        nodos = list(nodos_remotos)
+        if self.peso_local > 0 or not nodos:
+            nodos.append(NODO_LOCAL)
+        return nodos
+
+    def _trabajar_cola(self, nodo, pendientes, resultados, parte_de, pipeline, produccion_terminada=None):
+        """
+        Toma lotes de teselas de la cola y los procesa en un nodo hasta vaciarla
+
+        Args:
+            parte_de: retorna la parte a procesar para cada elemento de la cola
+            produccion_terminada: evento que indica que no se agregaran mas teselas,
+                None si la cola ya esta completa
+        """
+        # el coordinador procesa de a una tesela: no tiene costo de llamada que amortizar
+        por_lote = 1 if nodo == NODO_LOCAL else TESELAS_POR_LOTE
+        while True:
+            lote, tamano = [], 0
+            while len(lote) < por_lote:
+                try:
+                    if lote or produccion_terminada is None or produccion_terminada.is_set():
+                        elemento = pendientes.get_nowait()
+                    else:
+                        # la cola puede estar vacia solo porque aun se decodifican imagenes
+                        elemento = pendientes.get(timeout=0.05)
+                except queue.Empty:
+                    if lote or produccion_terminada is None or produccion_terminada.is_set():
+                        break
+                    continue
+                lote.append(elemento)
+                tamano += parte_de(elemento).nbytes
+                if tamano >= TAMANO_MAX_PARTE:
+                    break
+            if not lote:
+                return
+
+            procesadas = self._procesar_lote_medido([parte_de(e) for e in lote], nodo, pipeline)
+            if procesadas is None:
+                # el nodo fallo: sus teselas vuelven a la cola y deja de pedir
+                for elemento in lote:
+                    pendientes.put(elemento)
+                return
+            for elemento, resultado in zip(lote, procesadas):
+                resultados.put((elemento, resultado, nodo))
+
+    def _vaciar_cola_local(self, pendientes, parte_de, pipeline):
+        """Procesa en el coordinador las teselas que quedaron en la cola sin nodos que las tomen"""
+        while True:
+            try:
+                elemento = pendientes.get_nowait()
+            except queue.Empty:
+                return
+            logger.warning(f"Coordinador {self.nodo_id}: Parte {elemento} procesada localmente tras fallar en nodos remotos")
+            yield elemento, self._procesar_medido(parte_de(elemento), NODO_LOCAL, pipeline)
+
+    def _registrar_tesela(self, plan, nodo):
+        """Cuenta la tesela en las estadisticas de la peticion y en las metricas"""
+        plan.registrar_tesela(nodo)
+        if self.recolector_metricas:
+            self.recolector_metricas.track_tesela_nodo(nodo)
+
+    def _procesar_parte_con_reintentos(self, parte, nodo_objetivo, nodos_disponibles, pipeline):
+        """
+        Procesa una parte en su nodo; si tarda mas de lo habitual la duplica en otro nodo
+        y si falla la reintenta en los demas, con el coordinador como ultimo recurso
+
+        Returns:
+            resultado: parte procesada o None
+            nodo: nodo que la proceso
+        """
+
+        if nodo_objetivo == NODO_LOCAL:
+            return self._procesar_medido(parte, NODO_LOCAL, pipeline), NODO_LOCAL
+
+        # alternativas de mayor a menor peso, el coordinador al final
+        pesos = self.estimador.pesos([n for n in nodos_disponibles if n != nodo_objetivo])
+        alternativos = sorted(pesos, key=lambda n: pesos[n], reverse=True) + [NODO_LOCAL]
+
+        clase = clase_tamano(parte.nbytes)
+        # nodo que atiende la parte mientras no se duplica, con el umbral de su propia latencia
+        primario = nodo_objetivo
+        en_curso = {self._executor_llamadas.submit(self._procesar_medido, parte, primario, pipeline): primario}
+        umbral = self.latencias.umbral_hedge(primario, clase)
+        duplicada = False
+
+        while en_curso:
+            # solo se espera el umbral mientras la llamada esta sola y queda otro nodo donde duplicarla
+            espera = umbral if not duplicada and len(en_curso) == 1 and alternativos else None
+            hechos, _ = wait(en_curso, timeout=espera, return_when=FIRST_COMPLETED)
+
+            if not hechos:
+                # llamada demorada: se duplica en otro nodo y gana la primera respuesta
+                otro = alternativos.pop(0)
+                duplicada = True
+                logger.info(f"Coordinador {self.nodo_id}: Parte demorada en {primario} (> {umbral:.2f}s), duplicando en {otro}")
+                self._registrar_hedge("lanzado")
+                en_curso[self._executor_llamadas.submit(self._procesar_medido, parte, otro, pipeline)] = otro
+                continue
+
+            for future in hechos:
+                nodo = en_curso.pop(future)
+                resultado = future.result()
+                if resultado is not None:
+                    if duplicada:
+                        self._registrar_hedge("gano_original" if nodo == primario else "gano_duplicado")
+                    return resultado, nodo
+
+            # fallo sin otra llamada pendiente: siguiente nodo
+            if not en_curso and alternativos:
+                primario = alternativos.pop(0)
+                if primario == NODO_LOCAL:
+                    logger.warning(f"Coordinador {self.nodo_id}: Parte procesada localmente tras fallar en nodos remotos")
+                en_curso[self._executor_llamadas.submit(self._procesar_medido, parte, primario, pipeline)] = primario
+                umbral = self.latencias.umbral_hedge(primario, clase)
+                duplicada = False
+
+        return None, None
+
+    def _registrar_hedge(self, resultado):
+        """Registra una parte duplicada en las metricas"""
+        if self.recolector_metricas:
+            self.recolector_metricas.track_hedge(resultado)
+
+    def _procesar_medido(self, parte, nodo, pipeline):
+        """Procesa una parte en un nodo y registra su rendimiento"""
+        procesadas = self._procesar_lote_medido([parte], nodo, pipeline)
+        return procesadas[0] if procesadas else None
+
+    def _procesar_lote_medido(self, partes, nodo, pipeline):
+        """Procesa una o varias partes en un nodo y registra su rendimiento"""
+        clase = clase_tamano(sum(p.nbytes for p in partes))
+        timeout = self.latencias.timeout(nodo, clase)
+
+        inicio = time.time()
+        if nodo == NODO_LOCAL:
+            procesadas = [self.imagen_helper.procesar_local(parte, pipeline) for parte in partes]
+            if any(p is None for p in procesadas):
+                procesadas = None
+        elif len(partes) == 1:
+            resultado = self.imagen_helper.enviar_parte_a_nodo(partes[0], nodo, pipeline, timeout)
+            procesadas = [resultado] if resultado is not None else None
+        else:
+            procesadas = self.imagen_helper.enviar_lote_a_nodo(partes, nodo, pipeline, timeout)
+        duracion = time.time() - inicio
+
+        if procesadas is None:
+            self.estimador.registrar_fallo(nodo)
+        else:
+            megapixeles = sum(p.shape[0] * p.shape[1] for p in partes) / 1e6
+            self.estimador.registrar(nodo, megapixeles, costo_pipeline(pipeline), duracion)
+            self.latencias.registrar(nodo, clase, duracion)
+        return procesadas
@@ -0,0 +1,136 @@
+import os
+import math
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# peso de la ultima medicion en el promedio movil exponencial
+ALFA_CAPACIDAD = float(os.environ.get("ALFA_CAPACIDAD", "0.3"))
+# peso minimo relativo al promedio, para que un nodo lento siga recibiendo trabajo y se vuelva a medir
+PESO_MINIMO = float(os.environ.get("PESO_MINIMO", "0.1"))
+# factor aplicado a la capacidad de un nodo cuando una parte falla
+PENALIZACION_FALLO = 0.5
+
+# latencias recientes guardadas por nodo y clase de tamaño
+MUESTRAS_LATENCIA = 100
+MUESTRAS_MIN_LATENCIA = int(os.environ.get("MUESTRAS_MIN_LATENCIA", "5"))
+# percentil de latencia a partir del cual se envia un duplicado a otro nodo
+PERCENTIL_HEDGE = float(os.environ.get("PERCENTIL_HEDGE", "95"))
+# timeout = FACTOR_TIMEOUT x p99, acotado; TIMEOUT_INICIAL mientras no hay muestras
+FACTOR_TIMEOUT = float(os.environ.get("FACTOR_TIMEOUT", "3.0"))
+TIMEOUT_MIN = float(os.environ.get("TIMEOUT_MIN", "1.0"))
+TIMEOUT_MAX = float(os.environ.get("TIMEOUT_MAX", "30.0"))
+TIMEOUT_INICIAL = float(os.environ.get("TIMEOUT_INICIAL", "10.0"))
+
+def clase_tamano(tamano_bytes):
+    """Clase de tamaño de una parte, con los mismos rangos que las metricas"""
+    tamano_mb = tamano_bytes / (1024 * 1024)
+
+    if tamano_mb < 1:
+        return "pequeña"
+    elif tamano_mb < 5:
+        return "mediana"
+    elif tamano_mb < 15:
+        return "grande"
+    else:
+        return "muy_grande"
+
+class EstimadorCapacidad:
+    """Promedio movil del rendimiento de cada nodo en megapixeles por segundo"""
+
+    def __init__(self, nodo_id, alfa=ALFA_CAPACIDAD, recolector_metricas_nodo=None):
+        self.nodo_id = nodo_id
+        self.alfa = alfa
+        self.recolector_metricas = recolector_metricas_nodo
+        self.capacidades = {}  # nodo -> megapixeles equivalentes por segundo
+        self._lock = threading.Lock()
+
+    def registrar(self, nodo, megapixeles, costo, duracion):
+        """
+        Registra el tiempo que tardo un nodo en procesar una tesela
+
+        Args:
+            megapixeles: tamaño de la tesela enviada (con halo)
+            costo: costo relativo del pipeline, para comparar pipelines distintos
+            duracion: segundos desde el envio hasta la respuesta
+        """
+        if duracion <= 0:
+            return
+        muestra = megapixeles * costo / duracion
+
+        with self._lock:
+            anterior = self.capacidades.get(nodo)
+            if anterior is None:
+                self.capacidades[nodo] = muestra
+            else:
+                self.capacidades[nodo] = self.alfa * muestra + (1 - self.alfa) * anterior
+
+    def registrar_fallo(self, nodo):
+        """Reduce la capacidad estimada de un nodo que fallo"""
+        with self._lock:
+            if nodo in self.capacidades:
+                self.capacidades[nodo] *= PENALIZACION_FALLO
+
+    def pesos(self, nodos):
+        """Peso relativo de cada nodo (1.0 = capacidad promedio), nodos sin medir reciben 1.0"""
+        with self._lock:
+            medidos = [self.capacidades[n] for n in nodos if n in self.capacidades]
+            promedio = sum(medidos) / len(medidos) if medidos else None
+
+            pesos = {}
+            for nodo in nodos:
+                if promedio and nodo in self.capacidades:
+                    pesos[nodo] = max(PESO_MINIMO, self.capacidades[nodo] / promedio)
+                else:
+                    pesos[nodo] = 1.0
+
+        return pesos
+
+    def publicar(self, pesos):
+        """Publica en las metricas la capacidad de cada nodo y el peso con que se repartio"""
+        if not self.recolector_metricas:
+            return
+        with self._lock:
+            capacidades = {n: self.capacidades.get(n, 0.0) for n in pesos}
+        for nodo, peso in pesos.items():
+            self.recolector_metricas.actualizar_capacidad_nodo(nodo, capacidades[nodo], peso)
+
+class EstadisticasLatencia:
+    """Latencias recientes por nodo y clase de tamaño, para hedging y timeouts adaptativos"""
+
+    def __init__(self, nodo_id):
+        self.nodo_id = nodo_id
+        self.latencias = {}  # (nodo, clase) -> deque de segundos
+        self._lock = threading.Lock()
+
+    def registrar(self, nodo, clase, duracion):
+        """Registra la latencia de una respuesta exitosa"""
+        with self._lock:
+            muestras = self.latencias.get((nodo, clase))
+            if muestras is None:
+                muestras = self.latencias[(nodo, clase)] = deque(maxlen=MUESTRAS_LATENCIA)
+            muestras.append(duracion)
+
+    def percentil(self, nodo, clase, percentil):
+        """Percentil de latencia, None si aun no hay muestras suficientes"""
+        with self._lock:
+            muestras = self.latencias.get((nodo, clase))
+            if not muestras or len(muestras) < MUESTRAS_MIN_LATENCIA:
+                return None
+            ordenadas = sorted(muestras)
+
+        posicion = min(len(ordenadas) - 1, math.ceil(percentil / 100 * len(ordenadas)) - 1)
+        return ordenadas[max(0, posicion)]
+
+    def umbral_hedge(self, nodo, clase):
+        """Segundos de espera antes de duplicar una parte, None si no se conoce al nodo"""
+        return self.percentil(nodo, clase, PERCENTIL_HEDGE)
+
+    def timeout(self, nodo, clase):
+        """Timeout de una llamada derivado de la latencia observada"""
+        p99 = self.percentil(nodo, clase, 99)
+        if p99 is None:
+            return TIMEOUT_INICIAL
+        return min(TIMEOUT_MAX, max(TIMEOUT_MIN, FACTOR_TIMEOUT * p99))
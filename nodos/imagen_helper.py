@@ -1,17 +1,50 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import cv2
 import grpc
 import logging
 
 from proto import procesador_pb2, procesador_pb2_grpc
+from tensor_codec import codificar_tensor, decodificar_tensor, compresion_grpc, cargar_codificaciones
+from operaciones import ejecutar_pipeline, pipeline_a_proto, escalar
 
 logger = logging.getLogger(__name__)
 
+# disposiciones de teselas
+DISPOSICION_FILAS = "filas"
+DISPOSICION_COLUMNAS = "columnas"
+DISPOSICION_GRILLA = "grilla"
+
+class Tesela:
+    """Region de la imagen asignada a un nodo, junto con su halo"""
+
+    def __init__(self, indice, y0, y1, x0, x1, alto, ancho, halo=0):
+        self.indice = indice
+
+        # region propia de la tesela
+        self.y0, self.y1 = y0, y1
+        self.x0, self.x1 = x0, x1
+
+        # region enviada al nodo, ampliada con el halo y limitada a la imagen
+        self.hy0, self.hy1 = max(0, y0 - halo), min(alto, y1 + halo)
+        self.hx0, self.hx1 = max(0, x0 - halo), min(ancho, x1 + halo)
+
+    def extraer(self, img):
+        """Vista de la imagen con la tesela y su halo"""
+        return img[self.hy0:self.hy1, self.hx0:self.hx1]
+
+    def __repr__(self):
+        return f"Tesela({self.indice}, y={self.y0}:{self.y1}, x={self.x0}:{self.x1})"
+
 class ImagenHelper():
-    def __init__(self, nodo_id):
+    def __init__(self, nodo_id, pool_canales, motor_procesos=None):
         self.nodo_id = nodo_id
+        self.pool_canales = pool_canales
+        self.motor_procesos = motor_procesos  # None: se procesa en el hilo de gRPC
+        self.codificacion_defecto, self.codificacion_enlaces = cargar_codificaciones()
 
-    def procesar_parte_individual(self, imagen_data):
+    def procesar_parte_individual(self, imagen_data, pipeline):
         """Procesa una parte individual de imagen"""
         try:
             imagen_np = np.frombuffer(imagen_data, dtype=np.uint8)
@@ -26,9 +59,8 @@ class ImagenHelper():
 
             logger.info(f"Nodo {self.nodo_id}: Procesando parte individual")
             
-            # se convierte a escala de grises
-            img_gris = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            _, buf = cv2.imencode(".png", img_gris)
+            img_procesada = self.procesar_pixeles(img, pipeline)
+            _, buf = cv2.imencode(".png", img_procesada)
             
             return procesador_pb2.ImagenReply(
                 status="ok", 
@@ -43,62 +75,257 @@ class ImagenHelper():
                 mensaje=str(e)
             )
 
-    def dividir_imagen(self, img, num_partes):
-        """Divide una imagen en partes horizontales"""
-        # division en partes
-        alto = img.shape[0] # altura
-        alto_parte = alto // num_partes
-        resto = alto % num_partes
-        
-        partes = []
-        inicio = 0
-        
-        for i in range(num_partes):
-            # se distrinuye el resto entre las primeras partes
-            extra = 1 if i < resto else 0
-            final = inicio + alto_parte + extra
-            
-            if i == num_partes - 1:  # ultima parte toma todo lo que queda
-                final = alto
-                
-            partes.append(img[inicio:final, :])
-            inicio = final
-            
-        return partes
+    def procesar_tensor(self, tensor, pipeline):
+        """Procesa una parte recibida como pixeles sin codificar"""
+        try:
+            img = decodificar_tensor(tensor)
+
+            logger.info(f"Nodo {self.nodo_id}: Procesando parte {img.shape} ({tensor.codificacion})")
+
+            img_procesada = self.procesar_pixeles(img, pipeline)
+
+            # se responde con la misma codificacion de la peticion
+            return procesador_pb2.ImagenReply(
+                status="ok",
+                tensor=codificar_tensor(img_procesada, tensor.codificacion)
+            )
+
+        except Exception as e:
+            logger.error(f"Error procesando tensor en nodo {self.nodo_id}: {e}")
+            return procesador_pb2.ImagenReply(
+                status="error",
+                imagen_data=b"",
+                mensaje=str(e)
+            )
+
+    def procesar_lote(self, tensores, pipeline):
+        """Procesa varias teselas recibidas en una sola llamada"""
+        try:
+            imgs = [decodificar_tensor(t) for t in tensores]
+            logger.info(f"Nodo {self.nodo_id}: Procesando lote de {len(imgs)} teselas")
+
+            # con motor de procesos las teselas del lote se reparten entre los nucleos
+            if self.motor_procesos and len(imgs) > 1:
+                with ThreadPoolExecutor(max_workers=len(imgs)) as executor:
+                    procesadas = list(executor.map(lambda img: self.procesar_pixeles(img, pipeline), imgs))
+            else:
+                procesadas = [self.procesar_pixeles(img, pipeline) for img in imgs]
+
+            return procesador_pb2.LoteReply(
+                status="ok",
+                teselas=[codificar_tensor(img, t.codificacion) for img, t in zip(procesadas, tensores)]
+            )
 
-    def unir_imagen(self, partes):
-        """Une partes procesadas en una imagen final"""
+        except Exception as e:
+            logger.error(f"Error procesando lote en nodo {self.nodo_id}: {e}")
+            return procesador_pb2.LoteReply(status="error", mensaje=str(e))
+
+    def procesar_pixeles(self, img, pipeline):
+        """Aplica el pipeline completo a los pixeles de una parte"""
+        if self.motor_procesos:
+            return self.motor_procesos.ejecutar(img, pipeline)
+        return ejecutar_pipeline(img, pipeline)
+
+    def procesar_local(self, parte, pipeline):
+        """Procesa una parte en el propio nodo, sin pasar por gRPC"""
         try:
-            imagen_final = np.vstack(partes)
+            return self.procesar_pixeles(parte, pipeline)
+        except Exception as e:
+            logger.error(f"Error procesando parte local en nodo {self.nodo_id}: {e}")
+            return None
+
+    def codificacion_para(self, nodo_direccion):
+        """Codificacion configurada para el enlace con un nodo"""
+        return self.codificacion_enlaces.get(nodo_direccion, self.codificacion_defecto)
+
+    def elegir_disposicion(self, alto, ancho, halo=0):
+        """Elige la disposicion de teselas segun la proporcion de la imagen"""
+        # sin halo las franjas horizontales son contiguas en memoria y no repiten pixeles
+        if halo == 0:
+            return DISPOSICION_FILAS
+
+        proporcion = ancho / alto
+        if proporcion < 0.5:
+            return DISPOSICION_FILAS
+        elif proporcion > 2:
+            return DISPOSICION_COLUMNAS
+        return DISPOSICION_GRILLA
+
+    def calcular_tam_tesela(self, alto, ancho, num_teselas, disposicion):
+        """Tamaño de tesela (alto, ancho) para obtener aproximadamente num_teselas"""
+        if disposicion == DISPOSICION_FILAS:
+            return math.ceil(alto / num_teselas), ancho
+        elif disposicion == DISPOSICION_COLUMNAS:
+            return alto, math.ceil(ancho / num_teselas)
+
+        # grilla: filas y columnas proporcionales a la forma de la imagen
+        filas = max(1, round(math.sqrt(num_teselas * alto / ancho)))
+        columnas = max(1, math.ceil(num_teselas / filas))
+        return math.ceil(alto / filas), math.ceil(ancho / columnas)
+
+    def dividir_en_teselas(self, img, tam_tesela, halo=0, disposicion=None, pesos=None):
+        """
+        Divide una imagen en teselas con halo (solapamiento)
+
+        Args:
+            img: imagen a dividir
+            tam_tesela: (alto, ancho) de la region propia de cada tesela
+            halo: pixeles extra por lado que necesita el procesamiento
+            disposicion: 'filas', 'columnas' o 'grilla', se elige por proporcion si es None
+            pesos: en filas o columnas, una tesela por peso con tamaño proporcional (ignora tam_tesela)
+
+        Returns:
+            teselas: lista de Tesela con las coordenadas
+            partes: lista de vistas de la imagen con el halo incluido
+        """
+        alto, ancho = img.shape[:2]
+        disposicion = disposicion or self.elegir_disposicion(alto, ancho, halo)
+
+        if pesos and disposicion != DISPOSICION_GRILLA:
+            largo = alto if disposicion == DISPOSICION_FILAS else ancho
+            teselas = []
+            inicio = 0
+            for fin in self._cortes_proporcionales(largo, pesos):
+                if disposicion == DISPOSICION_FILAS:
+                    teselas.append(Tesela(len(teselas), inicio, fin, 0, ancho, alto, ancho, halo))
+                else:
+                    teselas.append(Tesela(len(teselas), 0, alto, inicio, fin, alto, ancho, halo))
+                inicio = fin
+            return teselas, [tesela.extraer(img) for tesela in teselas]
+
+        alto_tesela, ancho_tesela = tam_tesela
+        if disposicion == DISPOSICION_FILAS:
+            ancho_tesela = ancho
+        elif disposicion == DISPOSICION_COLUMNAS:
+            alto_tesela = alto
+        alto_tesela = max(1, min(alto_tesela, alto))
+        ancho_tesela = max(1, min(ancho_tesela, ancho))
+
+        teselas = []
+        for y0 in range(0, alto, alto_tesela):
+            for x0 in range(0, ancho, ancho_tesela):
+                y1 = min(y0 + alto_tesela, alto)
+                x1 = min(x0 + ancho_tesela, ancho)
+                teselas.append(Tesela(len(teselas), y0, y1, x0, x1, alto, ancho, halo))
+
+        partes = [tesela.extraer(img) for tesela in teselas]
+        return teselas, partes
+
+    def _cortes_proporcionales(self, largo, pesos):
+        """Posiciones de corte para repartir largo en proporcion a los pesos (minimo 1 pixel)"""
+        total = sum(pesos)
+        cortes = []
+        acumulado = 0.0
+        for i, peso in enumerate(pesos[:-1]):
+            acumulado += peso
+            corte = round(largo * acumulado / total)
+            anterior = cortes[-1] if cortes else 0
+            # cada tesela conserva al menos un pixel
+            corte = min(max(corte, anterior + 1), largo - (len(pesos) - 1 - i))
+            cortes.append(corte)
+        cortes.append(largo)
+        return cortes
+
+    def recortar_tesela(self, tesela, parte_procesada, escala=None):
+        """
+        Quita el halo de una tesela procesada
+
+        Returns:
+            nucleo: pixeles propios de la tesela
+            (fila, columna): posicion en la imagen de salida
+        """
+        # el procesamiento puede cambiar el tamaño (ej. redimensionar)
+        if escala is None:
+            escala = parte_procesada.shape[0] / (tesela.hy1 - tesela.hy0)
+
+        fila0, fila1 = escalar(tesela.y0, escala), escalar(tesela.y1, escala)
+        col0, col1 = escalar(tesela.x0, escala), escalar(tesela.x1, escala)
+        arriba = escalar(tesela.y0 - tesela.hy0, escala)
+        izquierda = escalar(tesela.x0 - tesela.hx0, escala)
+
+        nucleo = parte_procesada[arriba:arriba + (fila1 - fila0), izquierda:izquierda + (col1 - col0)]
+
+        # diferencias de redondeo al escalar
+        if nucleo.shape[:2] != (fila1 - fila0, col1 - col0) and nucleo.size and fila1 > fila0 and col1 > col0:
+            nucleo = cv2.resize(nucleo, (col1 - col0, fila1 - fila0), interpolation=cv2.INTER_NEAREST)
+
+        return nucleo, (fila0, col0)
+
+    def ensamblar_teselas(self, teselas, partes_procesadas, alto, ancho, escala=None):
+        """Recorta el halo de cada tesela y las coloca en la imagen final"""
+        if escala is None:
+            escala = partes_procesadas[0].shape[0] / (teselas[0].hy1 - teselas[0].hy0)
+
+        muestra = partes_procesadas[0]
+        imagen_final = np.zeros((escalar(alto, escala), escalar(ancho, escala)) + muestra.shape[2:], dtype=muestra.dtype)
+
+        for tesela, parte in zip(teselas, partes_procesadas):
+            nucleo, (fila, columna) = self.recortar_tesela(tesela, parte, escala)
+            imagen_final[fila:fila + nucleo.shape[0], columna:columna + nucleo.shape[1]] = nucleo
+
+        return imagen_final
+
+    def unir_teselas(self, teselas, partes_procesadas, alto, ancho, escala=None):
+        """Une teselas procesadas en una imagen final"""
+        try:
+            imagen_final = self.ensamblar_teselas(teselas, partes_procesadas, alto, ancho, escala)
             _, buf = cv2.imencode(".png", imagen_final)
             return buf.tobytes()
         except Exception as e:
-            logger.error(f"Error uniendo partes de imagen: {e}")
+            logger.error(f"Error uniendo teselas de imagen: {e}")
             raise
 
-    def enviar_parte_a_nodo(self, parte, nodo_direccion):
+    def enviar_parte_a_nodo(self, parte, nodo_direccion, pipeline, timeout=10.0):
         """Envia parte a un nodo especifico para procesamiento"""
         try:
-            _, buf = cv2.imencode(".png", parte)
-            parte_bytes = buf.tobytes()
-
-            with grpc.insecure_channel(nodo_direccion, options=[
-                    ('grpc.max_receive_message_length', 20 * 1024 * 1024),  # 20MB
-                    ('grpc.max_send_message_length', 20 * 1024 * 1024)
-            ]) as channel:
-                stub = procesador_pb2_grpc.ProcesadorImagenStub(channel)
-                response = stub.ProcesarImagen(
-                    procesador_pb2.ImagenRequest(data=parte_bytes),
-                    timeout=10.0
-                )
-                
-                if response.status == "ok":
-                    part_np = np.frombuffer(response.imagen_data, np.uint8)
-                    return cv2.imdecode(part_np, cv2.IMREAD_GRAYSCALE)
-                else:
-                    logger.warning(f"Error en respuesta de {nodo_direccion}: {response.mensaje}")
-                    
+            codificacion = self.codificacion_para(nodo_direccion)
+            tensor = codificar_tensor(parte, codificacion)
+
+            stub = self.pool_canales.get_stub(nodo_direccion, procesador_pb2_grpc.ProcesadorImagenStub)
+            response = stub.ProcesarImagen(
+                procesador_pb2.ImagenRequest(tensor=tensor, pipeline=pipeline_a_proto(pipeline)),
+                timeout=timeout,
+                compression=compresion_grpc(codificacion)
+            )
+
+            if response.status == "ok":
+                return decodificar_tensor(response.tensor)
+            else:
+                logger.warning(f"Error en respuesta de {nodo_direccion}: {response.mensaje}")
+
+        except grpc.RpcError as e:
+            # canal roto, se descarta para no esperar el backoff de reconexion
+            if e.code() == grpc.StatusCode.UNAVAILABLE:
+                self.pool_canales.reconectar(nodo_direccion)
+            logger.error(f"Error enviando parte a {nodo_direccion}: {e.code()}")
         except Exception as e:
             logger.error(f"Error enviando parte a {nodo_direccion}: {e}")
         
-        return None
\ No newline at end of file
+        return None
+
+    def enviar_lote_a_nodo(self, partes, nodo_direccion, pipeline, timeout=10.0):
+        """Envia varias partes a un nodo en una sola llamada, retorna None si falla"""
+        try:
+            codificacion = self.codificacion_para(nodo_direccion)
+            tensores = [codificar_tensor(parte, codificacion) for parte in partes]
+
+            stub = self.pool_canales.get_stub(nodo_direccion, procesador_pb2_grpc.ProcesadorImagenStub)
+            response = stub.ProcesarLote(
+                procesador_pb2.LoteRequest(teselas=tensores, pipeline=pipeline_a_proto(pipeline)),
+                timeout=timeout,
+                compression=compresion_grpc(codificacion)
+            )
+
+            if response.status == "ok" and len(response.teselas) == len(partes):
+                return [decodificar_tensor(t) for t in response.teselas]
+            else:
+                logger.warning(f"Error en respuesta de lote de {nodo_direccion}: {response.mensaje}")
+
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.UNAVAILABLE:
+                self.pool_canales.reconectar(nodo_direccion)
+            logger.error(f"Error enviando lote a {nodo_direccion}: {e.code()}")
+        except Exception as e:
+            logger.error(f"Error enviando lote a {nodo_direccion}: {e}")
+
+        return None
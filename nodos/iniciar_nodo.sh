@@ -0,0 +1,12 @@
+#!/bin/bash
+
+# el nodo arranca sin esperar a GlusterFS, el volumen se monta en segundo plano
+# y mientras no este montado el cliente envia las imagenes en la peticion
+mkdir -p /mnt/almacenamiento_dist
+(
+    until mount -t glusterfs gluster1:gvol /mnt/almacenamiento_dist; do
+        sleep 5
+    done
+) &
+
+exec python nodo.py
@@ -0,0 +1,123 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+from proto import procesador_pb2, procesador_pb2_grpc
+
+logger = logging.getLogger(__name__)
+
+# estados de un nodo en la tabla
+ESTADO_ACTIVO = "activo"
+ESTADO_SOSPECHOSO = "sospechoso"
+ESTADO_CAIDO = "caido"
+
+# valor de cada estado en la metrica estado_nodo
+VALOR_ESTADO = {ESTADO_ACTIVO: 2, ESTADO_SOSPECHOSO: 1, ESTADO_CAIDO: 0}
+
+INTERVALO_MEMBRESIA = float(os.environ.get("INTERVALO_MEMBRESIA", "2.0"))  # segundos entre sondeos
+TIMEOUT_SONDEO = float(os.environ.get("TIMEOUT_SONDEO", "1.0"))
+# fallos consecutivos para pasar de sospechoso a caido
+FALLOS_CAIDO = int(os.environ.get("FALLOS_CAIDO", "3"))
+
+class MiembroCluster:
+    """Estado conocido de un nodo remoto"""
+
+    def __init__(self, direccion):
+        self.direccion = direccion  # puerto de procesamiento
+        self.estado = ESTADO_CAIDO
+        self.ultimo_visto = None
+        self.fallos = 0
+
+    def __repr__(self):
+        return f"MiembroCluster({self.direccion}, {self.estado}, fallos={self.fallos})"
+
+class TablaMembresia:
+    """Tabla de nodos del cluster mantenida en segundo plano con sondeos en paralelo"""
+
+    def __init__(self, nodo_id, direcciones, pool_canales, recolector_metricas_nodo=None, intervalo=INTERVALO_MEMBRESIA):
+        self.nodo_id = nodo_id
+        self.pool_canales = pool_canales
+        self.recolector_metricas = recolector_metricas_nodo
+        self.intervalo = intervalo
+        self.miembros = {d: MiembroCluster(d) for d in direcciones}
+
+        # nodos activos, se reemplaza completa en cada cambio y se lee sin lock
+        self._disponibles = ()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.miembros)))
+        self.running = False
+
+    def iniciar(self):
+        """Hace un primer sondeo y sigue sondeando en segundo plano"""
+        self.running = True
+        self.sondear()
+        threading.Thread(target=self._ciclo_sondeo, daemon=True).start()
+
+    def detener(self):
+        """Detiene los sondeos"""
+        self.running = False
+        self._executor.shutdown(wait=False)
+
+    def disponibles(self):
+        """Nodos activos, sin hacer llamadas de red"""
+        return self._disponibles
+
+    def estado(self, direccion):
+        """Estado y ultimo contacto de un nodo"""
+        miembro = self.miembros.get(direccion)
+        return (miembro.estado, miembro.ultimo_visto) if miembro else (None, None)
+
+    def sondear(self):
+        """Sondea todos los nodos en paralelo y actualiza la tabla"""
+        resultados = list(self._executor.map(self._sondear_nodo, self.miembros))
+
+        ahora = time.time()
+        cambios = []
+        with self._lock:
+            for direccion, vivo in zip(self.miembros, resultados):
+                miembro = self.miembros[direccion]
+                anterior = miembro.estado
+                if vivo:
+                    miembro.estado = ESTADO_ACTIVO
+                    miembro.ultimo_visto = ahora
+                    miembro.fallos = 0
+                else:
+                    miembro.fallos += 1
+                    miembro.estado = ESTADO_CAIDO if miembro.fallos >= FALLOS_CAIDO else ESTADO_SOSPECHOSO
+                if miembro.estado != anterior:
+                    cambios.append((direccion, anterior, miembro.estado))
+
+            self._disponibles = tuple(d for d, m in self.miembros.items() if m.estado == ESTADO_ACTIVO)
+
+        for direccion, anterior, nuevo in cambios:
+            logger.info(f"Nodo {self.nodo_id}: {direccion} paso de {anterior} a {nuevo}")
+
+        if self.recolector_metricas:
+            for direccion, miembro in self.miembros.items():
+                self.recolector_metricas.actualizar_estado_nodo(direccion, VALOR_ESTADO[miembro.estado])
+
+    def _sondear_nodo(self, direccion):
+        """Consulta el estado de un nodo por su canal del pool"""
+        try:
+            stub = self.pool_canales.get_stub(direccion, procesador_pb2_grpc.ProcesadorImagenStub)
+            stub.EstadoNodo(procesador_pb2.EstadoRequest(), timeout=TIMEOUT_SONDEO)
+            return True
+        except grpc.RpcError as e:
+            # canal nuevo para no esperar el backoff de reconexion cuando el nodo vuelva
+            if e.code() == grpc.StatusCode.UNAVAILABLE:
+                self.pool_canales.reconectar(direccion)
+            return False
+        except Exception:
+            return False
+
+    def _ciclo_sondeo(self):
+        """Sondea periodicamente mientras el servicio este activo"""
+        while self.running:
+            time.sleep(self.intervalo)
+            try:
+                self.sondear()
+            except Exception as e:
+                logger.error(f"Nodo {self.nodo_id}: Error sondeando nodos: {e}")
@@ -0,0 +1,99 @@
+import os
+import logging
+import numpy as np
+import cv2
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+from operaciones import ejecutar_pipeline
+
+logger = logging.getLogger(__name__)
+
+# cantidad de procesos de trabajo (0 = procesar en los hilos de gRPC)
+NUM_PROCESOS = int(os.environ.get("NUM_PROCESOS", str(os.cpu_count() or 1)))
+# cpus permitidas para los procesos, ej. "0-3,6"
+AFINIDAD_CPU = os.environ.get("AFINIDAD_CPU", "")
+
+def parsear_cpus(texto):
+    """Convierte '0-3,6' en [0, 1, 2, 3, 6]"""
+    cpus = []
+    for rango in texto.split(","):
+        rango = rango.strip()
+        if not rango:
+            continue
+        if "-" in rango:
+            inicio, fin = rango.split("-", 1)
+            cpus.extend(range(int(inicio), int(fin) + 1))
+        else:
+            cpus.append(int(rango))
+    return cpus
+
+def _inicializar_proceso(cpus):
+    """Configura cada proceso de trabajo"""
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    # un hilo de OpenCV por proceso, el paralelismo lo dan los procesos
+    cv2.setNumThreads(1)
+
+def _procesar_en_proceso(nombre_entrada, forma, dtype, pipeline):
+    """Ejecuta el pipeline sobre una tesela en memoria compartida y deja el resultado en otra"""
+    entrada = shared_memory.SharedMemory(name=nombre_entrada)
+    try:
+        img = np.ndarray(forma, dtype=np.dtype(dtype), buffer=entrada.buf)
+        resultado = np.ascontiguousarray(ejecutar_pipeline(img, pipeline))
+        del img
+    finally:
+        entrada.close()
+
+    salida = shared_memory.SharedMemory(create=True, size=max(1, resultado.nbytes))
+    np.ndarray(resultado.shape, dtype=resultado.dtype, buffer=salida.buf)[...] = resultado
+    nombre_salida = salida.name
+    salida.close()
+    return nombre_salida, resultado.shape, resultado.dtype.str
+
+class MotorProcesos:
+    """Ejecuta el procesamiento de teselas en un pool de procesos, uno por nucleo"""
+
+    def __init__(self, nodo_id, num_procesos=NUM_PROCESOS, cpus=None, recolector_metricas_nodo=None):
+        self.nodo_id = nodo_id
+        self.num_procesos = num_procesos
+        self.recolector_metricas = recolector_metricas_nodo
+        self.cpus = cpus if cpus is not None else parsear_cpus(AFINIDAD_CPU)
+
+        # spawn: no se hereda el estado de gRPC del proceso padre
+        self.executor = ProcessPoolExecutor(
+            max_workers=num_procesos,
+            mp_context=get_context("spawn"),
+            initializer=_inicializar_proceso,
+            initargs=(self.cpus,)
+        )
+        if self.recolector_metricas:
+            self.recolector_metricas.actualizar_procesos_trabajo(num_procesos)
+        logger.info(f"Nodo {self.nodo_id}: Motor de procesos iniciado con {num_procesos} procesos (cpus={self.cpus or 'todas'})")
+
+    def ejecutar(self, img, pipeline):
+        """Procesa una tesela en un proceso de trabajo sin serializar los pixeles"""
+        if self.recolector_metricas:
+            self.recolector_metricas.track_tesela_en_proceso(1)
+
+        entrada = shared_memory.SharedMemory(create=True, size=max(1, img.nbytes))
+        try:
+            np.ndarray(img.shape, dtype=img.dtype, buffer=entrada.buf)[...] = img
+            future = self.executor.submit(_procesar_en_proceso, entrada.name, img.shape, img.dtype.str, pipeline)
+            nombre_salida, forma, dtype = future.result()
+        finally:
+            entrada.close()
+            entrada.unlink()
+            if self.recolector_metricas:
+                self.recolector_metricas.track_tesela_en_proceso(-1)
+
+        salida = shared_memory.SharedMemory(name=nombre_salida)
+        try:
+            return np.ndarray(forma, dtype=np.dtype(dtype), buffer=salida.buf).copy()
+        finally:
+            salida.close()
+            salida.unlink()
+
+    def cerrar(self):
+        """Detiene los procesos de trabajo"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
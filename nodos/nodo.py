@@ -11,11 +11,37 @@ from proto import bully_pb2_grpc
 from bully_service import BullyService
 from coordinador_service import CoordinadorService
 from imagen_helper import ImagenHelper
+from motor_procesos import MotorProcesos, NUM_PROCESOS
+from pool_canales import PoolCanales, OPCIONES_SERVIDOR_KEEPALIVE
+from tensor_codec import compresion_grpc
+from operaciones import pipeline_desde_proto, describir_pipeline
+from transferencia_chunks import ensamblar_chunks, generar_chunks, partir_parte_final, ErrorTransferencia
 from monitoreo.metricas_nodo import MetricasServer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# GlusterFS montado en el nodo, para leer imagenes ya guardadas sin que el cliente las reenvie
+MONTAJE_COMPARTIDO = os.environ.get("MONTAJE_COMPARTIDO", "/mnt/almacenamiento_dist")
+
+class OrigenNoDisponible(Exception):
+    """La imagen indicada por ruta_origen no se puede leer en este nodo"""
+
+def cargar_entrada(request):
+    """Bytes de la imagen de la peticion, leidos del almacenamiento compartido si se indica ruta_origen"""
+    if not request.ruta_origen:
+        return request.data
+
+    raiz = os.path.realpath(MONTAJE_COMPARTIDO)
+    ruta = os.path.realpath(os.path.join(raiz, request.ruta_origen))
+    if not ruta.startswith(raiz + os.sep):
+        raise OrigenNoDisponible(f"Ruta de origen fuera del almacenamiento compartido: {request.ruta_origen}")
+    try:
+        with open(ruta, "rb") as f:
+            return f.read()
+    except OSError as e:
+        raise OrigenNoDisponible(f"No se pudo leer {request.ruta_origen}: {e}")
+
 class ProcesadorImagen(procesador_pb2_grpc.ProcesadorImagenServicer):
     def __init__(self, nodo_id, bully_service, coordinador_service, imagen_helper, recolector_metricas_nodo):
         self.nodo_id = nodo_id
@@ -29,26 +55,42 @@ class ProcesadorImagen(procesador_pb2_grpc.ProcesadorImagenServicer):
         """Retorna el estado del nodo"""
         es_coordinador = self.bully_service.es_coordinador
         self.recolector_metricas_nodo.actualizar_es_coordinador(es_coordinador)
-        return procesador_pb2.EstadoReply(es_coordinador=es_coordinador, nodo_id=self.nodo_id)
+        token = self.bully_service.token if es_coordinador else 0
+        return procesador_pb2.EstadoReply(es_coordinador=es_coordinador, nodo_id=self.nodo_id, token=token)
 
     def ProcesarImagen(self, request, context):
         """Punto de entrada principal"""
         inicio = time.time()
+        tipo_procesamiento = "invalido"
+        try:
+            data = cargar_entrada(request)
+        except OrigenNoDisponible as e:
+            logger.warning(f"Nodo {self.nodo_id}: {e}")
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, str(e))
+
         try:
-            tamano_imagen = self._clasificar_tamano_imagen(len(request.data))
+            pipeline = pipeline_desde_proto(request.pipeline)
+            tipo_procesamiento = describir_pipeline(pipeline)
+
+            # parte enviada por el coordinador como pixeles sin codificar
+            if request.HasField("tensor"):
+                tamano_imagen = self._clasificar_tamano_imagen(len(request.tensor.datos))
+                context.set_compression(compresion_grpc(request.tensor.codificacion))
+                resultado = self.imagen_helper.procesar_tensor(request.tensor, pipeline)
 
             # Si es coordinador, dividir y distribuir
-            if self.bully_service.es_coordinador:
-                resultado = self.coordinador_service.procesar_imagen_distribuida(request.data)
+            elif self.bully_service.es_coordinador:
+                tamano_imagen = self._clasificar_tamano_imagen(len(data))
+                resultado = self.coordinador_service.procesar_imagen_distribuida(data, pipeline)
             else:
-                # se convierte a escala de grises
-                resultado = self.imagen_helper.procesar_parte_individual(request.data)
+                tamano_imagen = self._clasificar_tamano_imagen(len(data))
+                resultado = self.imagen_helper.procesar_parte_individual(data, pipeline)
             
             duracion = time.time() - inicio
             estado = "exito" if resultado.status == "ok" else "error"
 
             self.recolector_metricas_nodo.track_procesamiento_imagen(
-                duracion, estado, tamano_imagen, "escala grises"
+                duracion, estado, tamano_imagen, tipo_procesamiento
             )
             
             return resultado
@@ -56,12 +98,143 @@ class ProcesadorImagen(procesador_pb2_grpc.ProcesadorImagenServicer):
         except Exception as e:
             duracion = time.time() - inicio
             self.recolector_metricas_nodo.track_procesamiento_imagen(
-                duracion, "error", "desconocido", "escala grises"
+                duracion, "error", "desconocido", tipo_procesamiento
             )
 
             logger.error(f"Error en nodo {self.nodo_id}: {e}")
             return procesador_pb2.ImagenReply(status="error", imagen_data=b"", mensaje=str(e))
 
+    def ProcesarLote(self, request, context):
+        """Procesa un lote de teselas enviado por el coordinador"""
+        inicio = time.time()
+        tipo_procesamiento = "invalido"
+        tamano_imagen = self._clasificar_tamano_imagen(sum(len(t.datos) for t in request.teselas))
+        try:
+            pipeline = pipeline_desde_proto(request.pipeline)
+            tipo_procesamiento = describir_pipeline(pipeline)
+            if request.teselas:
+                context.set_compression(compresion_grpc(request.teselas[0].codificacion))
+            resultado = self.imagen_helper.procesar_lote(request.teselas, pipeline)
+        except Exception as e:
+            logger.error(f"Error en nodo {self.nodo_id}: {e}")
+            resultado = procesador_pb2.LoteReply(status="error", mensaje=str(e))
+
+        estado = "exito" if resultado.status == "ok" else "error"
+        self.recolector_metricas_nodo.track_procesamiento_imagen(
+            time.time() - inicio, estado, tamano_imagen, tipo_procesamiento
+        )
+        return resultado
+
+    def ProcesarImagenStream(self, request_iterator, context):
+        """Punto de entrada por chunks para imagenes sin limite de mensaje"""
+        inicio = time.time()
+        tamano_imagen = "desconocido"
+        tipo_procesamiento = "invalido"
+        try:
+            data, pipeline_proto = ensamblar_chunks(request_iterator)
+            tamano_imagen = self._clasificar_tamano_imagen(len(data))
+            pipeline = pipeline_desde_proto(pipeline_proto)
+            tipo_procesamiento = describir_pipeline(pipeline)
+
+            if self.bully_service.es_coordinador:
+                resultado = self.coordinador_service.procesar_imagen_distribuida(data, pipeline)
+            else:
+                resultado = self.imagen_helper.procesar_parte_individual(data, pipeline)
+
+        except ErrorTransferencia as e:
+            logger.warning(f"Nodo {self.nodo_id}: Transferencia invalida: {e}")
+            resultado = procesador_pb2.ImagenReply(status="error", imagen_data=b"", mensaje=str(e))
+        except Exception as e:
+            logger.error(f"Error en nodo {self.nodo_id}: {e}")
+            resultado = procesador_pb2.ImagenReply(status="error", imagen_data=b"", mensaje=str(e))
+
+        duracion = time.time() - inicio
+        estado = "exito" if resultado.status == "ok" else "error"
+        self.recolector_metricas_nodo.track_procesamiento_imagen(
+            duracion, estado, tamano_imagen, tipo_procesamiento
+        )
+
+        yield from generar_chunks(resultado.imagen_data, resultado.status, resultado.mensaje)
+
+    def ProcesarImagenProgresivo(self, request, context):
+        """Punto de entrada que entrega cada franja apenas se procesa"""
+        inicio = time.time()
+        try:
+            data = cargar_entrada(request)
+        except OrigenNoDisponible as e:
+            # el cliente puede reintentar enviando la imagen
+            logger.warning(f"Nodo {self.nodo_id}: {e}")
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, str(e))
+
+        tamano_imagen = self._clasificar_tamano_imagen(len(data))
+        tipo_procesamiento = "invalido"
+        estado = "error"
+        try:
+            pipeline = pipeline_desde_proto(request.pipeline)
+            tipo_procesamiento = describir_pipeline(pipeline)
+
+            if self.bully_service.es_coordinador:
+                for parte in self.coordinador_service.procesar_imagen_progresiva(data, pipeline):
+                    if parte.final:
+                        estado = "exito" if parte.status == "ok" else "error"
+                        yield from partir_parte_final(parte)
+                    else:
+                        yield parte
+            else:
+                # un nodo que no es coordinador procesa la imagen completa en una sola parte
+                resultado = self.imagen_helper.procesar_parte_individual(data, pipeline)
+                estado = "exito" if resultado.status == "ok" else "error"
+                yield from partir_parte_final(procesador_pb2.ParteProcesada(
+                    total_partes=1,
+                    imagen_data=resultado.imagen_data,
+                    final=True,
+                    status=resultado.status,
+                    mensaje=resultado.mensaje
+                ))
+        except ValueError as e:
+            yield procesador_pb2.ParteProcesada(final=True, status="error", mensaje=str(e))
+        finally:
+            duracion = time.time() - inicio
+            self.recolector_metricas_nodo.track_procesamiento_imagen(
+                duracion, estado, tamano_imagen, tipo_procesamiento
+            )
+
+    def ProcesarImagenes(self, request, context):
+        """Punto de entrada por lotes, entrega cada imagen apenas se procesa"""
+        inicio = time.time()
+        tipo_procesamiento = "invalido"
+        try:
+            pipeline = pipeline_desde_proto(request.pipeline)
+            tipo_procesamiento = describir_pipeline(pipeline)
+
+            if self.bully_service.es_coordinador:
+                resultados = self.coordinador_service.procesar_imagenes(request.imagenes, pipeline)
+            else:
+                resultados = self._procesar_imagenes_individuales(request.imagenes, pipeline)
+
+            for resultado in resultados:
+                estado = "exito" if resultado.status == "ok" else "error"
+                self.recolector_metricas_nodo.track_procesamiento_imagen(
+                    time.time() - inicio, estado,
+                    self._clasificar_tamano_imagen(len(request.imagenes[resultado.indice])), tipo_procesamiento
+                )
+                yield resultado
+
+        except ValueError as e:
+            for indice in range(len(request.imagenes)):
+                yield procesador_pb2.ImagenProcesada(indice=indice, status="error", mensaje=str(e))
+
+    def _procesar_imagenes_individuales(self, imagenes, pipeline):
+        """Un nodo que no es coordinador procesa las imagenes del lote una a una"""
+        for indice, imagen_data in enumerate(imagenes):
+            resultado = self.imagen_helper.procesar_parte_individual(imagen_data, pipeline)
+            yield procesador_pb2.ImagenProcesada(
+                indice=indice,
+                status=resultado.status,
+                imagen_data=resultado.imagen_data,
+                mensaje=resultado.mensaje
+            )
+
     def _clasificar_tamano_imagen(self, tamano_bytes):
         """Clasifica el tamaño de la imagen"""
         tamano_mb = tamano_bytes / (1024 * 1024)
@@ -87,23 +260,28 @@ def serve():
     recolector_metricas_nodo = metricas_nodo_server.get_recolector()
 
     # servicios
-    bully_service = BullyService(nodo_id, nodos_conocidos, recolector_metricas_nodo)
-    imagen_helper = ImagenHelper(nodo_id)
+    pool_canales = PoolCanales(nodo_id, recolector_metricas_nodo=recolector_metricas_nodo)
+    bully_service = BullyService(nodo_id, nodos_conocidos, recolector_metricas_nodo, pool_canales)
+    motor_procesos = MotorProcesos(nodo_id, recolector_metricas_nodo=recolector_metricas_nodo) if NUM_PROCESOS > 0 else None
+    imagen_helper = ImagenHelper(nodo_id, pool_canales, motor_procesos)
     coordinador_service = CoordinadorService(nodo_id, bully_service, imagen_helper, recolector_metricas_nodo)
 
     # servicio principal
     procesador = ProcesadorImagen(nodo_id, bully_service, coordinador_service, imagen_helper, recolector_metricas_nodo)
 
     # servidor de procesamiento de imagenes
-    server_procesamiento = grpc.server(futures.ThreadPoolExecutor(max_workers=4), options=[
+    # los hilos solo reciben y esperan, el computo va al motor: se necesitan mas hilos que procesos
+    server_procesamiento = grpc.server(futures.ThreadPoolExecutor(max_workers=max(4, 2 * NUM_PROCESOS)), options=[
                                         ('grpc.max_receive_message_length', 20 * 1024 * 1024),  # 20MB
-                                        ('grpc.max_send_message_length', 20 * 1024 * 1024)]
-                                    )
+                                        ('grpc.max_send_message_length', 20 * 1024 * 1024)
+                                    ] + OPCIONES_SERVIDOR_KEEPALIVE)
     procesador_pb2_grpc.add_ProcesadorImagenServicer_to_server(procesador, server_procesamiento)
     server_procesamiento.add_insecure_port("[::]:" + "50052")
 
     # servidor para Bully
-    server_bully = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    # los demas nodos mantienen canales abiertos con keepalive y envian mensajes en paralelo
+    server_bully = grpc.server(futures.ThreadPoolExecutor(max_workers=max(4, len(nodos_conocidos) + 2)),
+                               options=OPCIONES_SERVIDOR_KEEPALIVE)
     bully_pb2_grpc.add_BullyServiceServicer_to_server(bully_service, server_bully)
     server_bully.add_insecure_port("[::]:" + "50053")
 
@@ -122,6 +300,9 @@ def serve():
         logger.info(f"Deteniendo nodo {nodo_id}...")
         bully_service.detener_servicios()
         metricas_nodo_server.stop()
+        pool_canales.cerrar()
+        if motor_procesos:
+            motor_procesos.cerrar()
         server_procesamiento.stop(0)
         server_bully.stop(0)
 
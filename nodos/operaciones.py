@@ -0,0 +1,175 @@
+import math
+import logging
+from fractions import Fraction
+import cv2
+
+from proto import procesador_pb2
+
+logger = logging.getLogger(__name__)
+
+# registro de operaciones disponibles: nombre -> Operacion
+OPERACIONES = {}
+
+# pipeline usado cuando la peticion no indica ninguno
+PIPELINE_POR_DEFECTO = [("escala_grises", {})]
+
+# denominador maximo de una escala para alinear las teselas a pixeles enteros de salida
+DENOMINADOR_MAX_ESCALA = 64
+
+class Operacion:
+    """Operacion de procesamiento registrada, con su costo y el halo que necesita"""
+
+    def __init__(self, nombre, funcion, halo=0, costo=1.0, escala=None):
+        self.nombre = nombre
+        self.funcion = funcion
+        self._halo = halo  # pixeles o funcion(parametros) -> pixeles
+        self.costo = costo  # costo relativo por megapixel (escala_grises = 1)
+        self._escala = escala  # funcion(parametros) -> factor de tamaño de salida
+
+    def halo(self, parametros):
+        """Pixeles de vecindad que necesita en cada borde"""
+        return self._halo(parametros) if callable(self._halo) else self._halo
+
+    def escala(self, parametros):
+        """Factor entre el tamaño de salida y el de entrada"""
+        return self._escala(parametros) if self._escala else 1.0
+
+def registrar_operacion(nombre, halo=0, costo=1.0, escala=None):
+    """Decorador que registra una operacion en OPERACIONES"""
+    def decorator(func):
+        OPERACIONES[nombre] = Operacion(nombre, func, halo, costo, escala)
+        return func
+    return decorator
+
+def _kernel(parametros, defecto):
+    """Tamaño de kernel impar"""
+    return int(parametros.get("kernel", defecto)) | 1
+
+@registrar_operacion("escala_grises", costo=1.0)
+def escala_grises(img):
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+@registrar_operacion("desenfoque_gaussiano", halo=lambda p: _kernel(p, 5) // 2, costo=4.0)
+def desenfoque_gaussiano(img, kernel=5, sigma=0):
+    kernel = int(kernel) | 1
+    return cv2.GaussianBlur(img, (kernel, kernel), sigma)
+
+@registrar_operacion("mediana", halo=lambda p: _kernel(p, 5) // 2, costo=6.0)
+def mediana(img, kernel=5):
+    return cv2.medianBlur(img, int(kernel) | 1)
+
+@registrar_operacion("sobel", halo=lambda p: _kernel(p, 3) // 2, costo=3.0)
+def sobel(img, kernel=3):
+    kernel = int(kernel) | 1
+    grad_x = cv2.convertScaleAbs(cv2.Sobel(img, cv2.CV_16S, 1, 0, ksize=kernel))
+    grad_y = cv2.convertScaleAbs(cv2.Sobel(img, cv2.CV_16S, 0, 1, ksize=kernel))
+    return cv2.addWeighted(grad_x, 0.5, grad_y, 0.5, 0)
+
+@registrar_operacion("erosion", halo=lambda p: (_kernel(p, 3) // 2) * int(p.get("iteraciones", 1)), costo=2.0)
+def erosion(img, kernel=3, iteraciones=1):
+    kernel = int(kernel) | 1
+    return cv2.erode(img, cv2.getStructuringElement(cv2.MORPH_RECT, (kernel, kernel)), iterations=int(iteraciones))
+
+@registrar_operacion("dilatacion", halo=lambda p: (_kernel(p, 3) // 2) * int(p.get("iteraciones", 1)), costo=2.0)
+def dilatacion(img, kernel=3, iteraciones=1):
+    kernel = int(kernel) | 1
+    return cv2.dilate(img, cv2.getStructuringElement(cv2.MORPH_RECT, (kernel, kernel)), iterations=int(iteraciones))
+
+@registrar_operacion(
+    "redimensionar",
+    halo=lambda p: math.ceil(1 / min(1.0, float(p.get("factor", 0.5)))) + 1,
+    costo=1.5,
+    escala=lambda p: float(p.get("factor", 0.5))
+)
+def redimensionar(img, factor=0.5):
+    factor = float(factor)
+    alto, ancho = img.shape[:2]
+    alto_salida, ancho_salida = max(1, escalar(alto, factor)), max(1, escalar(ancho, factor))
+    interpolacion = cv2.INTER_AREA if factor < 1 else cv2.INTER_LINEAR
+    if alto * factor < 1 or ancho * factor < 1:
+        return cv2.resize(img, (ancho_salida, alto_salida), interpolation=interpolacion)
+
+    # con fx/fy OpenCV mapea con el factor exacto y no con salida/entrada, asi una tesela y la
+    # imagen completa dan los mismos pixeles. Si el ultimo pixel de salida cae fuera de la imagen
+    # se replica el borde, igual en la imagen completa y en la tesela del borde
+    if alto_salida > alto * factor or ancho_salida > ancho * factor:
+        img = cv2.copyMakeBorder(img, 0, 1, 0, 1, cv2.BORDER_REPLICATE)
+    resultado = cv2.resize(img, None, fx=factor, fy=factor, interpolation=interpolacion)
+    return resultado[:alto_salida, :ancho_salida]
+
+def pipeline_desde_proto(operaciones_proto):
+    """Convierte los mensajes Operacion en una lista [(nombre, parametros)] validada"""
+    pipeline = [(op.nombre, dict(op.parametros)) for op in operaciones_proto]
+    if not pipeline:
+        return list(PIPELINE_POR_DEFECTO)
+
+    for nombre, parametros in pipeline:
+        if nombre not in OPERACIONES:
+            raise ValueError(f"Operacion desconocida: {nombre}")
+        if nombre == "redimensionar" and float(parametros.get("factor", 0.5)) <= 0:
+            raise ValueError("El factor de redimensionar debe ser positivo")
+    return pipeline
+
+def pipeline_a_proto(pipeline):
+    """Convierte una lista [(nombre, parametros)] en mensajes Operacion"""
+    return [procesador_pb2.Operacion(nombre=nombre, parametros=parametros) for nombre, parametros in pipeline]
+
+def ejecutar_pipeline(img, pipeline):
+    """Aplica todas las operaciones sobre la tesela en una sola pasada, sin codificar intermedios"""
+    for nombre, parametros in pipeline:
+        img = OPERACIONES[nombre].funcion(img, **parametros)
+    return img
+
+def halo_pipeline(pipeline):
+    """Halo total del pipeline, en pixeles de la imagen de entrada"""
+    halo = 0.0
+    escala = 1.0
+    for nombre, parametros in pipeline:
+        operacion = OPERACIONES[nombre]
+        halo += operacion.halo(parametros) / escala
+        escala *= operacion.escala(parametros)
+    return math.ceil(halo)
+
+def escalar(longitud, escala):
+    """Longitud o posicion escalada, redondeando .5 hacia arriba para que teselas e imagen completa coincidan"""
+    return math.floor(longitud * escala + 0.5)
+
+def escala_pipeline(pipeline):
+    """Factor entre el tamaño de la imagen final y el de entrada"""
+    escala = 1.0
+    for nombre, parametros in pipeline:
+        escala *= OPERACIONES[nombre].escala(parametros)
+    return escala
+
+def alineacion_pipeline(pipeline):
+    """
+    Multiplo de pixeles al que se alinean los bordes de tesela para que, tras cada
+    cambio de tamaño, caigan en pixeles enteros. None si alguna escala no es una
+    fraccion exacta de denominador pequeño (ej. 0.33): la imagen no se puede teselar
+    sin costuras
+    """
+    alineacion = 1
+    escala = 1.0
+    for nombre, parametros in pipeline:
+        escala *= OPERACIONES[nombre].escala(parametros)
+        fraccion = Fraction(escala).limit_denominator(DENOMINADOR_MAX_ESCALA)
+        if not math.isclose(float(fraccion), escala, rel_tol=1e-9):
+            return None
+        alineacion = math.lcm(alineacion, fraccion.denominator)
+    return alineacion
+
+def costo_pipeline(pipeline):
+    """Costo relativo por megapixel de entrada, considerando los cambios de tamaño"""
+    costo = 0.0
+    area = 1.0
+    for nombre, parametros in pipeline:
+        operacion = OPERACIONES[nombre]
+        costo += operacion.costo * area
+        area *= operacion.escala(parametros) ** 2
+    return costo
+
+def describir_pipeline(pipeline):
+    """Nombre corto del pipeline para etiquetas de metricas"""
+    return "+".join(nombre for nombre, _ in pipeline)
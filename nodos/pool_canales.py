@@ -0,0 +1,85 @@
+import threading
+import logging
+import grpc
+
+logger = logging.getLogger(__name__)
+
+# opciones de los canales persistentes entre nodos
+OPCIONES_CANAL = [
+    ('grpc.max_receive_message_length', 20 * 1024 * 1024),  # 20MB
+    ('grpc.max_send_message_length', 20 * 1024 * 1024),
+    ('grpc.keepalive_time_ms', 10000),  # ping cada 10s
+    ('grpc.keepalive_timeout_ms', 5000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+]
+
+# opciones del servidor para aceptar los pings de keepalive de los clientes
+OPCIONES_SERVIDOR_KEEPALIVE = [
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.min_recv_ping_interval_without_data_ms', 5000),
+    ('grpc.http2.max_ping_strikes', 0),
+]
+
+class PoolCanales:
+    """Pool de canales gRPC persistentes, uno por direccion"""
+
+    def __init__(self, nodo_id, opciones=None, recolector_metricas_nodo=None):
+        self.nodo_id = nodo_id
+        self.opciones = opciones or OPCIONES_CANAL
+        self.recolector_metricas = recolector_metricas_nodo
+
+        self.canales = {}  # direccion -> canal
+        self.stubs = {}  # (direccion, clase_stub) -> stub
+        self.lock = threading.Lock()
+
+    def get_stub(self, direccion, clase_stub):
+        """Obtiene un stub sobre el canal persistente de la direccion"""
+        resultado = "hit"
+        with self.lock:
+            stub = self.stubs.get((direccion, clase_stub))
+            if stub is None:
+                canal = self.canales.get(direccion)
+                if canal is None:
+                    canal = grpc.insecure_channel(direccion, options=self.opciones)
+                    self.canales[direccion] = canal
+                    resultado = "miss"
+                    logger.info(f"Nodo {self.nodo_id}: Canal creado hacia {direccion}")
+                stub = clase_stub(canal)
+                self.stubs[(direccion, clase_stub)] = stub
+
+        if self.recolector_metricas:
+            self.recolector_metricas.track_pool_canales(resultado)
+        return stub
+
+    def reconectar(self, direccion):
+        """Descarta el canal de una direccion para que se vuelva a crear"""
+        with self.lock:
+            canal = self.canales.pop(direccion, None)
+            for clave in [c for c in self.stubs if c[0] == direccion]:
+                del self.stubs[clave]
+
+        if canal is None:
+            return
+
+        try:
+            canal.close()
+        except Exception as e:
+            logger.debug(f"Error cerrando canal hacia {direccion}: {e}")
+
+        logger.warning(f"Nodo {self.nodo_id}: Canal hacia {direccion} descartado para reconexion")
+        if self.recolector_metricas:
+            self.recolector_metricas.track_pool_canales("reconexion")
+
+    def cerrar(self):
+        """Cierra todos los canales del pool"""
+        with self.lock:
+            canales = list(self.canales.values())
+            self.canales.clear()
+            self.stubs.clear()
+
+        for canal in canales:
+            try:
+                canal.close()
+            except Exception:
+                pass
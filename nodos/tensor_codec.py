@@ -0,0 +1,69 @@
+import os
+import zlib
+import logging
+import numpy as np
+import grpc
+
+from proto import procesador_pb2
+
+logger = logging.getLogger(__name__)
+
+# codificaciones del trafico interno coordinador <-> nodos
+CODIFICACION_RAW = "raw"  # bytes de pixeles tal cual
+CODIFICACION_ZLIB = "zlib"  # sin perdida, compresion rapida (nivel 1)
+CODIFICACION_GZIP = "gzip"  # bytes tal cual, comprimidos por el canal gRPC
+
+CODIFICACIONES = [CODIFICACION_RAW, CODIFICACION_ZLIB, CODIFICACION_GZIP]
+
+def codificar_tensor(arreglo, codificacion=CODIFICACION_RAW):
+    """Convierte un arreglo numpy en un mensaje Tensor"""
+    arreglo = np.ascontiguousarray(arreglo)
+    datos = arreglo.tobytes()
+
+    if codificacion == CODIFICACION_ZLIB:
+        datos = zlib.compress(datos, 1)
+
+    return procesador_pb2.Tensor(
+        forma=list(arreglo.shape),
+        dtype=arreglo.dtype.str,
+        datos=datos,
+        codificacion=codificacion
+    )
+
+def decodificar_tensor(tensor):
+    """Convierte un mensaje Tensor en un arreglo numpy"""
+    datos = tensor.datos
+    if tensor.codificacion == CODIFICACION_ZLIB:
+        datos = zlib.decompress(datos)
+
+    return np.frombuffer(datos, dtype=np.dtype(tensor.dtype)).reshape(tuple(tensor.forma))
+
+def compresion_grpc(codificacion):
+    """Compresion de canal que corresponde a la codificacion"""
+    if codificacion == CODIFICACION_GZIP:
+        return grpc.Compression.Gzip
+    return grpc.Compression.NoCompression
+
+def cargar_codificaciones():
+    """
+    Lee la codificacion por defecto y la de cada enlace desde el entorno
+
+    CODIFICACION_INTERNA=raw
+    CODIFICACION_ENLACES=nodo2:50052=zlib,nodo3:50052=gzip
+    """
+    por_defecto = os.environ.get("CODIFICACION_INTERNA", CODIFICACION_RAW).strip()
+    if por_defecto not in CODIFICACIONES:
+        logger.warning(f"Codificacion {por_defecto} no soportada, se usa {CODIFICACION_RAW}")
+        por_defecto = CODIFICACION_RAW
+
+    enlaces = {}
+    for enlace in os.environ.get("CODIFICACION_ENLACES", "").split(","):
+        if "=" not in enlace:
+            continue
+        direccion, codificacion = [x.strip() for x in enlace.split("=", 1)]
+        if codificacion in CODIFICACIONES:
+            enlaces[direccion.replace(":50053", ":50052")] = codificacion
+        else:
+            logger.warning(f"Codificacion {codificacion} no soportada para {direccion}")
+
+    return por_defecto, enlaces
@@ -0,0 +1,94 @@
+import os
+import hashlib
+import logging
+
+from proto import procesador_pb2
+
+logger = logging.getLogger(__name__)
+
+TAMANO_CHUNK = 1024 * 1024  # 1MB por mensaje
+TAMANO_MAX_IMAGEN = int(os.environ.get("TAMANO_MAX_MB", "200")) * 1024 * 1024
+
+class ErrorTransferencia(Exception):
+    """Error en la transferencia por chunks"""
+    pass
+
+def ensamblar_chunks(chunks, tamano_max=TAMANO_MAX_IMAGEN):
+    """
+    Reconstruye un archivo a partir de un flujo de chunks verificando el checksum
+
+    Returns:
+        buffer: bytearray con el archivo completo
+        pipeline: operaciones indicadas en el primer chunk
+    """
+    buffer = None
+    pipeline = []
+    recibidos = 0
+    sha = hashlib.sha256()
+
+    for chunk in chunks:
+        if buffer is None:
+            if chunk.tamano_total <= 0 or chunk.tamano_total > tamano_max:
+                raise ErrorTransferencia(f"Tamaño de imagen no permitido: {chunk.tamano_total} bytes")
+            # se reserva una sola vez el tamaño total
+            buffer = bytearray(chunk.tamano_total)
+            pipeline = list(chunk.pipeline)
+
+        if chunk.offset != recibidos:
+            raise ErrorTransferencia(f"Chunk fuera de orden: offset {chunk.offset}, esperado {recibidos}")
+        if recibidos + len(chunk.data) > len(buffer):
+            raise ErrorTransferencia("Se recibieron mas datos que el tamaño anunciado")
+
+        buffer[recibidos:recibidos + len(chunk.data)] = chunk.data
+        recibidos += len(chunk.data)
+        sha.update(chunk.data)
+
+        if chunk.fin:
+            if recibidos != len(buffer):
+                raise ErrorTransferencia(f"Transferencia incompleta: {recibidos}/{len(buffer)} bytes")
+            if chunk.sha256 and chunk.sha256 != sha.hexdigest():
+                raise ErrorTransferencia("Checksum SHA-256 no coincide")
+            return buffer, pipeline
+
+    raise ErrorTransferencia("El flujo termino sin marca de fin")
+
+def partir_parte_final(parte, tamano_chunk=TAMANO_CHUNK):
+    """
+    Divide la imagen de la parte final en varios mensajes con final=True; todos
+    menos el ultimo llevan continua=True, el ultimo lleva el estado y los metadatos
+    """
+    vista = memoryview(parte.imagen_data)
+    offset = 0
+    while len(vista) - offset > tamano_chunk:
+        yield procesador_pb2.ParteProcesada(
+            imagen_data=bytes(vista[offset:offset + tamano_chunk]), final=True, continua=True
+        )
+        offset += tamano_chunk
+
+    ultimo = procesador_pb2.ParteProcesada()
+    ultimo.CopyFrom(parte)
+    ultimo.imagen_data = bytes(vista[offset:])
+    yield ultimo
+
+def generar_chunks(data, status="", mensaje="", tamano_chunk=TAMANO_CHUNK):
+    """Divide un archivo en chunks de tamaño fijo"""
+    vista = memoryview(data)
+    total = len(vista)
+    sha = hashlib.sha256()
+
+    offset = 0
+    while True:
+        parte = vista[offset:offset + tamano_chunk]
+        sha.update(parte)
+        fin = offset + len(parte) >= total
+
+        chunk = procesador_pb2.ImagenChunk(data=bytes(parte), offset=offset, tamano_total=total, fin=fin)
+        if fin:
+            chunk.sha256 = sha.hexdigest()
+            chunk.status = status
+            chunk.mensaje = mensaje
+        yield chunk
+
+        if fin:
+            break
+        offset += len(parte)
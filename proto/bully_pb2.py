@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11proto/bully.proto\"\"\n\x0f\x45leccionRequest\x12\x0f\n\x07nodo_id\x18\x01 \x01(\x05\"\x1f\n\rEleccionReply\x12\x0e\n\x06status\x18\x01 \x01(\t\",\n\x12\x43oordinadorRequest\x12\x16\n\x0e\x63oordinador_id\x18\x01 \x01(\x05\"\"\n\x10\x43oordinadorReply\x12\x0e\n\x06status\x18\x01 \x01(\t\"#\n\x10HeartbeatRequest\x12\x0f\n\x07nodo_id\x18\x01 \x01(\x05\"2\n\x0eHeartbeatReply\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x10\n\x08is_alive\x18\x02 \x01(\x08\"#\n\x10RespuestaRequest\x12\x0f\n\x07nodo_id\x18\x01 \x01(\x05\" \n\x0eRespuestaReply\x12\x0e\n\x06status\x18\x01 \x01(\t2\xd5\x01\n\x0c\x42ullyService\x12,\n\x08\x45leccion\x12\x10.EleccionRequest\x1a\x0e.EleccionReply\x12\x35\n\x0b\x43oordinador\x12\x13.CoordinadorRequest\x1a\x11.CoordinadorReply\x12/\n\tHeartbeat\x12\x11.HeartbeatRequest\x1a\x0f.HeartbeatReply\x12/\n\tRespuesta\x12\x11.RespuestaRequest\x1a\x0f.RespuestaReplyb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11proto/bully.proto\"\"\n\x0f\x45leccionRequest\x12\x0f\n\x07nodo_id\x18\x01 \x01(\x05\"\x1f\n\rEleccionReply\x12\x0e\n\x06status\x18\x01 \x01(\t\";\n\x12\x43oordinadorRequest\x12\x16\n\x0e\x63oordinador_id\x18\x01 \x01(\x05\x12\r\n\x05token\x18\x02 \x01(\x03\"1\n\x10\x43oordinadorReply\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\r\n\x05token\x18\x02 \x01(\x03\"#\n\x10HeartbeatRequest\x12\x0f\n\x07nodo_id\x18\x01 \x01(\x05\"2\n\x0eHeartbeatReply\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x10\n\x08is_alive\x18\x02 \x01(\x08\"#\n\x10RespuestaRequest\x12\x0f\n\x07nodo_id\x18\x01 \x01(\x05\" \n\x0eRespuestaReply\x12\x0e\n\x06status\x18\x01 \x01(\t\"^\n\x0cLeaseRequest\x12\x16\n\x0e\x63oordinador_id\x18\x01 \x01(\x05\x12\r\n\x05token\x18\x02 \x01(\x03\x12\x13\n\x0b\x64uracion_ms\x18\x03 \x01(\x05\x12\x12\n\nsucesor_id\x18\x04 \x01(\x05\"<\n\nLeaseReply\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\r\n\x05token\x18\x02 \x01(\x03\x12\x0f\n\x07nodo_id\x18\x03 \x01(\x05\x32\x81\x02\n\x0c\x42ullyService\x12,\n\x08\x45leccion\x12\x10.EleccionRequest\x1a\x0e.EleccionReply\x12\x35\n\x0b\x43oordinador\x12\x13.CoordinadorRequest\x1a\x11.CoordinadorReply\x12/\n\tHeartbeat\x12\x11.HeartbeatRequest\x1a\x0f.HeartbeatReply\x12/\n\tRespuesta\x12\x11.RespuestaRequest\x1a\x0f.RespuestaReply\x12*\n\x0cRenovarLease\x12\r.LeaseRequest\x1a\x0b.LeaseReplyb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -36,17 +36,21 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_ELECCIONREPLY']._serialized_start=57
   _globals['_ELECCIONREPLY']._serialized_end=88
   _globals['_COORDINADORREQUEST']._serialized_start=90
-  _globals['_COORDINADORREQUEST']._serialized_end=134
-  _globals['_COORDINADORREPLY']._serialized_start=136
-  _globals['_COORDINADORREPLY']._serialized_end=170
-  _globals['_HEARTBEATREQUEST']._serialized_start=172
-  _globals['_HEARTBEATREQUEST']._serialized_end=207
-  _globals['_HEARTBEATREPLY']._serialized_start=209
-  _globals['_HEARTBEATREPLY']._serialized_end=259
-  _globals['_RESPUESTAREQUEST']._serialized_start=261
-  _globals['_RESPUESTAREQUEST']._serialized_end=296
-  _globals['_RESPUESTAREPLY']._serialized_start=298
-  _globals['_RESPUESTAREPLY']._serialized_end=330
-  _globals['_BULLYSERVICE']._serialized_start=333
-  _globals['_BULLYSERVICE']._serialized_end=546
+  _globals['_COORDINADORREQUEST']._serialized_end=149
+  _globals['_COORDINADORREPLY']._serialized_start=151
+  _globals['_COORDINADORREPLY']._serialized_end=200
+  _globals['_HEARTBEATREQUEST']._serialized_start=202
+  _globals['_HEARTBEATREQUEST']._serialized_end=237
+  _globals['_HEARTBEATREPLY']._serialized_start=239
+  _globals['_HEARTBEATREPLY']._serialized_end=289
+  _globals['_RESPUESTAREQUEST']._serialized_start=291
+  _globals['_RESPUESTAREQUEST']._serialized_end=326
+  _globals['_RESPUESTAREPLY']._serialized_start=328
+  _globals['_RESPUESTAREPLY']._serialized_end=360
+  _globals['_LEASEREQUEST']._serialized_start=362
+  _globals['_LEASEREQUEST']._serialized_end=456
+  _globals['_LEASEREPLY']._serialized_start=458
+  _globals['_LEASEREPLY']._serialized_end=518
+  _globals['_BULLYSERVICE']._serialized_start=521
+  _globals['_BULLYSERVICE']._serialized_end=778
 # @@protoc_insertion_point(module_scope)
@@ -54,6 +54,11 @@ class BullyServiceStub(object):
                 request_serializer=proto_dot_bully__pb2.RespuestaRequest.SerializeToString,
                 response_deserializer=proto_dot_bully__pb2.RespuestaReply.FromString,
                 _registered_method=True)
+        self.RenovarLease = channel.unary_unary(
+                '/BullyService/RenovarLease',
+                request_serializer=proto_dot_bully__pb2.LeaseRequest.SerializeToString,
+                response_deserializer=proto_dot_bully__pb2.LeaseReply.FromString,
+                _registered_method=True)
 
 
 class BullyServiceServicer(object):
@@ -83,6 +88,12 @@ class BullyServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def RenovarLease(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_BullyServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -106,6 +117,11 @@ def add_BullyServiceServicer_to_server(servicer, server):
                     request_deserializer=proto_dot_bully__pb2.RespuestaRequest.FromString,
                     response_serializer=proto_dot_bully__pb2.RespuestaReply.SerializeToString,
             ),
+            'RenovarLease': grpc.unary_unary_rpc_method_handler(
+                    servicer.RenovarLease,
+                    request_deserializer=proto_dot_bully__pb2.LeaseRequest.FromString,
+                    response_serializer=proto_dot_bully__pb2.LeaseReply.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'BullyService', rpc_method_handlers)
@@ -224,3 +240,30 @@ class BullyService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def RenovarLease(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/BullyService/RenovarLease',
+            proto_dot_bully__pb2.LeaseRequest.SerializeToString,
+            proto_dot_bully__pb2.LeaseReply.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
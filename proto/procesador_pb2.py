@@ -24,17 +24,53 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x16proto/procesador.proto\"\x1d\n\rImagenRequest\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\"C\n\x0bImagenReply\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x13\n\x0bimagen_data\x18\x02 \x01(\x0c\x12\x0f\n\x07mensaje\x18\x03 \x01(\t2B\n\x10ProcesadorImagen\x12.\n\x0eProcesarImagen\x12\x0e.ImagenRequest\x1a\x0c.ImagenReplyb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x16proto/procesador.proto\"K\n\x06Tensor\x12\r\n\x05\x66orma\x18\x01 \x03(\x05\x12\r\n\x05\x64type\x18\x02 \x01(\t\x12\r\n\x05\x64\x61tos\x18\x03 \x01(\x0c\x12\x14\n\x0c\x63odificacion\x18\x04 \x01(\t\"~\n\tOperacion\x12\x0e\n\x06nombre\x18\x01 \x01(\t\x12.\n\nparametros\x18\x02 \x03(\x0b\x32\x1a.Operacion.ParametrosEntry\x1a\x31\n\x0fParametrosEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x01:\x02\x38\x01\"i\n\rImagenRequest\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\x12\x17\n\x06tensor\x18\x02 \x01(\x0b\x32\x07.Tensor\x12\x1c\n\x08pipeline\x18\x03 \x03(\x0b\x32\n.Operacion\x12\x13\n\x0bruta_origen\x18\x04 \x01(\t\"\xcf\x01\n\x0bImagenReply\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x13\n\x0bimagen_data\x18\x02 \x01(\x0c\x12\x0f\n\x07mensaje\x18\x03 \x01(\t\x12\x17\n\x06tensor\x18\x04 \x01(\x0b\x32\x07.Tensor\x12:\n\x10teselas_por_nodo\x18\x05 \x03(\x0b\x32 .ImagenReply.TeselasPorNodoEntry\x1a\x35\n\x13TeselasPorNodoEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\"E\n\x0bLoteRequest\x12\x18\n\x07teselas\x18\x01 \x03(\x0b\x32\x07.Tensor\x12\x1c\n\x08pipeline\x18\x02 \x03(\x0b\x32\n.Operacion\"F\n\tLoteReply\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x18\n\x07teselas\x18\x02 \x03(\x0b\x32\x07.Tensor\x12\x0f\n\x07mensaje\x18\x03 \x01(\t\"A\n\x0fImagenesRequest\x12\x10\n\x08imagenes\x18\x01 \x03(\x0c\x12\x1c\n\x08pipeline\x18\x02 \x03(\x0b\x32\n.Operacion\"\xce\x01\n\x0fImagenProcesada\x12\x0e\n\x06indice\x18\x01 \x01(\x05\x12\x0e\n\x06status\x18\x02 \x01(\t\x12\x13\n\x0bimagen_data\x18\x03 \x01(\x0c\x12\x0f\n\x07mensaje\x18\x04 \x01(\t\x12>\n\x10teselas_por_nodo\x18\x05 \x03(\x0b\x32$.ImagenProcesada.TeselasPorNodoEntry\x1a\x35\n\x13TeselasPorNodoEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\"\x9d\x01\n\x0bImagenChunk\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\x12\x0e\n\x06offset\x18\x02 \x01(\x03\x12\x14\n\x0ctamano_total\x18\x03 \x01(\x03\x12\x0b\n\x03\x66in\x18\x04 \x01(\x08\x12\x0e\n\x06sha256\x18\x05 \x01(\t\x12\x0e\n\x06status\x18\x06 \x01(\t\x12\x0f\n\x07mensaje\x18\x07 \x01(\t\x12\x1c\n\x08pipeline\x18\x08 \x03(\x0b\x32\n.Operacion\"\xd9\x02\n\x0eParteProcesada\x12\x0e\n\x06indice\x18\x01 \x01(\x05\x12\x13\n\x0b\x66ila_inicio\x18\x02 \x01(\x05\x12\x14\n\x0ctotal_partes\x18\x03 \x01(\x05\x12\x12\n\nalto_total\x18\x04 \x01(\x05\x12\x13\n\x0b\x61ncho_total\x18\x05 \x01(\x05\x12\x13\n\x0bimagen_data\x18\x06 \x01(\x0c\x12\r\n\x05\x66inal\x18\x07 \x01(\x08\x12\x0e\n\x06status\x18\x08 \x01(\t\x12\x0f\n\x07mensaje\x18\t \x01(\t\x12\x16\n\x0e\x63olumna_inicio\x18\n \x01(\x05\x12=\n\x10teselas_por_nodo\x18\x0b \x03(\x0b\x32#.ParteProcesada.TeselasPorNodoEntry\x12\x10\n\x08\x63ontinua\x18\x0c \x01(\x08\x1a\x35\n\x13TeselasPorNodoEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x05:\x02\x38\x01\"\x0f\n\rEstadoRequest\"E\n\x0b\x45stadoReply\x12\x16\n\x0e\x65s_coordinador\x18\x01 \x01(\x08\x12\x0f\n\x07nodo_id\x18\x02 \x01(\x05\x12\r\n\x05token\x18\x03 \x01(\x03\x32\xc9\x02\n\x10ProcesadorImagen\x12.\n\x0eProcesarImagen\x12\x0e.ImagenRequest\x1a\x0c.ImagenReply\x12\x36\n\x14ProcesarImagenStream\x12\x0c.ImagenChunk\x1a\x0c.ImagenChunk(\x01\x30\x01\x12=\n\x18ProcesarImagenProgresivo\x12\x0e.ImagenRequest\x1a\x0f.ParteProcesada0\x01\x12(\n\x0cProcesarLote\x12\x0c.LoteRequest\x1a\n.LoteReply\x12\x38\n\x10ProcesarImagenes\x12\x10.ImagenesRequest\x1a\x10.ImagenProcesada0\x01\x12*\n\nEstadoNodo\x12\x0e.EstadoRequest\x1a\x0c.EstadoReplyb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'proto.procesador_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_IMAGENREQUEST']._serialized_start=26
-  _globals['_IMAGENREQUEST']._serialized_end=55
-  _globals['_IMAGENREPLY']._serialized_start=57
-  _globals['_IMAGENREPLY']._serialized_end=124
-  _globals['_PROCESADORIMAGEN']._serialized_start=126
-  _globals['_PROCESADORIMAGEN']._serialized_end=192
+  _globals['_OPERACION_PARAMETROSENTRY']._loaded_options = None
+  _globals['_OPERACION_PARAMETROSENTRY']._serialized_options = b'8\001'
+  _globals['_IMAGENREPLY_TESELASPORNODOENTRY']._loaded_options = None
+  _globals['_IMAGENREPLY_TESELASPORNODOENTRY']._serialized_options = b'8\001'
+  _globals['_IMAGENPROCESADA_TESELASPORNODOENTRY']._loaded_options = None
+  _globals['_IMAGENPROCESADA_TESELASPORNODOENTRY']._serialized_options = b'8\001'
+  _globals['_PARTEPROCESADA_TESELASPORNODOENTRY']._loaded_options = None
+  _globals['_PARTEPROCESADA_TESELASPORNODOENTRY']._serialized_options = b'8\001'
+  _globals['_TENSOR']._serialized_start=26
+  _globals['_TENSOR']._serialized_end=101
+  _globals['_OPERACION']._serialized_start=103
+  _globals['_OPERACION']._serialized_end=229
+  _globals['_OPERACION_PARAMETROSENTRY']._serialized_start=180
+  _globals['_OPERACION_PARAMETROSENTRY']._serialized_end=229
+  _globals['_IMAGENREQUEST']._serialized_start=231
+  _globals['_IMAGENREQUEST']._serialized_end=336
+  _globals['_IMAGENREPLY']._serialized_start=339
+  _globals['_IMAGENREPLY']._serialized_end=546
+  _globals['_IMAGENREPLY_TESELASPORNODOENTRY']._serialized_start=493
+  _globals['_IMAGENREPLY_TESELASPORNODOENTRY']._serialized_end=546
+  _globals['_LOTEREQUEST']._serialized_start=548
+  _globals['_LOTEREQUEST']._serialized_end=617
+  _globals['_LOTEREPLY']._serialized_start=619
+  _globals['_LOTEREPLY']._serialized_end=689
+  _globals['_IMAGENESREQUEST']._serialized_start=691
+  _globals['_IMAGENESREQUEST']._serialized_end=756
+  _globals['_IMAGENPROCESADA']._serialized_start=759
+  _globals['_IMAGENPROCESADA']._serialized_end=965
+  _globals['_IMAGENPROCESADA_TESELASPORNODOENTRY']._serialized_start=493
+  _globals['_IMAGENPROCESADA_TESELASPORNODOENTRY']._serialized_end=546
+  _globals['_IMAGENCHUNK']._serialized_start=968
+  _globals['_IMAGENCHUNK']._serialized_end=1125
+  _globals['_PARTEPROCESADA']._serialized_start=1128
+  _globals['_PARTEPROCESADA']._serialized_end=1473
+  _globals['_PARTEPROCESADA_TESELASPORNODOENTRY']._serialized_start=493
+  _globals['_PARTEPROCESADA_TESELASPORNODOENTRY']._serialized_end=546
+  _globals['_ESTADOREQUEST']._serialized_start=1475
+  _globals['_ESTADOREQUEST']._serialized_end=1490
+  _globals['_ESTADOREPLY']._serialized_start=1492
+  _globals['_ESTADOREPLY']._serialized_end=1561
+  _globals['_PROCESADORIMAGEN']._serialized_start=1564
+  _globals['_PROCESADORIMAGEN']._serialized_end=1893
 # @@protoc_insertion_point(module_scope)
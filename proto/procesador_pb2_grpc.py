@@ -39,6 +39,31 @@ class ProcesadorImagenStub(object):
                 request_serializer=proto_dot_procesador__pb2.ImagenRequest.SerializeToString,
                 response_deserializer=proto_dot_procesador__pb2.ImagenReply.FromString,
                 _registered_method=True)
+        self.ProcesarImagenStream = channel.stream_stream(
+                '/ProcesadorImagen/ProcesarImagenStream',
+                request_serializer=proto_dot_procesador__pb2.ImagenChunk.SerializeToString,
+                response_deserializer=proto_dot_procesador__pb2.ImagenChunk.FromString,
+                _registered_method=True)
+        self.ProcesarImagenProgresivo = channel.unary_stream(
+                '/ProcesadorImagen/ProcesarImagenProgresivo',
+                request_serializer=proto_dot_procesador__pb2.ImagenRequest.SerializeToString,
+                response_deserializer=proto_dot_procesador__pb2.ParteProcesada.FromString,
+                _registered_method=True)
+        self.ProcesarLote = channel.unary_unary(
+                '/ProcesadorImagen/ProcesarLote',
+                request_serializer=proto_dot_procesador__pb2.LoteRequest.SerializeToString,
+                response_deserializer=proto_dot_procesador__pb2.LoteReply.FromString,
+                _registered_method=True)
+        self.ProcesarImagenes = channel.unary_stream(
+                '/ProcesadorImagen/ProcesarImagenes',
+                request_serializer=proto_dot_procesador__pb2.ImagenesRequest.SerializeToString,
+                response_deserializer=proto_dot_procesador__pb2.ImagenProcesada.FromString,
+                _registered_method=True)
+        self.EstadoNodo = channel.unary_unary(
+                '/ProcesadorImagen/EstadoNodo',
+                request_serializer=proto_dot_procesador__pb2.EstadoRequest.SerializeToString,
+                response_deserializer=proto_dot_procesador__pb2.EstadoReply.FromString,
+                _registered_method=True)
 
 
 class ProcesadorImagenServicer(object):
@@ -50,6 +75,36 @@ class ProcesadorImagenServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ProcesarImagenStream(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ProcesarImagenProgresivo(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ProcesarLote(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ProcesarImagenes(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def EstadoNodo(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_ProcesadorImagenServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -58,6 +113,31 @@ def add_ProcesadorImagenServicer_to_server(servicer, server):
                     request_deserializer=proto_dot_procesador__pb2.ImagenRequest.FromString,
                     response_serializer=proto_dot_procesador__pb2.ImagenReply.SerializeToString,
             ),
+            'ProcesarImagenStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.ProcesarImagenStream,
+                    request_deserializer=proto_dot_procesador__pb2.ImagenChunk.FromString,
+                    response_serializer=proto_dot_procesador__pb2.ImagenChunk.SerializeToString,
+            ),
+            'ProcesarImagenProgresivo': grpc.unary_stream_rpc_method_handler(
+                    servicer.ProcesarImagenProgresivo,
+                    request_deserializer=proto_dot_procesador__pb2.ImagenRequest.FromString,
+                    response_serializer=proto_dot_procesador__pb2.ParteProcesada.SerializeToString,
+            ),
+            'ProcesarLote': grpc.unary_unary_rpc_method_handler(
+                    servicer.ProcesarLote,
+                    request_deserializer=proto_dot_procesador__pb2.LoteRequest.FromString,
+                    response_serializer=proto_dot_procesador__pb2.LoteReply.SerializeToString,
+            ),
+            'ProcesarImagenes': grpc.unary_stream_rpc_method_handler(
+                    servicer.ProcesarImagenes,
+                    request_deserializer=proto_dot_procesador__pb2.ImagenesRequest.FromString,
+                    response_serializer=proto_dot_procesador__pb2.ImagenProcesada.SerializeToString,
+            ),
+            'EstadoNodo': grpc.unary_unary_rpc_method_handler(
+                    servicer.EstadoNodo,
+                    request_deserializer=proto_dot_procesador__pb2.EstadoRequest.FromString,
+                    response_serializer=proto_dot_procesador__pb2.EstadoReply.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'ProcesadorImagen', rpc_method_handlers)
@@ -95,3 +175,138 @@ class ProcesadorImagen(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def ProcesarImagenStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/ProcesadorImagen/ProcesarImagenStream',
+            proto_dot_procesador__pb2.ImagenChunk.SerializeToString,
+            proto_dot_procesador__pb2.ImagenChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ProcesarImagenProgresivo(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/ProcesadorImagen/ProcesarImagenProgresivo',
+            proto_dot_procesador__pb2.ImagenRequest.SerializeToString,
+            proto_dot_procesador__pb2.ParteProcesada.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ProcesarLote(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ProcesadorImagen/ProcesarLote',
+            proto_dot_procesador__pb2.LoteRequest.SerializeToString,
+            proto_dot_procesador__pb2.LoteReply.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ProcesarImagenes(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/ProcesadorImagen/ProcesarImagenes',
+            proto_dot_procesador__pb2.ImagenesRequest.SerializeToString,
+            proto_dot_procesador__pb2.ImagenProcesada.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def EstadoNodo(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ProcesadorImagen/EstadoNodo',
+            proto_dot_procesador__pb2.EstadoRequest.SerializeToString,
+            proto_dot_procesador__pb2.EstadoReply.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
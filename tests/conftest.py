@@ -0,0 +1,8 @@
+import os
+import sys
+
+# los servicios se ejecutan desde su carpeta (nodos/, cliente/) con la raiz para proto y monitoreo
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for carpeta in (RAIZ, os.path.join(RAIZ, "nodos"), os.path.join(RAIZ, "cliente")):
+    if carpeta not in sys.path:
+        sys.path.insert(0, carpeta)
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from proto import procesador_pb2
+from cache_resultados import CacheResultados, clave_resultado, HIT, MISS, COALESCIDO
+
+def operacion(nombre, **parametros):
+    return procesador_pb2.Operacion(nombre=nombre, parametros=parametros)
+
+def test_pipeline_vacio_equivale_al_pipeline_por_defecto():
+    assert clave_resultado("abc", []) == clave_resultado("abc", [operacion("escala_grises")])
+
+def test_orden_de_parametros_no_cambia_la_clave():
+    a = procesador_pb2.Operacion(nombre="canny", parametros={"umbral1": 50, "umbral2": 150})
+    b = procesador_pb2.Operacion(nombre="canny", parametros={"umbral2": 150, "umbral1": 50})
+    assert clave_resultado("abc", [a]) == clave_resultado("abc", [b])
+
+def test_la_clave_distingue_imagen_operaciones_y_orden():
+    gris = operacion("escala_grises")
+    blur = operacion("desenfoque_gaussiano", kernel=7)
+    claves = {
+        clave_resultado("abc", [gris, blur]),
+        clave_resultado("abc", [blur, gris]),
+        clave_resultado("abd", [gris, blur]),
+        clave_resultado("abc", [gris, operacion("desenfoque_gaussiano", kernel=5)]),
+    }
+    assert len(claves) == 4
+
+def test_desaloja_los_menos_usados(tmp_path):
+    cache = CacheResultados(str(tmp_path), tamano_max_bytes=25)
+    cache.guardar("aa1", b"x" * 10)
+    cache.guardar("bb2", b"y" * 10)
+    assert cache.obtener("aa1") == b"x" * 10
+    cache.guardar("cc3", b"z" * 10)
+
+    assert cache.obtener("bb2") is None
+    assert cache.obtener("aa1") == b"x" * 10
+    assert cache.obtener("cc3") == b"z" * 10
+
+    # el orden LRU se reconstruye desde los archivos al reiniciar
+    reiniciada = CacheResultados(str(tmp_path), tamano_max_bytes=25)
+    assert set(reiniciada._indice) == {"aa1", "cc3"}
+
+def test_peticiones_iguales_calculan_una_sola_vez(tmp_path):
+    cache = CacheResultados(str(tmp_path))
+    llamadas = []
+    inicio = threading.Event()
+
+    def calcular():
+        llamadas.append(1)
+        inicio.set()
+        time.sleep(0.1)
+        return b"resultado"
+
+    resultados = []
+    primero = threading.Thread(target=lambda: resultados.append(cache.obtener_o_calcular("ab1", calcular)))
+    primero.start()
+    inicio.wait()
+    segundo = threading.Thread(target=lambda: resultados.append(cache.obtener_o_calcular("ab1", calcular)))
+    segundo.start()
+    primero.join()
+    segundo.join()
+
+    assert len(llamadas) == 1
+    assert sorted(resultados) == [(b"resultado", COALESCIDO), (b"resultado", MISS)]
+    assert cache.obtener_o_calcular("ab1", calcular) == (b"resultado", HIT)
+
+def test_un_error_se_propaga_y_no_queda_en_curso(tmp_path):
+    cache = CacheResultados(str(tmp_path))
+
+    def fallar():
+        raise RuntimeError("nodo caido")
+
+    with pytest.raises(RuntimeError):
+        cache.obtener_o_calcular("ab1", fallar)
+    assert cache.obtener_o_calcular("ab1", lambda: b"ok") == (b"ok", MISS)
@@ -0,0 +1,77 @@
+import time
+import threading
+
+import numpy as np
+
+from coordinador_service import CoordinadorService, NODO_LOCAL
+from estadisticas_nodos import clase_tamano
+
+PARTE = np.zeros((16, 16, 3), dtype=np.uint8)
+
+class HelperFalso:
+    """Nodos simulados: nodo -> (segundos que tarda, si responde)"""
+
+    def __init__(self, nodos, local=(0.0, True)):
+        self.nodos = nodos
+        self.local = local
+        self.llamadas = []
+        self._lock = threading.Lock()
+
+    def _atender(self, nodo, comportamiento, parte):
+        with self._lock:
+            self.llamadas.append(nodo)
+        espera, responde = comportamiento
+        time.sleep(espera)
+        return parte.copy() if responde else None
+
+    def enviar_parte_a_nodo(self, parte, nodo, pipeline, timeout):
+        return self._atender(nodo, self.nodos[nodo], parte)
+
+    def procesar_local(self, parte, pipeline):
+        return self._atender(NODO_LOCAL, self.local, parte)
+
+def crear_coordinador(helper, latencias):
+    """Coordinador con latencias ya observadas por nodo"""
+    coordinador = CoordinadorService(1, None, helper)
+    for nodo, duracion in latencias.items():
+        for _ in range(20):
+            coordinador.latencias.registrar(nodo, clase_tamano(PARTE.nbytes), duracion)
+    return coordinador
+
+def test_fallo_rapido_y_local_lento_no_duplica():
+    # el nodo falla enseguida y el coordinador tarda mas que el umbral del nodo que fallo
+    helper = HelperFalso({"a": (0.0, False)}, local=(0.1, True))
+    coordinador = crear_coordinador(helper, {"a": 0.01})
+
+    resultado, nodo = coordinador._procesar_parte_con_reintentos(PARTE, "a", ["a"], [])
+
+    assert nodo == NODO_LOCAL
+    assert np.array_equal(resultado, PARTE)
+    assert helper.llamadas == ["a", NODO_LOCAL]
+
+def test_nodo_lento_que_falla_termina_en_local():
+    # se duplica en el coordinador mientras el nodo demora, y el nodo termina fallando
+    helper = HelperFalso({"a": (0.1, False)}, local=(0.05, True))
+    coordinador = crear_coordinador(helper, {"a": 0.01})
+
+    resultado, nodo = coordinador._procesar_parte_con_reintentos(PARTE, "a", ["a"], [])
+
+    assert nodo == NODO_LOCAL
+    assert np.array_equal(resultado, PARTE)
+
+def test_reintento_usa_el_umbral_del_nodo_que_atiende():
+    # b es lento por naturaleza: su umbral es alto y no se duplica con el umbral de a
+    helper = HelperFalso({"a": (0.0, False), "b": (0.1, True)})
+    coordinador = crear_coordinador(helper, {"a": 0.01, "b": 1.0})
+
+    resultado, nodo = coordinador._procesar_parte_con_reintentos(PARTE, "a", ["a", "b"], [])
+
+    assert nodo == "b"
+    assert NODO_LOCAL not in helper.llamadas
+
+def test_todos_fallan():
+    helper = HelperFalso({"a": (0.0, False), "b": (0.0, False)}, local=(0.0, False))
+    coordinador = crear_coordinador(helper, {})
+
+    assert coordinador._procesar_parte_con_reintentos(PARTE, "a", ["a", "b"], []) == (None, None)
+    assert sorted(helper.llamadas) == sorted(["a", "b", NODO_LOCAL])
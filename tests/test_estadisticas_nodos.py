@@ -0,0 +1,78 @@
+import pytest
+
+from estadisticas_nodos import (
+    EstimadorCapacidad, EstadisticasLatencia, ALFA_CAPACIDAD, PESO_MINIMO, PENALIZACION_FALLO,
+    MUESTRAS_LATENCIA, MUESTRAS_MIN_LATENCIA,
+    FACTOR_TIMEOUT, TIMEOUT_MIN, TIMEOUT_MAX, TIMEOUT_INICIAL,
+)
+
+def estadisticas_con(latencias, nodo="n1", clase="pequeña"):
+    estadisticas = EstadisticasLatencia(1)
+    for latencia in latencias:
+        estadisticas.registrar(nodo, clase, latencia)
+    return estadisticas
+
+def test_sin_muestras_suficientes_no_hay_percentil():
+    estadisticas = estadisticas_con([0.1] * (MUESTRAS_MIN_LATENCIA - 1))
+    assert estadisticas.percentil("n1", "pequeña", 95) is None
+    assert estadisticas.umbral_hedge("n1", "pequeña") is None
+    assert estadisticas.timeout("n1", "pequeña") == TIMEOUT_INICIAL
+
+def test_percentiles():
+    estadisticas = estadisticas_con([i / 100 for i in range(1, 101)])
+    assert estadisticas.percentil("n1", "pequeña", 50) == pytest.approx(0.50)
+    assert estadisticas.percentil("n1", "pequeña", 95) == pytest.approx(0.95)
+    assert estadisticas.percentil("n1", "pequeña", 100) == pytest.approx(1.0)
+    assert estadisticas.percentil("n1", "pequeña", 0) == pytest.approx(0.01)
+    assert estadisticas.umbral_hedge("n1", "pequeña") == pytest.approx(0.95)
+
+def test_latencias_separadas_por_nodo_y_clase():
+    estadisticas = estadisticas_con([0.2] * MUESTRAS_MIN_LATENCIA)
+    assert estadisticas.umbral_hedge("n2", "pequeña") is None
+    assert estadisticas.umbral_hedge("n1", "grande") is None
+
+def test_solo_se_guardan_las_muestras_recientes():
+    estadisticas = estadisticas_con([5.0] * MUESTRAS_LATENCIA + [0.1] * MUESTRAS_LATENCIA)
+    assert estadisticas.percentil("n1", "pequeña", 100) == pytest.approx(0.1)
+
+def test_timeout_acotado():
+    rapido = estadisticas_con([0.001] * MUESTRAS_MIN_LATENCIA)
+    assert rapido.timeout("n1", "pequeña") == TIMEOUT_MIN
+
+    lento = estadisticas_con([TIMEOUT_MAX] * MUESTRAS_MIN_LATENCIA)
+    assert lento.timeout("n1", "pequeña") == TIMEOUT_MAX
+
+    latencia = (TIMEOUT_MIN + TIMEOUT_MAX) / 2 / FACTOR_TIMEOUT
+    intermedio = estadisticas_con([latencia] * MUESTRAS_MIN_LATENCIA)
+    assert intermedio.timeout("n1", "pequeña") == pytest.approx(FACTOR_TIMEOUT * latencia)
+
+def test_pesos_relativos_a_la_capacidad_promedio():
+    estimador = EstimadorCapacidad(1)
+    estimador.registrar("a", megapixeles=3.0, costo=1.0, duracion=1.0)
+    estimador.registrar("b", megapixeles=1.0, costo=1.0, duracion=1.0)
+
+    pesos = estimador.pesos(["a", "b", "nuevo"])
+
+    assert pesos["a"] == pytest.approx(1.5)
+    assert pesos["b"] == pytest.approx(0.5)
+    # un nodo sin medir recibe el peso promedio
+    assert pesos["nuevo"] == 1.0
+
+def test_promedio_movil_y_penalizacion():
+    estimador = EstimadorCapacidad(1)
+    estimador.registrar("a", megapixeles=1.0, costo=2.0, duracion=1.0)
+    estimador.registrar("a", megapixeles=4.0, costo=1.0, duracion=1.0)
+    esperado = ALFA_CAPACIDAD * 4.0 + (1 - ALFA_CAPACIDAD) * 2.0
+    assert estimador.capacidades["a"] == pytest.approx(esperado)
+
+    estimador.registrar_fallo("a")
+    assert estimador.capacidades["a"] == pytest.approx(esperado * PENALIZACION_FALLO)
+    # duraciones no positivas se ignoran
+    estimador.registrar("a", megapixeles=1.0, costo=1.0, duracion=0)
+    assert estimador.capacidades["a"] == pytest.approx(esperado * PENALIZACION_FALLO)
+
+def test_peso_minimo_para_nodos_lentos():
+    estimador = EstimadorCapacidad(1)
+    estimador.registrar("rapido", megapixeles=1000.0, costo=1.0, duracion=1.0)
+    estimador.registrar("lento", megapixeles=1.0, costo=1.0, duracion=1.0)
+    assert estimador.pesos(["rapido", "lento"])["lento"] == PESO_MINIMO
@@ -0,0 +1,82 @@
+import json
+import os
+
+from indice_imagenes import IndiceImagenes, NOMBRE_INDICE
+
+def metadata(n, tipo="original"):
+    return {"imagen_id": f"img{n}", "tipo": tipo, "fecha_creado": f"2024-01-01T00:00:{n:02d}"}
+
+def test_crea_el_indice_desde_la_carpeta_metadata(tmp_path):
+    metadata_dir = tmp_path / "u1" / "metadata"
+    metadata_dir.mkdir(parents=True)
+    for n in (3, 1, 2):
+        (metadata_dir / f"img{n}.json").write_text(json.dumps(metadata(n)))
+    indice = IndiceImagenes(str(tmp_path))
+
+    imagenes, total = indice.consultar("u1")
+
+    assert total == 3
+    assert [m["imagen_id"] for m in imagenes] == ["img3", "img2", "img1"]
+    assert (tmp_path / "u1" / NOMBRE_INDICE).exists()
+
+def test_agregar_y_paginar(tmp_path):
+    (tmp_path / "u1").mkdir()
+    indice = IndiceImagenes(str(tmp_path))
+    (tmp_path / "u1" / NOMBRE_INDICE).write_text("")
+    indice.agregar("u1", [metadata(n, "original" if n % 2 else "procesada") for n in range(10)])
+
+    pagina, total = indice.consultar("u1", limite=3, desplazamiento=2)
+    assert total == 10
+    assert [m["imagen_id"] for m in pagina] == ["img7", "img6", "img5"]
+
+    procesadas, total = indice.consultar("u1", tipo_imagen="procesada", limite=2)
+    assert total == 5
+    assert [m["imagen_id"] for m in procesadas] == ["img8", "img6"]
+
+    vacia, total = indice.consultar("u1", limite=5, desplazamiento=20)
+    assert vacia == [] and total == 10
+
+def test_lecturas_incrementales_y_duplicados(tmp_path):
+    (tmp_path / "u1").mkdir()
+    ruta = tmp_path / "u1" / NOMBRE_INDICE
+    ruta.write_text("")
+    indice = IndiceImagenes(str(tmp_path))
+    indice.agregar("u1", [metadata(1)])
+    assert indice.consultar("u1")[1] == 1
+
+    indice.agregar("u1", [metadata(1), metadata(2)])
+    # una linea a medio escribir no se lee hasta que llega su salto de linea
+    with open(ruta, "a") as f:
+        f.write(json.dumps(metadata(3))[:10])
+    imagenes, total = indice.consultar("u1")
+    assert total == 2
+    assert [m["imagen_id"] for m in imagenes] == ["img2", "img1"]
+
+    with open(ruta, "a") as f:
+        f.write(json.dumps(metadata(3))[10:] + "\n")
+    assert indice.consultar("u1")[1] == 3
+
+def test_descarta_usuarios_menos_recientes(tmp_path):
+    indice = IndiceImagenes(str(tmp_path), max_usuarios=2)
+    for usuario in ("u1", "u2", "u3"):
+        (tmp_path / usuario).mkdir()
+        (tmp_path / usuario / NOMBRE_INDICE).write_text(json.dumps(metadata(1)) + "\n")
+        indice.consultar(usuario)
+
+    assert list(indice._cache) == ["u2", "u3"]
+    # un usuario descartado se vuelve a leer del archivo
+    assert indice.consultar("u1")[1] == 1
+    assert list(indice._cache) == ["u3", "u1"]
+
+def test_indice_reconstruido_se_relee(tmp_path):
+    (tmp_path / "u1").mkdir()
+    ruta = tmp_path / "u1" / NOMBRE_INDICE
+    ruta.write_text("".join(json.dumps(metadata(n)) + "\n" for n in range(3)))
+    indice = IndiceImagenes(str(tmp_path))
+    assert indice.consultar("u1")[1] == 3
+
+    os.remove(ruta)
+    ruta.write_text(json.dumps(metadata(9)) + "\n")
+    imagenes, total = indice.consultar("u1")
+    assert total == 1
+    assert imagenes[0]["imagen_id"] == "img9"
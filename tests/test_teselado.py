@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+import pytest
+
+import coordinador_service
+from coordinador_service import CoordinadorService, MODO_ESTATICO, MODO_COLA
+from imagen_helper import ImagenHelper
+from operaciones import ejecutar_pipeline
+
+class HelperLocal(ImagenHelper):
+    """Los nodos remotos procesan en el mismo proceso, sin gRPC"""
+
+    def __init__(self):
+        super().__init__(1, None)
+
+    def enviar_parte_a_nodo(self, parte, nodo_direccion, pipeline, timeout=10.0):
+        return self.procesar_local(parte, pipeline)
+
+    def enviar_lote_a_nodo(self, partes, nodo_direccion, pipeline, timeout=10.0):
+        return [self.procesar_local(parte, pipeline) for parte in partes]
+
+class BullyFalso:
+    es_coordinador = True
+
+    def __init__(self, nodos):
+        self.nodos = nodos
+
+    def get_nodos_disponibles(self):
+        return list(self.nodos)
+
+def imagen_prueba(alto=301, ancho=437):
+    rng = np.random.default_rng(7)
+    img = rng.integers(0, 256, (alto, ancho, 3), dtype=np.uint8)
+    # bordes y gradientes ademas del ruido, para que los filtros de vecindad tengan estructura
+    return cv2.GaussianBlur(img, (0, 0), 3)
+
+PIPELINES = [
+    [("escala_grises", {})],
+    [("desenfoque_gaussiano", {"kernel": 7})],
+    [("sobel", {"kernel": 3})],
+    [("mediana", {"kernel": 5}), ("dilatacion", {"kernel": 3})],
+    [("redimensionar", {"factor": 0.5})],
+    [("redimensionar", {"factor": 0.75})],
+    [("redimensionar", {"factor": 0.33})],
+    [("redimensionar", {"factor": 1.5}), ("erosion", {"kernel": 3})],
+    [("desenfoque_gaussiano", {"kernel": 5}), ("redimensionar", {"factor": 0.6})],
+]
+
+@pytest.fixture
+def coordinador(monkeypatch):
+    # teselas pequeñas para que incluso esta imagen se reparta en varias
+    monkeypatch.setattr(coordinador_service, "TRABAJO_MIN_TESELA", 0.005)
+    return CoordinadorService(1, BullyFalso(["a", "b", "c"]), HelperLocal())
+
+@pytest.mark.parametrize("modo", [MODO_ESTATICO, MODO_COLA])
+@pytest.mark.parametrize("pipeline", PIPELINES, ids=lambda p: "+".join(f"{n}{list(a.values())}" for n, a in p))
+def test_teselas_igual_a_imagen_completa(coordinador, pipeline, modo):
+    img = imagen_prueba()
+    coordinador.modo_reparto = modo
+
+    respuesta = coordinador.procesar_imagen_distribuida(cv2.imencode(".png", img)[1].tobytes(), pipeline)
+
+    assert respuesta.status == "ok", respuesta.mensaje
+    resultado = cv2.imdecode(np.frombuffer(respuesta.imagen_data, np.uint8), cv2.IMREAD_UNCHANGED)
+    esperado = ejecutar_pipeline(img, pipeline)
+    assert resultado.shape == esperado.shape
+    assert np.array_equal(resultado, esperado)
+
+def test_cortes_proporcionales_a_los_pesos():
+    helper = HelperLocal()
+    assert helper._cortes_proporcionales(100, [1.0, 3.0]) == [25, 100]
+    assert helper._cortes_proporcionales(90, [1.0, 1.0, 1.0]) == [30, 60, 90]
+    # cada tesela conserva al menos un pixel
+    assert helper._cortes_proporcionales(3, [0.01, 0.01, 10.0]) == [1, 2, 3]
+
+def test_asignacion_equilibra_area_por_peso(coordinador):
+    teselas, _ = HelperLocal().dividir_en_teselas(imagen_prueba(), (10, 437), 0)
+    asignacion = coordinador._asignar_teselas(teselas, {"a": 3.0, "b": 1.0})
+
+    areas = {"a": 0, "b": 0}
+    for tesela, nodo in zip(teselas, asignacion):
+        areas[nodo] += (tesela.y1 - tesela.y0) * (tesela.x1 - tesela.x0)
+    assert areas["a"] / areas["b"] == pytest.approx(3.0, rel=0.1)
+
+def test_reparto_por_capacidad_igual_a_imagen_completa(coordinador):
+    img = imagen_prueba()
+    pipeline = [("desenfoque_gaussiano", {"kernel": 7})]
+    coordinador.modo_reparto = MODO_ESTATICO
+    for nodo, megapixeles in (("a", 4.0), ("b", 1.0), ("c", 0.5)):
+        coordinador.estimador.registrar(nodo, megapixeles, 1.0, 1.0)
+
+    plan, error = coordinador._preparar_partes(cv2.imencode(".png", img)[1].tobytes(), pipeline)
+    assert error is None
+    areas = {}
+    for tesela, nodo in zip(plan.teselas, plan.asignacion):
+        areas[nodo] = areas.get(nodo, 0) + (tesela.y1 - tesela.y0) * (tesela.x1 - tesela.x0)
+    # el nodo mas rapido recibe la mayor parte y el mas lento la menor
+    assert areas["a"] == max(areas.values())
+    assert areas.get("c", 0) <= areas.get("b", 0)
+
+    respuesta = coordinador.procesar_imagen_distribuida(cv2.imencode(".png", img)[1].tobytes(), pipeline)
+    assert respuesta.status == "ok", respuesta.mensaje
+    resultado = cv2.imdecode(np.frombuffer(respuesta.imagen_data, np.uint8), cv2.IMREAD_UNCHANGED)
+    assert np.array_equal(resultado, ejecutar_pipeline(img, pipeline))